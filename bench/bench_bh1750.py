@@ -0,0 +1,155 @@
+# BH1750: Latenz pro Lesung und nutzbarer Messbereich (CPython)
+#
+# Läuft mit dem BH1750 aus sim/i2c.py (Wandlungszeit und Empfindlichkeit
+# skalieren mit MTreg, übersteuert bei 65535) auf simulierter Zeit; gelesen
+# wird wie im Messtakt von main.py alle 10 s. Verglichen werden
+#  - bisher: luminance(CONT_HIRES_1), wartet vor jeder Lesung 180 ms,
+#  - H-Res 1: start/collect mit festem CONT_HIRES_1, der laufende
+#    Dauermodus wird nicht neu gestartet,
+#  - auto: start/collect ohne Modus, der Treiber wählt Modus und MTreg.
+# Pro Helligkeit: die wievielte von zehn Lesungen als erste innerhalb von
+# 5 % (oder eines Zählschritts) lag, die Wandlungszeit nach dem letzten
+# Wechsel von Modus/MTreg, danach über weitere Lesungen Latenz (Wartezeit
+# plus Bus), Messwert und Auflösung (lx pro Zählschritt).
+# Zum Schluss "Licht an": von 0.5 lx auf 80000 lx.
+#
+#   python bench/bench_bh1750.py [--reads 10]
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+from libraries.bh1750 import BH1750 as Driver
+from sim.i2c import BH1750, SimBus
+
+LEVELS = (0.05, 1.0, 50.0, 800.0, 5000.0, 30000.0, 60000.0, 100000.0)
+MODES = {Driver.CONT_HIRES_1: "H-Res", Driver.CONT_HIRES_2: "H-Res 2",
+         Driver.CONT_LOWRES: "L-Res"}
+VARIANTS = (("bisher", Driver.CONT_HIRES_1, True),
+            ("H-Res 1", Driver.CONT_HIRES_1, False),
+            ("auto", None, False))
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Reader:
+    def __init__(self, lux, mode, legacy):
+        self.clock = Clock()
+        time.ticks_ms = lambda: int(self.clock.now * 1000)
+        self.bus = SimBus(realtime=False, clock=self.clock)
+        self.device = self.bus.attach(BH1750(lux=lux))
+        self.driver = Driver(self.bus)
+        self.mode = mode
+        self.legacy = legacy
+
+    def _legacy_start(self):
+        # start() vor dieser Änderung: feste Wartezeit bei jeder Lesung
+        driver = self.driver
+        if self.mode != driver.mode:
+            driver.set_mode(self.mode)
+        return 180
+
+    def read(self):
+        """ (Lux oder None, Latenz in ms) """
+        self.bus.reset_stats()
+        wait = self._legacy_start() if self.legacy else self.driver.start(self.mode)
+        self.clock.now += wait / 1000
+        value = self.driver.collect(self.mode)
+        latency = wait + self.bus.busy_us / 1000
+        self.clock.now += 10
+        return value, latency
+
+    def resolution(self):
+        mode = self.mode if self.mode is not None else self.driver.mode
+        # L-Res: 4 lx bei MTreg 69
+        step = 4.8 if mode == Driver.CONT_LOWRES else 1
+        return self.driver.to_lux(step, mode)
+
+
+def valid(value, lux, step=0.0):
+    # 5 % oder ein Zählschritt, feiner kann der Sensor nicht
+    return value is not None and abs(value - lux) <= max(0.05 * lux, step)
+
+
+def measure(lux, mode, legacy, reads):
+    reader = Reader(lux, mode, legacy)
+    settle = None
+    waits = []
+    for n in range(1, 11):
+        value, latency = reader.read()
+        waits.append(latency)
+        if settle is None and valid(value, lux, reader.resolution()):
+            settle = n
+    values, latencies = [], []
+    for _ in range(reads):
+        value, latency = reader.read()
+        values.append(value)
+        latencies.append(latency)
+    mode = reader.driver.mode
+    # Wartezeit der letzten Lesung mit neu gestarteter Wandlung
+    first = ([w for w in waits if w >= 1] or [0])[-1]
+    return (settle, MODES.get(mode, "?"), reader.driver.mtreg, first,
+            sum(latencies) / reads, values[-1], reader.resolution())
+
+
+def lights_on(mode, legacy):
+    reader = Reader(0.5, mode, legacy)
+    for _ in range(5):
+        reader.read()
+    reader.device.lux = 80000.0
+    for n in range(1, 11):
+        value, _ = reader.read()
+        if valid(value, 80000.0):
+            return n, value
+    return None, value
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reads", type=int, default=10)
+    args = parser.parse_args()
+
+    print("{:>9} {:<9} {:>7} {:<8} {:>6} {:>10} {:>11} {:>11} {:>12}".format(
+        "Lux", "Variante", "gültig", "Modus", "MTreg", "Wandl. ms", "Latenz ms", "gemessen",
+        "Auflösung"))
+    for lux in LEVELS:
+        for name, mode, legacy in VARIANTS:
+            settle, mode_name, mtreg, first, latency, value, resolution = measure(
+                lux, mode, legacy, args.reads)
+            print("{:>9} {:<9} {:>7} {:<8} {:>6} {:>10.0f} {:>11.1f} {:>11} {:>9.3f} lx".format(
+                lux, name, "nach {}".format(settle) if settle else "nie", mode_name, mtreg,
+                first, latency, "-" if value is None else "{:.2f}".format(value), resolution))
+
+    print()
+    print("Messbereich (kleinster Schritt bis Sättigung)")
+    driver = Reader(0, None, False).driver
+    for name, steps in (("H-Res 1", ((Driver.CONT_HIRES_1, 69),)), ("auto", driver.RANGES)):
+        finest = min(driver.to_lux(4.8 if mode == Driver.CONT_LOWRES else 1, mode, mtreg)
+                     for mode, mtreg in steps)
+        top = max(driver.max_lux(mode, mtreg) for mode, mtreg in steps)
+        print("{:<9} {:>9.3f} lx bis {:>9.0f} lx, Faktor {:>9.0f}".format(name, finest, top, top / finest))
+
+    print()
+    print("Licht an: 0.5 lx -> 80000 lx")
+    for name, mode, legacy in VARIANTS:
+        n, value = lights_on(mode, legacy)
+        print("{:<9} {:>16} {:>11}".format(name, "gültig nach {}".format(n) if n else "nie gültig",
+                                          "-" if value is None else "{:.0f}".format(value)))
+
+
+if __name__ == "__main__":
+    main()
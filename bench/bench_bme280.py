@@ -0,0 +1,76 @@
+# BME280: Forced-Modus gegen Normal-Modus (CPython)
+#
+# Liest einen simulierten BME280 (sim/i2c.py, 100 kHz, typische
+# Wandlungszeiten) direkt am Bus und misst pro Messung Wartezeit,
+# Transaktionen und Bytes auf dem Bus:
+#  - "forced alt": wie der Treiber vorher - ctrl_hum und ctrl_meas
+#    schreiben, die doppelte Worst-Case-Zeit (1 << mode) abwarten, lesen
+#  - "forced": ctrl_meas schreiben, typische Zeit warten, Statusbit
+#    "measuring" abfragen, lesen
+#  - "normal": Sensor misst selbst (Standby 1000 ms, IIR 4), nur der
+#    8-Byte-Block wird gelesen
+#
+#   python bench/bench_bme280.py [--reads 50]
+
+import argparse
+import os
+import sys
+import time
+from array import array
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+from libraries import bme280
+from sim.i2c import BME280, SimBus
+
+
+def legacy_read(sensor, raw):
+    mode = sensor._mode
+    sensor._write(bme280.BME280_REGISTER_CONTROL_HUM, mode)
+    sensor._write(bme280.BME280_REGISTER_CONTROL, mode << 5 | mode << 2 | 1)
+    time.sleep_us(1250 + 2 * (2300 * (1 << mode) + 575) + 2300 * (1 << mode))
+    sensor.read_measurement(raw)
+
+
+def measure(name, reads):
+    bus = SimBus()
+    bus.attach(BME280())
+    if name == "normal":
+        sensor = bme280.BME280(i2c=bus, standby=bme280.BME280_STANDBY_1000,
+                               iir=bme280.BME280_FILTER_4)
+        # erste Wandlung abwarten
+        time.sleep_us(sensor.measurement_time_us())
+    else:
+        sensor = bme280.BME280(i2c=bus)
+    raw = array("i", [0, 0, 0])
+    bus.reset_stats()
+    t0 = time.monotonic()
+    for _ in range(reads):
+        if name == "forced alt":
+            legacy_read(sensor, raw)
+        else:
+            sensor.read_raw_data(raw)
+    elapsed = time.monotonic() - t0
+    if raw[0] == 0:
+        raise RuntimeError("keine Messwerte")
+    return elapsed * 1000 / reads, bus.transactions / reads, bus.bytes / reads
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reads", type=int, default=50)
+    args = parser.parse_args()
+
+    print("{:<12} {:>14} {:>14} {:>12}".format("Modus", "ms/Messung", "Transaktionen", "Bytes"))
+    for name in ("forced alt", "forced", "normal"):
+        ms, transactions, nbytes = measure(name, args.reads)
+        print("{:<12} {:>14.2f} {:>14.1f} {:>12.1f}".format(name, ms, transactions, nbytes))
+
+
+if __name__ == "__main__":
+    main()
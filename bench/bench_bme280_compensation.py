@@ -0,0 +1,258 @@
+# BME280-Kompensation: Referenzvergleich und Laufzeit (CPython)
+#
+# Vergleicht BME280.compensate_many Bit für Bit mit der bisherigen
+# Kompensation (unten als reference() übernommen) - für die Kalibrierwerte
+# aus dem Datenblatt und zufällige Kalibrierungen, jeweils mit zufälligen
+# Rohwerten über den ganzen Wertebereich. Bei einer Abweichung bricht das
+# Skript mit Exit-Code 1 ab.
+#
+# Danach: Zeit pro Messung und vorübergehend belegter Speicher für die
+# bisherige Kompensation mit neuem Ergebnis-Array pro Messung, einzelne
+# compensate()-Aufrufe und compensate_many in ein vorhandenes Array. Weil CPython keine kleinen
+# Ints kennt, wird zusätzlich gezählt, wie viele Zwischenergebnisse pro
+# Messung außerhalb des Small-Int-Bereichs von MicroPython (31 Bit) liegen;
+# auf dem ESP32 ist jedes davon eine Heap-Allokation.
+#
+#   python bench/bench_bme280_compensation.py [--samples 20000] [--calibrations 50]
+
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+import tracemalloc
+from array import array
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+from libraries import bme280
+from sim.i2c import BME280, SimBus
+
+INT32 = (-(1 << 31), (1 << 31) - 1)
+SMALL_INT = (-(1 << 30), (1 << 30) - 1)
+
+
+class Counted(int):
+    """ int, das mitzählt, wie viele Rechenergebnisse kein Small Int wären. """
+    big = 0
+
+
+def _counted(op):
+    def method(self, other):
+        value = getattr(int, op)(self, other)
+        if value is NotImplemented:
+            return value
+        if not SMALL_INT[0] <= value <= SMALL_INT[1]:
+            Counted.big += 1
+        return Counted(value)
+    return method
+
+
+for _op in ("add", "sub", "mul", "floordiv", "rshift", "lshift", "and"):
+    setattr(Counted, "__{}__".format(_op), _counted("__{}__".format(_op)))
+    setattr(Counted, "__r{}__".format(_op), _counted("__r{}__".format(_op)))
+Counted.__neg__ = lambda self: Counted(-int(self))
+
+
+def reference(c, raw_temp, raw_press, raw_hum):
+    # Kompensation wie vor der Umstellung (libraries/bme280.py)
+    var1 = ((raw_temp >> 3) - (c.dig_T1 << 1)) * (c.dig_T2 >> 11)
+    var2 = (((((raw_temp >> 4) - c.dig_T1) *
+              ((raw_temp >> 4) - c.dig_T1)) >> 12) * c.dig_T3) >> 14
+    t_fine = var1 + var2
+    temp = (t_fine * 5 + 128) >> 8
+
+    var1 = t_fine - 128000
+    var2 = var1 * var1 * c.dig_P6
+    var2 = var2 + ((var1 * c.dig_P5) << 17)
+    var2 = var2 + (c.dig_P4 << 35)
+    var1 = (((var1 * var1 * c.dig_P3) >> 8) +
+            ((var1 * c.dig_P2) << 12))
+    var1 = (((1 << 47) + var1) * c.dig_P1) >> 33
+    if var1 == 0:
+        pressure = 0
+    else:
+        p = 1048576 - raw_press
+        p = (((p << 31) - var2) * 3125) // var1
+        var1 = (c.dig_P9 * (p >> 13) * (p >> 13)) >> 25
+        var2 = (c.dig_P8 * p) >> 19
+        pressure = ((p + var1 + var2) >> 8) + (c.dig_P7 << 4)
+
+    h = t_fine - 76800
+    h = (((((raw_hum << 14) - (c.dig_H4 << 20) -
+            (c.dig_H5 * h)) + 16384)
+          >> 15) * (((((((h * c.dig_H6) >> 10) *
+                        (((h * c.dig_H3) >> 11) + 32768)) >> 10) +
+                      2097152) * c.dig_H2 + 8192) >> 14))
+    h = h - (((((h >> 15) * (h >> 15)) >> 7) * c.dig_H1) >> 4)
+    h = 0 if h < 0 else h
+    h = 419430400 if h > 419430400 else h
+    humidity = h >> 12
+    return temp, pressure, humidity
+
+
+def random_calibration(rng):
+    calib = (rng.randint(0, 65535), rng.randint(-32768, 32767), rng.randint(-32768, 32767),
+             rng.randint(1, 65535)) + tuple(rng.randint(-32768, 32767) for _ in range(8))
+    calib_h = (rng.randint(0, 255), rng.randint(-32768, 32767), rng.randint(0, 255),
+               rng.randint(-2048, 2047), rng.randint(-2048, 2047), rng.randint(-128, 127))
+    return calib, calib_h
+
+
+def make_sensor(calib=None, calib_h=None):
+    device = BME280()
+    if calib is not None:
+        struct.pack_into("<HhhHhhhhhhhh", device.regs, 0x88, *calib)
+        h1, h2, h3, h4, h5, h6 = calib_h
+        device.regs[0xA1] = h1
+        struct.pack_into("<hB", device.regs, 0xE1, h2, h3)
+        device.regs[0xE4] = (h4 >> 4) & 0xFF
+        device.regs[0xE5] = (h4 & 0x0F) | ((h5 & 0x0F) << 4)
+        device.regs[0xE6] = (h5 >> 4) & 0xFF
+        device.regs[0xE7] = h6 & 0xFF
+    bus = SimBus(realtime=False)
+    bus.attach(device)
+    return bme280.BME280(i2c=bus)
+
+
+def random_raw(rng, n):
+    raw = array("i")
+    for _ in range(n):
+        if rng.random() < 0.5:
+            # ganzer Wertebereich der Register
+            raw.extend((rng.randint(0, 0xFFFFF), rng.randint(0, 0xFFFFF), rng.randint(0, 0xFFFF)))
+        else:
+            # Bereich, den ein Sensor im Betrieb liefert
+            raw.extend((rng.randint(400000, 600000), rng.randint(250000, 450000),
+                        rng.randint(15000, 45000)))
+    return raw
+
+
+def check(sensor, raw):
+    """ Liefert (verglichen, übersprungen, Abweichungen). """
+    n = len(raw) // 3
+    expected = []
+    fits = array("i")
+    for i in range(n):
+        values = reference(sensor, raw[3 * i], raw[3 * i + 1], raw[3 * i + 2])
+        # Werte außerhalb von int32 passen in kein array("i") und kommen
+        # bei einem echten Sensor nicht vor
+        if all(INT32[0] <= v <= INT32[1] for v in values):
+            expected.append(values)
+            fits.extend(raw[3 * i:3 * i + 3])
+    result = array("i", bytes(4 * len(fits)))
+    sensor.compensate_many(fits, result)
+    errors = 0
+    for k, values in enumerate(expected):
+        if tuple(result[3 * k:3 * k + 3]) != values:
+            if errors < 5:
+                print("Abweichung:", tuple(fits[3 * k:3 * k + 3]), values, tuple(result[3 * k:3 * k + 3]))
+            errors += 1
+    return len(expected), n - len(expected), errors
+
+
+class Calibration:
+    pass
+
+
+def count_big_ints(sensor, raw):
+    """ Big-Int-Zwischenergebnisse pro Messung: (bisher, neu). """
+    n = len(raw) // 3
+    values = [Counted(v) for v in raw]
+    calibration = Calibration()
+    for name in dir(sensor):
+        if name.startswith("dig_"):
+            setattr(calibration, name, Counted(getattr(sensor, name)))
+    Counted.big = 0
+    for i in range(n):
+        reference(calibration, values[3 * i], values[3 * i + 1], values[3 * i + 2])
+        old = Counted.big
+    cal, t_fine = sensor._cal, sensor.t_fine
+    sensor._cal = tuple(Counted(v) for v in cal)
+    sensor.t_fine = Counted(t_fine)
+    Counted.big = 0
+    sensor.compensate_many(values, [0] * len(values))
+    new = Counted.big
+    sensor._cal, sensor.t_fine = cal, t_fine
+    return old / n, new / n
+
+
+def bench(sensor, raw):
+    n = len(raw) // 3
+    triples = [raw[3 * i:3 * i + 3] for i in range(n)]
+    result = array("i", bytes(4 * len(raw)))
+
+    def old():
+        for t, p, h in triples:
+            array("i", reference(sensor, t, p, h))
+
+    def single():
+        for triple in triples:
+            sensor.compensate(triple)
+
+    def batch():
+        sensor.compensate_many(raw, result)
+
+    rows = []
+    for name, func in (("bisher", old), ("compensate", single), ("compensate_many", batch)):
+        # bester von fünf Durchläufen, CPython schwankt stark
+        elapsed = None
+        for _ in range(5):
+            t0 = time.perf_counter()
+            func()
+            t = time.perf_counter() - t0
+            if elapsed is None or t < elapsed:
+                elapsed = t
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rows.append((name, elapsed * 1e6 / n, peak))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--calibrations", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(280)
+    compared = skipped = errors = 0
+    sensors = [make_sensor()] + [make_sensor(*random_calibration(rng))
+                                 for _ in range(args.calibrations)]
+    per_sensor = max(1, args.samples // len(sensors))
+    for sensor in sensors:
+        c, s, e = check(sensor, random_raw(rng, per_sensor))
+        compared += c
+        skipped += s
+        errors += e
+    print("Referenzvergleich: {} Messungen, {} außerhalb int32 übersprungen, {} Abweichungen".format(
+        compared, skipped, errors))
+    if errors:
+        sys.exit(1)
+
+    # Datenblatt-Kalibrierung, Rohwerte aus dem Betriebsbereich
+    sensor = sensors[0]
+    rng = random.Random(1)
+    raw = array("i")
+    for _ in range(args.samples):
+        raw.extend((rng.randint(400000, 600000), rng.randint(250000, 450000),
+                    rng.randint(15000, 45000)))
+    big = count_big_ints(sensor, raw[:3000])
+    print()
+    print("{:<16} {:>14} {:>16} {:>16}".format("Variante", "µs/Messung", "Speicher-Spitze",
+                                               "Big-Ints/Messung"))
+    big = (big[0], big[1], big[1])
+    for (name, us, peak), n in zip(bench(sensor, raw), big):
+        print("{:<16} {:>14.2f} {:>14} B {:>16.1f}".format(name, us, peak, n))
+
+
+if __name__ == "__main__":
+    main()
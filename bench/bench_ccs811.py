@@ -0,0 +1,140 @@
+# CCS811: Zeit bis zum ersten gültigen Messwert (CPython, simulierte Zeit)
+#
+# Läuft mit dem CCS811-Modell aus sim/i2c.py: nach dem Einschalten liegt
+# die Baseline daneben und wird erst mit der Zeit eingelernt, ohne
+# ENV_DATA rechnet der Sensor mit 25 °C / 50 %. Der BME280 misst 26 °C und
+# 69 %. Gültig heißt: eCO2 höchstens --tolerance ppm neben dem wahren Wert.
+#
+# Jede Variante startet SensorManager mit simuliertem Bus und Uhr und liest
+# wie main.py: den CCS811 jede Sekunde, den BME280 alle 10 s (danach
+# update_environment, falls die Kompensation an ist). Für "mit Baseline"
+# läuft vorher ein Durchgang über zwei Stunden, der stündlich
+# save_baselines() aufruft; danach wird mit derselben ccs811.json neu
+# gestartet. Zum Schluss die Bus-Transaktionen des CCS811 pro Minute mit
+# Abfrage des Statusregisters und mit nINT-Pin.
+#
+#   python bench/bench_ccs811.py [--tolerance 25] [--limit 3600]
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+from i2c_bus import I2CBus
+from sensor_manager import SensorManager
+from sim.i2c import BME280, CCS811, SimBus, TCA9548A
+
+ECO2 = 800
+# BME280-Rohwerte für etwa 26 °C und 69 %
+BME_RAW = (530000, 415148, 33000)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def boot(clock, baselines):
+    sim_bus = SimBus(realtime=False, clock=clock)
+    sim_bus.attach(TCA9548A(0x70))
+    # nach jedem Start liegt die Baseline um 800 Einheiten (400 ppm) daneben
+    ccs = sim_bus.attach(CCS811(eco2=ECO2, baseline_offset=800), 0)
+    sim_bus.attach(BME280(raw=BME_RAW), 1)
+    bus = I2CBus(sim_bus)
+    sensors = SensorManager(bus, config=None, baselines=baselines)
+    with contextlib.redirect_stdout(io.StringIO()):
+        sensors.discover()
+    return sim_bus, ccs, sensors
+
+
+def run(clock, sensors, seconds, compensate, tolerance=None):
+    """ Liest wie main.py; gibt die Sekunde des ersten gültigen Werts
+        zurück, wenn tolerance gesetzt ist. """
+    start = clock.now
+    for second in range(seconds):
+        clock.now = start + second
+        if second and second % 10 == 0:
+            sensors.start("bme280")
+            sensors.collect("bme280")
+            if compensate:
+                sensors.update_environment()
+        sensors.collect("ccs811")
+        if second and second % 3600 == 0:
+            sensors.save_baselines()
+        values = sensors.primary("ccs811").values
+        if tolerance is not None and values is not None and abs(values[0] - ECO2) <= tolerance:
+            return second
+    clock.now = start + seconds
+    return None
+
+
+def time_to_valid(baseline, compensate, tolerance, limit):
+    clock = Clock()
+    time.ticks_ms = lambda: int(clock.now * 1000)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ccs811.json") if baseline else None
+        if baseline:
+            # vorheriger Betrieb, der die Baseline eingelernt und gesichert hat
+            sim_bus, ccs, sensors = boot(clock, path)
+            run(clock, sensors, 2 * 3600 + 1, compensate)
+        sim_bus, ccs, sensors = boot(clock, path)
+        # das Modell sieht das Raumklima, das der BME280 misst
+        sensors.start("bme280")
+        clock.now += 0.1
+        sensors.collect("bme280")
+        temp, _, humidity = sensors.primary("bme280").values
+        ccs.ambient = (temp, humidity)
+        return run(clock, sensors, limit, compensate, tolerance), ccs.baseline_writes
+
+
+def transactions(use_pin, minutes=10):
+    clock = Clock()
+    time.ticks_ms = lambda: int(clock.now * 1000)
+    sim_bus, ccs, sensors = boot(clock, None)
+    if use_pin:
+        sensors.primary("ccs811").driver.int_pin = ccs.nint()
+    sim_bus.reset_stats()
+    # wie im Scheduler: jede Sekunde, leicht gegen den Messtakt versetzt
+    for second in range(minutes * 60):
+        clock.now = second + 0.3
+        sensors.collect("ccs811")
+    return sim_bus.transactions / minutes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tolerance", type=int, default=25)
+    parser.add_argument("--limit", type=int, default=3600)
+    args = parser.parse_args()
+
+    print("Zeit bis eCO2 höchstens {} ppm neben {} ppm liegt".format(args.tolerance, ECO2))
+    print("{:<32} {:>12} {:>18}".format("Variante", "gültig nach", "Baseline geschrieben"))
+    for name, baseline, compensate in (("ohne Baseline, ohne Kompensation", False, False),
+                                       ("ohne Baseline", False, True),
+                                       ("Baseline, ohne Kompensation", True, False),
+                                       ("Baseline + Kompensation", True, True)):
+        seconds, writes = time_to_valid(baseline, compensate, args.tolerance, args.limit)
+        shown = "{} s".format(seconds) if seconds is not None else "> {} s".format(args.limit)
+        print("{:<32} {:>12} {:>18}".format(name, shown, writes))
+
+    print()
+    print("{:<32} {:>12}".format("Abfrage", "I2C/min"))
+    for name, use_pin in (("Statusregister", False), ("nINT-Pin", True)):
+        print("{:<32} {:>12.0f}".format(name, transactions(use_pin)))
+
+
+if __name__ == "__main__":
+    main()
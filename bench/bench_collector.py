@@ -0,0 +1,263 @@
+# Lasttest für den Sammeldienst (collector/) mit vielen Geräten auf localhost
+#
+# Die Geräte laufen in einem eigenen Prozess: --devices Stück HTTPServer
+# aus webserver.py mit LiveFeed wie auf dem ESP32, die alle --sample-ms
+# eine neue Messung veröffentlichen (statt alle 10 s, Zeitstempel im
+# 10-s-Raster). Gemessen wird im Prozess des Sammeldienstes, nach einer
+# Sekunde Anlauf über --seconds:
+#  - einzeln: wie bisher ein Gerät nach dem anderen, pro Abfrage eine neue
+#    TCP-Verbindung,
+#  - abfragen: Collector mit einer offenen Verbindung pro Gerät, alle
+#    --interval s mit If-None-Match,
+#  - senden: die Geräte (hier ein zweiter Prozess mit --devices
+#    Verbindungen) schicken Blöcke von --batch Messungen per POST /ingest.
+# Danach wird geprüft, dass Zeilen mit null, Text, NaN, Infinity oder 1e400
+# mit 400 abgewiesen werden, ohne dass die Verbindung abbricht oder etwas
+# gespeichert wird.
+# Pro Verfahren: neue Zeilen/s, Anfragen, Verbindungsaufbauten, CPU-Zeit
+# des Sammeldienstes (Anteil der Laufzeit) und RSS am Ende. Es steht nur
+# ein Kern zur Verfügung, wenn nproc 1 meldet - die Geräte rechnen dann mit.
+#
+#   python bench/bench_collector.py [--devices 500] [--seconds 10]
+
+import argparse
+import asyncio
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from collector.http import Connection
+from collector.service import Collector
+from collector.store import ColumnStore
+from sensor_store import VALID_FROM
+
+DEVICE_PORT = 18000
+COLLECTOR_PORT = 17999
+VALUES = (24.21, 968.51, 57.0, 412, 3, 812.5)
+NDJSON_ROW = ('{{"timestamp":{},"date":"","bme280_temp":24.21,"bme280_pressure":968.51,'
+              '"bme280_humidity":57.00,"ccs811_co2":412,"ccs811_tvoc":3,"bh1750_lux":812.5}}\n')
+
+
+# --- Prozess der Geräte -------------------------------------------------
+
+async def run_devices(count, sample_ms):
+    from live import LiveFeed
+    from webserver import HTTPServer
+
+    feeds = []
+    for i in range(count):
+        server = HTTPServer("127.0.0.1", DEVICE_PORT + i)
+        feed = LiveFeed()
+        server.add_route("/api/sensordata", feed.send_latest)
+        await server.start()
+        feeds.append(feed)
+    print("bereit", flush=True)
+    timestamp = VALID_FROM
+    while True:
+        timestamp += 10
+        for feed in feeds:
+            feed.publish(timestamp, VALUES)
+        await asyncio.sleep(sample_ms / 1000)
+
+
+async def run_pushers(count, batch, seconds):
+    deadline = time.monotonic() + seconds
+    sent = [0]
+
+    async def pusher(i):
+        connection = Connection("127.0.0.1", COLLECTOR_PORT)
+        timestamp = VALID_FROM
+        while time.monotonic() < deadline:
+            body = "".join(NDJSON_ROW.format(timestamp + k * 10) for k in range(batch)).encode()
+            timestamp += batch * 10
+            status, _, _ = await connection.request("POST", "/ingest?device=box{}".format(i), body=body,
+                                                    headers={"Content-Type": "application/x-ndjson"})
+            if status == 200:
+                sent[0] += batch
+        await connection.close()
+
+    await asyncio.gather(*(pusher(i) for i in range(count)))
+    print(sent[0], flush=True)
+
+
+# --- Sammeldienst ------------------------------------------------------
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def cpu_s():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Window:
+    """ Misst Zeilen, CPU und Zeit zwischen begin() und end(). """
+
+    def begin(self, rows):
+        self.rows = rows
+        self.cpu = cpu_s()
+        self.t0 = time.perf_counter()
+
+    def end(self, rows):
+        wall = time.perf_counter() - self.t0
+        return (rows - self.rows) / wall, (cpu_s() - self.cpu) / wall
+
+
+def report(label, rate, cpu, requests, connects):
+    print("{:<9} {:>10.0f} {:>10} {:>9} {:>7.0f}% {:>9.1f} MB".format(
+        label, rate, requests, connects, cpu * 100, rss_kb() / 1024))
+
+
+async def single(args, root):
+    """ Ein Gerät nach dem anderen, neue Verbindung pro Anfrage. """
+    store = ColumnStore(root)
+    collector = Collector(store, backfill=False)
+    devices = [collector.add_device("box{}".format(i), "127.0.0.1", DEVICE_PORT + i)
+               for i in range(args.devices)]
+    window = Window()
+    requests = connects = 0
+    t_begin = time.monotonic() + 1
+    t_end = t_begin + args.seconds
+    started = False
+    while time.monotonic() < t_end:
+        for device in devices:
+            if not started and time.monotonic() >= t_begin:
+                window.begin(collector.added)
+                started = True
+            device.connection = Connection("127.0.0.1", device.connection.port)
+            await collector._poll_once(device)
+            await device.connection.close()
+            device.etag = None
+            if started:
+                requests += 1
+                connects += 1
+            if time.monotonic() >= t_end:
+                break
+        await collector.flush()
+    rate, cpu = window.end(collector.added)
+    await collector.flush()
+    report("einzeln", rate, cpu, requests, connects)
+
+
+async def polled(args, root):
+    store = ColumnStore(root)
+    collector = Collector(store, interval=args.interval, backfill=False)
+    for i in range(args.devices):
+        collector.add_device("box{}".format(i), "127.0.0.1", DEVICE_PORT + i)
+    await collector.start("127.0.0.1", COLLECTOR_PORT)
+    await asyncio.sleep(1)
+    window = Window()
+    window.begin(collector.added)
+    before = [(d.connection.requests, d.connection.connects) for d in collector.devices.values()]
+    await asyncio.sleep(args.seconds)
+    rate, cpu = window.end(collector.added)
+    requests = sum(d.connection.requests for d in collector.devices.values()) - sum(r for r, _ in before)
+    connects = sum(d.connection.connects for d in collector.devices.values()) - sum(c for _, c in before)
+    errors = sum(d.errors for d in collector.devices.values())
+    await collector.stop()
+    report("abfragen", rate, cpu, requests, connects)
+    if errors:
+        print("  Fehler:", errors, next(d.last_error for d in collector.devices.values() if d.errors))
+
+
+async def pushed(args, root):
+    store = ColumnStore(root)
+    collector = Collector(store)
+    await collector.start("127.0.0.1", COLLECTOR_PORT)
+    pushers = await asyncio.create_subprocess_exec(
+        sys.executable, __file__, "--role", "pushers", "--devices", str(args.devices),
+        "--batch", str(args.batch), "--seconds", str(args.seconds + 1.5),
+        stdout=subprocess.PIPE)
+    await asyncio.sleep(1)
+    window = Window()
+    window.begin(collector.added)
+    requests = collector.requests
+    await asyncio.sleep(args.seconds)
+    rate, cpu = window.end(collector.added)
+    requests = collector.requests - requests
+    sent = int((await pushers.communicate())[0] or 0)
+    await collector.stop()
+    report("senden", rate, cpu, requests, args.devices)
+    written = sum(len(store.read(device, day)["timestamp"])
+                  for device in store.devices() for day in store.days(device))
+    print("  geschickt {}, gespeichert {}".format(sent, written))
+
+
+async def invalid_rows(root):
+    """ Ungültige Werte: 400, Verbindung bleibt, nichts gespeichert. """
+    store = ColumnStore(root)
+    collector = Collector(store)
+    await collector.start("127.0.0.1", COLLECTOR_PORT)
+    connection = Connection("127.0.0.1", COLLECTOR_PORT)
+    good = NDJSON_ROW.format(VALID_FROM)
+    statuses = []
+    for bad in ("null", '"412"', "NaN", "Infinity", "-Infinity", "1e400", "1" + "0" * 400):
+        body = good + NDJSON_ROW.format(VALID_FROM + 10).replace('"ccs811_co2":412', '"ccs811_co2":' + bad)
+        status, _, _ = await connection.request("POST", "/ingest?device=box", body=body.encode())
+        statuses.append(status)
+    await connection.close()
+    await collector.stop()
+    ok = statuses == [400] * len(statuses) and connection.connects == 1 and not store.devices()
+    print("Ungültige Zeilen mit 400 abgewiesen, nichts gespeichert: {}".format("ja" if ok else "NEIN"))
+
+
+async def run(args):
+    devices = subprocess.Popen([sys.executable, __file__, "--role", "devices",
+                                "--devices", str(args.devices), "--sample-ms", str(args.sample_ms)],
+                               stdout=subprocess.PIPE, text=True)
+    tmp = tempfile.mkdtemp(prefix="growbox-collector-")
+    try:
+        devices.stdout.readline()
+        print("{} Geräte, alle {} ms eine Messung, {} s pro Verfahren, {} Kern(e)".format(
+            args.devices, args.sample_ms, args.seconds, os.cpu_count()))
+        print()
+        print("{:<9} {:>10} {:>10} {:>9} {:>8} {:>12}".format(
+            "Verfahren", "Zeilen/s", "Anfragen", "Verbind.", "CPU", "RSS"))
+        await single(args, os.path.join(tmp, "einzeln"))
+        await polled(args, os.path.join(tmp, "abfragen"))
+        devices.terminate()
+        devices.wait()
+        await pushed(args, os.path.join(tmp, "senden"))
+        print()
+        await invalid_rows(os.path.join(tmp, "ungueltig"))
+    finally:
+        if devices.poll() is None:
+            devices.terminate()
+            devices.wait()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--sample-ms", type=int, default=1000, help="Messabstand der simulierten Geräte")
+    parser.add_argument("--interval", type=float, default=0.5, help="Abfrageabstand des Collectors in s")
+    parser.add_argument("--batch", type=int, default=60, help="Messungen pro POST")
+    parser.add_argument("--role", choices=("devices", "pushers"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role == "devices":
+        import sim
+        sim.install()
+        asyncio.run(run_devices(args.devices, args.sample_ms))
+    elif args.role == "pushers":
+        asyncio.run(run_pushers(args.devices, args.batch, args.seconds))
+    else:
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
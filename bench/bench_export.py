@@ -0,0 +1,81 @@
+# Speicherbedarf von /api/export (läuft unter CPython)
+#
+# Legt synthetische Logs an (Standard: 1 MB und 10 MB) und misst mit
+# tracemalloc den Spitzenverbrauch während des Exports. Zum Vergleich wird
+# die Datei wie in send_html_page komplett mit f.read() geladen.
+#
+#   python bench/bench_export.py [--sizes 1,10]
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from export import send_export
+from sensor_store import RECORD_SIZE, RingStore
+
+
+class CountingResponse:
+    # Ersatz für webserver.Response, zählt nur die gesendeten Bytes
+    def __init__(self):
+        self.bytes = 0
+        self.chunks = 0
+
+    async def start(self, status=200, content_type="text/html", length=None, headers="", chunked=False):
+        pass
+
+    async def write(self, data):
+        self.bytes += len(data)
+        self.chunks += 1
+
+
+def build_log(path, megabytes):
+    records = megabytes * 1000000 // RECORD_SIZE
+    store = RingStore(path, capacity=records, batch=256)
+    for i in range(records):
+        store.append(1725317552 + i * 10, 24.2 + (i % 50) / 10, 968.5, 57.0, 400 + i % 100, i % 30, 812.5)
+    store.flush()
+    return store
+
+
+def measure(run):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1,10", help="Loggrößen in MB")
+    args = parser.parse_args()
+
+    print("{:>6} {:<8} {:>12} {:>14} {:>10}".format("MB", "Format", "Export B", "Heap-Spitze B", "Dauer s"))
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(s) for s in args.sizes.split(",")):
+            path = os.path.join(tmp, "log{}.bin".format(size))
+            store = build_log(path, size)
+            for fmt in ("csv", "ndjson"):
+                response = CountingResponse()
+                _, peak, elapsed = measure(lambda: asyncio.run(send_export(store, response, fmt, 0, 0xFFFFFFFF)))
+                print("{:>6} {:<8} {:>12} {:>14} {:>10.2f}".format(size, fmt, response.bytes, peak, elapsed))
+
+            def read_all():
+                with open(path, "rb") as f:
+                    return len(f.read())
+            _, peak, elapsed = measure(read_all)
+            print("{:>6} {:<8} {:>12} {:>14} {:>10.2f}".format(size, "f.read", os.path.getsize(path), peak, elapsed))
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
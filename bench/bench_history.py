@@ -0,0 +1,76 @@
+# Benchmark für /api/history (läuft unter CPython)
+#
+# Vervielfacht die Werte aus sensor_data.csv auf --rows Datensätze im
+# 10-Sekunden-Raster und misst für verschiedene Zeiträume die Dauer des
+# Downsamplings und die Größe der Antwort - im Vergleich zur Größe, die
+# eine Antwort mit allen Rohdaten hätte.
+#
+#   python bench/bench_history.py [--rows 1000000] [--points 400]
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from history import ROW_FORMAT, downsample
+from sensor_store import RingStore, format_time
+from tools.csv_to_ring import parse_value
+
+
+def load_values():
+    rows = []
+    with open(os.path.join(ROOT, "sensor_data.csv")) as f:
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) == 7:
+                rows.append([parse_value(v) for v in parts[1:]])
+    return rows
+
+
+def build_store(path, rows, start):
+    values = load_values()
+    store = RingStore(path, capacity=rows, batch=256)
+    for i in range(rows):
+        store.append(start + i * 10, *values[i % len(values)])
+    store.flush()
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--points", type=int, default=400)
+    args = parser.parse_args()
+
+    start = 1725317552
+    stop = start + (args.rows - 1) * 10
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        store = build_store(os.path.join(tmp, "sensor_data.bin"), args.rows, start)
+        print("{} Datensätze angelegt in {:.1f} s".format(args.rows, time.perf_counter() - t0))
+        raw_row = len(ROW_FORMAT.format(format_time(start), 24.21, 968.51, 57.0, 412, 3, 812.5)) + 1
+
+        print("{:<8} {:>10} {:>10} {:>12} {:>14}".format("Bereich", "Rohzeilen", "Punkte", "Antwort B", "Rohdaten B"))
+        for name, span in (("Tag", 86400), ("Woche", 7 * 86400), ("Monat", 30 * 86400), ("Alles", stop - start)):
+            begin = max(start, stop - span)
+            t0 = time.perf_counter()
+            sampler = asyncio.run(downsample(store, begin, stop, args.points))
+            payload = 2
+            points = 0
+            for row in sampler.rows():
+                payload += len(row) + 1
+                points += 1
+            elapsed = time.perf_counter() - t0
+            raw_rows = (stop - begin) // 10 + 1
+            print("{:<8} {:>10} {:>10} {:>12} {:>14}   {:.2f} s".format(
+                name, raw_rows, points, payload, raw_rows * raw_row, elapsed))
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
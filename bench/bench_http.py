@@ -0,0 +1,144 @@
+# Lastbenchmark für den HTTP-Server (läuft unter CPython)
+#
+# Vergleicht die alte Accept-Schleife aus main.handle_requests (listen(1),
+# eine Verbindung pro Anfrage) mit webserver.HTTPServer (Keep-Alive,
+# ein Task pro Verbindung). Ausgabe: Anfragen/s und p99-Latenz für 1, 10
+# und 50 gleichzeitige Clients.
+#
+#   python bench/bench_http.py [--requests 2000]
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webserver import HTTPServer
+
+SAMPLE = {
+    "bme280_temp": 24.21,
+    "bme280_pressure": 968.5096,
+    "bme280_humidity": 57.00098,
+    "ccs811_co2": 412,
+    "ccs811_tvoc": 3,
+    "bh1750_lux": 812.5,
+}
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def legacy_server(port, ready):
+    # Nachbau von start_server/handle_requests vor der Umstellung
+    s = socket.socket()
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    s.bind(("127.0.0.1", port))
+    s.listen(1)
+    ready.set()
+    while True:
+        cl, addr = s.accept()
+        request = cl.recv(1024)
+        request = str(request)
+        request = request.split("\\r\\n")[0].split(' ')
+        if len(request) > 0 and request[0] == "b'GET" and request[1] == "/api/sensordata":
+            response = json.dumps(SAMPLE)
+            cl.send(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n" + response.encode('utf-8'))
+        cl.close()
+
+
+def async_server(port, ready):
+    server = HTTPServer(host="127.0.0.1", port=port, max_clients=64)
+
+    @server.route("/api/sensordata")
+    async def send_sensor_data(request, response):
+        await response.send(json.dumps(SAMPLE), content_type="application/json")
+
+    async def main():
+        await server.start()
+        ready.set()
+        while True:
+            await asyncio.sleep(3600)
+
+    asyncio.run(main())
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = None
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    if length is None:
+        await reader.read()
+        return False
+    await reader.readexactly(length)
+    return True
+
+
+REQUEST = b"GET /api/sensordata HTTP/1.1\r\nHost: growbox\r\n\r\n"
+
+
+async def client(port, count, latencies, errors, keep_alive):
+    conn = None
+    for _ in range(count):
+        t0 = time.perf_counter()
+        try:
+            if conn is None:
+                conn = await asyncio.open_connection("127.0.0.1", port)
+            reader, writer = conn
+            writer.write(REQUEST)
+            await writer.drain()
+            reusable = await read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # listen(1) verwirft Verbindungen, sobald der Backlog voll ist
+            errors.append(1)
+            conn = None
+            continue
+        if not (keep_alive and reusable):
+            writer.close()
+            conn = None
+        latencies.append(time.perf_counter() - t0)
+    if conn is not None:
+        conn[1].close()
+
+
+async def run_level(port, clients, total, keep_alive):
+    latencies = []
+    errors = []
+    per_client = max(1, total // clients)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(port, per_client, latencies, errors, keep_alive) for _ in range(clients)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return len(latencies) / elapsed, p99 * 1000, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    print("{:<10} {:>8} {:>12} {:>10} {:>8}".format("Server", "Clients", "Anfragen/s", "p99 ms", "Fehler"))
+    for name, target, keep_alive in (("legacy", legacy_server, False), ("asyncio", async_server, True)):
+        port = free_port()
+        ready = threading.Event()
+        threading.Thread(target=target, args=(port, ready), daemon=True).start()
+        ready.wait()
+        for clients in (1, 10, 50):
+            rate, p99, errors = asyncio.run(run_level(port, clients, args.requests, keep_alive))
+            print("{:<10} {:>8} {:>12.0f} {:>10.2f} {:>8}".format(name, clients, rate, p99, errors))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# I2C-Bus-Verwaltung: alter Multiplexer gegen I2CBus (CPython)
+#
+# Läuft auf dem simulierten Bus aus sim/i2c.py (100 kHz). Verglichen werden
+#  - ein kompletter blockierender Lesezyklus aller drei Sensoren
+#    (Transaktionen, Kanalwechsel, Zeit),
+#  - je vier Registerlesungen auf zwei Kanälen, abwechselnd oder per
+#    read_batch gebündelt,
+#  - zwei Threads, die gleichzeitig verschiedene Kanäle lesen: ohne Lock
+#    landen Zugriffe auf dem falschen Kanal.
+#
+#   python bench/bench_i2c_bus.py [--cycles 5] [--reads 200]
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+from i2c_bus import I2CBus
+from sensor_manager import SensorManager
+from sim.i2c import growbox
+
+
+class LegacyBus(I2CBus):
+    """ Verhalten des früheren I2CMultiplexer: jede Auswahl schreibt das
+        Steuerbyte und wartet 100 ms, gesperrt wird nichts. """
+
+    def __init__(self, i2c):
+        super().__init__(i2c, settle_us=100000)
+
+    def _select(self, channel):
+        self.channel = None
+        super()._select(channel)
+
+    def on(self, channel):
+        self._select(channel)
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def make_sensors(bus_class, sim_bus=None):
+    sim_bus = sim_bus or growbox()
+    bus = bus_class(sim_bus)
+    sensors = SensorManager(bus, config=None, baselines=None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        sensors.discover()
+    return sim_bus, bus, sensors
+
+
+def read_serial(bus, sensors):
+    # wie sensor_loop früher: ein Sensor nach dem anderen, jeweils Kanal
+    # wählen, Messung anstoßen, Wandlungszeit abwarten, abholen
+    for sensor in sensors.sensors:
+        with bus.on(sensor.channel):
+            time.sleep_ms(sensor.start())
+            sensor.collect()
+
+
+def bench_cycle(bus_class, cycles):
+    sim_bus, bus, sensors = make_sensors(bus_class)
+    sim_bus.reset_stats()
+    switches = bus.switches
+    t0 = time.monotonic()
+    for _ in range(cycles):
+        read_serial(bus, sensors)
+    elapsed = time.monotonic() - t0
+    return (sim_bus.transactions / cycles, (bus.switches - switches) / cycles,
+            elapsed * 1000 / cycles)
+
+
+def bench_batch(batched, rounds=20):
+    sim_bus, bus, sensors = make_sensors(I2CBus)
+    bufs = [bytearray(2) for _ in range(4)]
+    reads = {0: [(0x5A, 0x20 + k, bufs[k]) for k in range(4)],
+             1: [(0x76, 0x88 + 2 * k, bufs[k]) for k in range(4)]}
+    sim_bus.reset_stats()
+    switches = bus.switches
+    t0 = time.monotonic()
+    for _ in range(rounds):
+        if batched:
+            for channel in (0, 1):
+                bus.read_batch(channel, reads[channel])
+        else:
+            for k in range(4):
+                for channel in (0, 1):
+                    with bus.on(channel) as i2c:
+                        addr, reg, buf = reads[channel][k]
+                        i2c.readfrom_mem_into(addr, reg, buf)
+    elapsed = time.monotonic() - t0
+    return (sim_bus.transactions / rounds, (bus.switches - switches) / rounds,
+            elapsed * 1000 / rounds)
+
+
+def bench_threads(bus_class, reads):
+    sim_bus, bus, sensors = make_sensors(bus_class)
+    if bus_class is LegacyBus:
+        bus.settle_us = 0
+    errors = [0]
+
+    def worker(channel, addr, reg, expected):
+        buf = bytearray(1)
+        for _ in range(reads):
+            try:
+                with bus.on(channel) as i2c:
+                    i2c.readfrom_mem_into(addr, reg, buf)
+                if buf[0] != expected:
+                    errors[0] += 1
+            except OSError:
+                errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(0, 0x5A, 0x20, 0x81)),
+               threading.Thread(target=worker, args=(1, 0x76, 0xD0, 0x60))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--reads", type=int, default=200)
+    args = parser.parse_args()
+
+    print("Lesezyklus BME280 + CCS811 + BH1750")
+    print("{:<14} {:>14} {:>14} {:>10}".format("Variante", "Transaktionen", "Kanalwechsel", "ms"))
+    for name, bus_class in (("Multiplexer", LegacyBus), ("I2CBus", I2CBus)):
+        transactions, switches, ms = bench_cycle(bus_class, args.cycles)
+        print("{:<14} {:>14.1f} {:>14.1f} {:>10.1f}".format(name, transactions, switches, ms))
+
+    print()
+    print("4 Registerlesungen auf Kanal 0 und 1")
+    print("{:<14} {:>14} {:>14} {:>10}".format("Variante", "Transaktionen", "Kanalwechsel", "ms"))
+    for name, batched in (("abwechselnd", False), ("read_batch", True)):
+        transactions, switches, ms = bench_batch(batched)
+        print("{:<14} {:>14.1f} {:>14.1f} {:>10.2f}".format(name, transactions, switches, ms))
+
+    print()
+    print("2 Threads mit je {} Lesungen".format(args.reads))
+    print("{:<14} {:>14}".format("Variante", "Fehllesungen"))
+    for name, bus_class in (("Multiplexer", LegacyBus), ("I2CBus", I2CBus)):
+        print("{:<14} {:>14}".format(name, bench_threads(bus_class, args.reads)))
+
+
+if __name__ == "__main__":
+    main()
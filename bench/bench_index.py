@@ -0,0 +1,66 @@
+# Zeitindex gegen vollständigen Scan (läuft unter CPython)
+#
+# Legt ein Log mit --rows Datensätzen an (mit einem Zeitsprung zurück wie
+# nach einem Neustart ohne NTP) und misst Suchen plus Lesen für zufällige
+# Zeitfenster über den Index (RingStore.range) und per vollständigem Scan.
+#
+#   python bench/bench_index.py [--rows 500000] [--window 3600]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sensor_store import RingStore
+
+
+def full_scan(store, start, stop):
+    return [seq for seq, record in store.records() if start <= record[0] <= stop]
+
+
+def indexed(store, start, stop):
+    return [seq for seq, record in store.range(start, stop)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--window", type=int, default=3600)
+    parser.add_argument("--queries", type=int, default=10)
+    args = parser.parse_args()
+
+    random.seed(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sensor_data.bin")
+        store = RingStore(path, capacity=args.rows, batch=256)
+        timestamp = 1725317552
+        for i in range(args.rows):
+            if i == args.rows // 3:
+                timestamp -= 6600  # Neustart mit falscher Uhrzeit
+            store.append(timestamp, 24.2, 968.5, 57.0, 412, 3, 812.5)
+            timestamp += 10
+        store.flush()
+        print("Log: {:.1f} MB, {} Indexeinträge".format(os.path.getsize(path) / 1e6, len(store.index)))
+
+        windows = []
+        for _ in range(args.queries):
+            start = random.randint(1725317552, timestamp - args.window)
+            windows.append((start, start + args.window))
+
+        for name, query in (("Scan", full_scan), ("Index", indexed)):
+            t0 = time.perf_counter()
+            found = 0
+            for start, stop in windows:
+                found += len(query(store, start, stop))
+            elapsed = (time.perf_counter() - t0) / len(windows) * 1000
+            print("{:<6} {:>10.2f} ms/Abfrage  {:>8} Datensätze".format(name, elapsed, found))
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# .mpy statt Quelltext: Größe, Import auf MicroPython und OTA-Umstellung
+#
+# tools/build_mpy.py baut die Module in ein temporäres Verzeichnis; pro
+# Modul werden die Größen von .py und .mpy verglichen. Mit --micropython
+# (Unix-Port, z. B. ports/unix/build-standard/micropython) wird jedes
+# Modul, das sich ohne ESP32 importieren lässt, je einmal aus dem
+# Quelltext und als .mpy in einem frischen Prozess mit 128 KB Heap
+# importiert: Dauer (ticks_us) und Heap, der danach belegt bleibt
+# (gc.mem_free vor und nach dem Import, nach gc.collect()).
+#
+# Danach die Umstellung per OTA mit dem OTAServer wie in
+# bench/bench_ota_delta.py: Gerät mit Version 1 aus den Quellen, dann
+# Version 2 aus dist/ (tools/release.py --dist). Alle Module müssen danach
+# als .mpy und keine ihrer .py mehr auf dem Gerät liegen.
+#
+#   python bench/bench_mpy.py [--micropython PFAD] [--mpy-cross BEFEHL]
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+from ota import ota
+from sim.ota_server import GITHUB, OTAServer
+from tools.build_mpy import build, mpy_cross_command, mpy_version
+from tools.release import counterpart, device_files, dist_files
+
+# lassen sich auf dem Unix-Port importieren (ohne machine.Pin, network, ...)
+IMPORTABLE = ("webserver", "sensor_store", "history", "export", "live", "scheduler",
+              "libraries.bme280", "libraries.bh1750")
+PROBE = """
+import gc, sys, time
+sys.path.insert(0, '')
+gc.collect()
+free = gc.mem_free()
+t0 = time.ticks_us()
+import {}
+elapsed = time.ticks_diff(time.ticks_us(), t0)
+gc.collect()
+print(elapsed, free - gc.mem_free())
+"""
+
+
+def sizes(dist):
+    print("{:<22} {:>8} {:>8} {:>6}".format("Modul", ".py", ".mpy", "%"))
+    total_py = total_mpy = 0
+    for name in device_files():
+        if not name.endswith(".py"):
+            continue
+        target = "app.mpy" if name == "main.py" else counterpart(name)
+        if not os.path.exists(os.path.join(dist, target)):
+            continue
+        py = os.path.getsize(os.path.join(ROOT, name))
+        mpy = os.path.getsize(os.path.join(dist, target))
+        total_py += py
+        total_mpy += mpy
+        print("{:<22} {:>8} {:>8} {:>5.0f}%".format(name, py, mpy, 100 * mpy / py))
+    print("{:<22} {:>8} {:>8} {:>5.0f}%".format("zusammen", total_py, total_mpy,
+                                                 100 * total_mpy / total_py))
+
+
+def probe(micropython, directory, module):
+    """ (µs, Bytes) für den Import von module in directory. """
+    result = subprocess.run([micropython, "-X", "heapsize=128K", "-c", PROBE.format(module)],
+                            cwd=directory, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError("{}: {}".format(module, result.stderr.strip().splitlines()[-1:]))
+    elapsed, used = result.stdout.split()[-2:]
+    return int(elapsed), int(used)
+
+
+def imports(micropython, dist):
+    print("{:<18} {:>9} {:>9} {:>10} {:>10}".format("Import", ".py µs", ".mpy µs", ".py Heap", ".mpy Heap"))
+    for module in IMPORTABLE:
+        py_us, py_heap = probe(micropython, ROOT, module)
+        mpy_us, mpy_heap = probe(micropython, dist, module)
+        print("{:<18} {:>9} {:>9} {:>8} B {:>8} B".format(module, py_us, mpy_us, py_heap, mpy_heap))
+
+
+def update():
+    with contextlib.redirect_stdout(io.StringIO()):
+        updater = ota.OTAUpdater("ssid", "passwort", GITHUB, "main.py")
+        updater.connect_wifi()
+        try:
+            updater.download_and_install_update_if_available()
+        except SystemExit:
+            # machine.reset() nach dem Update
+            pass
+
+
+def switch_over(dist, mpy):
+    """ Gerät von den Quellen auf dist/ umstellen; gibt (Anfragen, Bytes,
+        Fehler) zurück. """
+    source = {}
+    for name in device_files():
+        with open(os.path.join(ROOT, name), "rb") as f:
+            source[name] = f.read()
+    built = {}
+    for name in dist_files(dist):
+        with open(os.path.join(dist, name), "rb") as f:
+            built[name] = f.read()
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="growbox-mpy-")
+    os.chdir(workdir)
+    try:
+        with OTAServer(latency_ms=80, bytes_per_s=60000) as server:
+            server.install()
+            server.publish(1, source)
+            update()
+            server.publish(2, built, base="dist", mpy=list(mpy))
+            server.reset_stats()
+            update()
+            errors = []
+            for name, data in built.items():
+                with open(name, "rb") as f:
+                    if f.read() != data:
+                        errors.append(name + " falsch")
+                other = counterpart(name)
+                if other and other not in built and os.path.exists(other):
+                    errors.append(other + " noch da")
+            return server.requests, server.bytes, errors
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--micropython", help="MicroPython Unix-Port für die Importzeiten")
+    parser.add_argument("--mpy-cross", help="Befehl für mpy-cross")
+    args = parser.parse_args()
+
+    command = mpy_cross_command(args.mpy_cross)
+    major, minor, version = mpy_version(command)
+    print(version)
+    print()
+    dist = tempfile.mkdtemp(prefix="growbox-dist-")
+    try:
+        build(dist, command)
+        sizes(dist)
+        print()
+        if args.micropython:
+            imports(args.micropython, dist)
+        else:
+            print("Importzeiten: ohne --micropython nicht gemessen")
+        print()
+        requests, size, errors = switch_over(dist, (major, minor))
+        print("Umstellung per OTA: {} Anfragen, {} Bytes".format(requests, size))
+        print("Dateien auf dem Gerät richtig:", "ja" if not errors else "NEIN, " + ", ".join(errors))
+    finally:
+        shutil.rmtree(dist, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
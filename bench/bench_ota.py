@@ -0,0 +1,140 @@
+# OTA-Update: Speicherspitze und Dauer je nach Größe von main.py (CPython)
+#
+# Der lokale OTAServer aus sim/ota_server.py liefert eine main.py von
+# mehreren hundert KB aus (die echte main.py, mit Kommentarzeilen
+# aufgefüllt). Gemessen wird vom Abruf bis zur installierten Datei, mit
+# tracemalloc als Spitze der Python-Allokationen:
+#  - bisher: response.text, ausgegeben, mit compile() geprüft und als
+#    latest_code.py geschrieben wie im alten OTAUpdater,
+#  - streamen: OTAUpdater.fetch_latest_code() und update_no_reset(), in
+#    Blöcken von 1 KB in die Datei, SHA-256 nebenbei.
+# Zusätzlich: eine verfälschte Datei darf main.py nicht ersetzen. Bytes und
+# Dauer für Updates mehrerer Dateien misst bench/bench_ota_delta.py.
+#
+#   python bench/bench_ota.py [--sizes 50,200,500]
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+import urequests
+from ota.ota import OTAUpdater
+from sim.ota_server import GITHUB, OTAServer
+
+
+def payload(kb):
+    with open(os.path.join(ROOT, "main.py"), encoding="utf-8") as f:
+        source = f.read()
+    line = "# " + "x" * 77 + "\n"
+    return source + line * max(0, (kb * 1024 - len(source)) // len(line))
+
+
+def bisher(url):
+    """ Ablauf des alten fetch_latest_code/validate_new_code/update_no_reset. """
+    response = urequests.get(url)
+    print(f'Fetched latest firmware code, status: {response.status_code}, -  {response.text}')
+    latest_code = response.text
+    compile(latest_code, 'latest_code.py', 'exec')
+    with open('latest_code.py', 'w') as f:
+        f.write(latest_code)
+    os.rename('latest_code.py', 'main.py')
+
+
+def streamen(updater):
+    if not updater.check_for_updates():
+        raise RuntimeError("kein Update gefunden")
+    changed = updater.changed_files()
+    if not updater.fetch_latest_code(changed):
+        raise RuntimeError("Download fehlgeschlagen")
+    updater.update_no_reset(changed)
+
+
+def measure(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return peak, elapsed
+
+
+def run(server, source, version):
+    """ (Spitze, Dauer) für bisher und streamen. """
+    server.publish(version, {"main.py": source})
+    with open("main.py", "w") as f:
+        f.write("# alt\n")
+    old = measure(bisher, GITHUB + "main/main.py")
+    with open("main.py", "w") as f:
+        f.write("# alt\n")
+    with contextlib.redirect_stdout(io.StringIO()):
+        updater = OTAUpdater("ssid", "passwort", GITHUB, "main.py")
+        # WLAN vorher verbinden, das gehört nicht zur Messung
+        updater.connect_wifi()
+    new = measure(streamen, updater)
+    with open("main.py", encoding="utf-8") as f:
+        if f.read() != source:
+            raise RuntimeError("main.py nach dem Update falsch")
+    return old, new
+
+
+def tampered(server, source, version):
+    """ True, wenn eine Datei mit falschem Hash main.py unverändert lässt. """
+    server.publish(version, {"main.py": source})
+    with open(os.path.join(server.root, "main", "main.py"), "a") as f:
+        f.write("# verändert\n")
+    with open("main.py", "w") as f:
+        f.write("# alt\n")
+    with contextlib.redirect_stdout(io.StringIO()):
+        updater = OTAUpdater("ssid", "passwort", GITHUB, "main.py")
+        updater.download_and_install_update_if_available()
+    with open("main.py") as f:
+        kept = f.read() == "# alt\n"
+    return kept and not os.path.exists("latest_code.py")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="50,200,500", help="Größen von main.py in KB")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="growbox-ota-")
+    os.chdir(workdir)
+    try:
+        with OTAServer() as server:
+            server.install()
+            print("{:>8} {:>14} {:>14} {:>11} {:>11}".format(
+                "main.py", "bisher Spitze", "streamen", "bisher", "streamen"))
+            version = 0
+            for kb in sizes:
+                source = payload(kb)
+                version += 1
+                (old_peak, old_s), (new_peak, new_s) = run(server, source, version)
+                print("{:>5} KB {:>12} B {:>12} B {:>8.1f} ms {:>8.1f} ms".format(
+                    len(source) // 1024, old_peak, new_peak, old_s * 1000, new_s * 1000))
+            version += 1
+            print()
+            print("Verfälschte Datei abgelehnt:", "ja" if tampered(server, payload(sizes[0]), version) else "NEIN")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
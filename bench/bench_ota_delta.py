@@ -0,0 +1,142 @@
+# OTA-Update mit Manifest: übertragene Bytes und Dauer (CPython)
+#
+# Der lokale OTAServer aus sim/ota_server.py liefert die Dateien des
+# Repositorys aus (tools/release.py: DEVICE_FILES), mit 80 ms Antwortzeit
+# und 60 kB/s wie über das WLAN des ESP32. Das "Gerät" ist ein leeres
+# Arbeitsverzeichnis; nacheinander:
+#  - vollständig: erstes Update, alle Dateien,
+#  - keine Änderung: gleiche Version, Manifest mit If-None-Match (304),
+#  - eine Datei: neue Version, nur libraries/bme280.py geändert,
+#  - main.py: neue Version, nur main.py geändert,
+#  - keine Änderung.
+# Pro Schritt Anfragen, Antworten mit 304, übertragene Bytes (Inhalt) und
+# Dauer; danach muss jede Datei auf dem Gerät gleich der veröffentlichten
+# sein. Zum Schluss wird das Austauschen nach der Hälfte der Dateien
+# abgebrochen (wie bei einem Stromausfall); recover_interrupted_update()
+# muss den alten Stand wiederherstellen.
+#
+#   python bench/bench_ota_delta.py
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+from ota import ota
+from sim.ota_server import GITHUB, OTAServer
+from tools.release import device_files
+
+
+def update():
+    with contextlib.redirect_stdout(io.StringIO()):
+        updater = ota.OTAUpdater("ssid", "passwort", GITHUB, "main.py")
+        updater.connect_wifi()
+        try:
+            updater.download_and_install_update_if_available()
+        except SystemExit:
+            # machine.reset() nach dem Update
+            pass
+
+
+def step(server, label):
+    server.reset_stats()
+    t0 = time.perf_counter()
+    update()
+    elapsed = time.perf_counter() - t0
+    print("{:<16} {:>8} {:>6} {:>10} {:>9.2f} s".format(
+        label, server.requests, server.not_modified, server.bytes, elapsed))
+
+
+def check(server):
+    """ Vergleicht alle veröffentlichten Dateien mit denen auf dem Gerät. """
+    base = os.path.join(server.root, "main")
+    for name in device_files(base):
+        with open(os.path.join(base, name), "rb") as f, open(name, "rb") as g:
+            if f.read() != g.read():
+                raise RuntimeError("{} auf dem Gerät falsch".format(name))
+
+
+def interrupted(server, files, version):
+    """ True, wenn ein abgebrochenes Austauschen zurückgerollt wird. """
+    before = {}
+    for name in files:
+        with open(name, "rb") as f:
+            before[name] = f.read()
+    changed = {name: data + b"\n# neu\n" for name, data in files.items()}
+    server.publish(version, changed)
+    rename = os.rename
+    renames = []
+
+    def failing_rename(src, dst):
+        if src.endswith(ota.NEW_SUFFIX):
+            renames.append(dst)
+            if len(renames) > len(files) // 2:
+                raise SystemExit("Stromausfall")
+        rename(src, dst)
+
+    ota.os.rename = failing_rename
+    try:
+        update()
+    except SystemExit:
+        pass
+    finally:
+        ota.os.rename = rename
+    if not os.path.exists(ota.JOURNAL_FILE):
+        return False
+    with contextlib.redirect_stdout(io.StringIO()):
+        ota.recover_interrupted_update()
+    for name, data in before.items():
+        with open(name, "rb") as f:
+            if f.read() != data:
+                return False
+    return not os.path.exists(ota.JOURNAL_FILE)
+
+
+def main():
+    files = {}
+    for name in device_files():
+        with open(os.path.join(ROOT, name), "rb") as f:
+            files[name] = f.read()
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="growbox-ota-")
+    os.chdir(workdir)
+    try:
+        with OTAServer(latency_ms=80, bytes_per_s=60000) as server:
+            server.install()
+            print("{} Dateien, {} Bytes".format(len(files), sum(len(d) for d in files.values())))
+            print()
+            print("{:<16} {:>8} {:>6} {:>10} {:>11}".format("Update", "Anfragen", "304", "Bytes", "Dauer"))
+            server.publish(1, files)
+            step(server, "vollständig")
+            check(server)
+            step(server, "keine Änderung")
+            server.publish(2, {"libraries/bme280.py": files["libraries/bme280.py"] + b"\n# 2\n"})
+            step(server, "eine Datei")
+            check(server)
+            server.publish(3, {"main.py": files["main.py"] + b"\n# 3\n"})
+            step(server, "main.py")
+            check(server)
+            step(server, "keine Änderung")
+            print()
+            subset = {name: files[name] for name in ("main.py", "scheduler.py", "libraries/bh1750.py",
+                                                     "libraries/CCS811.py")}
+            ok = interrupted(server, subset, 4)
+            print("Abbruch beim Austauschen zurückgerollt:", "ja" if ok else "NEIN")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+# Bytes auf der Leitung und Funkzeit: UDP-Push (push.py) gegen HTTP
+#
+# Alles läuft auf localhost: der Webserver des Geräts mit LiveFeed und
+# /api/export, dazwischen ein Relais, das die Bytes pro Richtung zählt, und
+# der Sammeldienst (collector/) als UDP-Gegenstelle. Verglichen wird pro
+# Tag (8640 Messungen im 10-s-Takt):
+#  - json: /api/sensordata einmal pro Messung (Keep-Alive, ohne 304),
+#  - ndjson: alle K Messungen /api/export?format=ndjson&from=...,
+#  - udp: push.Pusher mit K Messungen pro Paket und ACK.
+#
+# Pakete: HTTP-Nachrichten in Segmente zu 1460 Bytes plus ein leeres ACK
+# pro Nachricht, 52 Bytes TCP/IP-Kopf; UDP 28 Bytes Kopf. Die Funkzeit ist
+# ein Modell: pro Austausch bleibt das Funkmodul --tail-ms wach (Warten auf
+# die Antwort, Nachlauf bis zum Modem-Sleep), dazu die Sendezeit jedes
+# Pakets bei --phy-mbit mit 36 Bytes 802.11-Kopf und 100 µs Präambel/ACK.
+# Beim Abfragen muss das Gerät außerdem ständig erreichbar sein.
+#
+# Danach der Ausfall: Messungen laufen auf, während der Sammeldienst nicht
+# erreichbar ist; gemessen wird das Nachholen und ein Neustart mitten darin
+# (nur ungesicherte Pakete werden doppelt geschickt).
+#
+#   python bench/bench_push.py [--samples 8640] [--batches 6,30,62]
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import socket
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+sim.install()
+
+from collector.http import Connection
+from collector.service import Collector
+from collector.store import ColumnStore
+from export import send_export
+from live import LiveFeed
+from push import ACK_SIZE, Pusher
+from sensor_store import RingStore, unix_time
+from webserver import HTTPServer
+
+MSS = 1460
+TCP_HEADER = 52
+UDP_HEADER = 28
+MAC_HEADER = 36
+PREAMBLE_US = 100
+
+
+def sample(i):
+    return (24.2 + (i % 50) / 10, 968.5 + (i % 7) / 10, 57.0 - (i % 20) / 10,
+            400 + i % 100, i % 30, 812.5 + i % 13)
+
+
+def fill(path, samples, capacity=25920):
+    store = RingStore(path, capacity=capacity, batch=6)
+    # endet vor einer Stunde, damit Pusher den Rest nicht zurückhält (max_delay_s)
+    first = unix_time() - 3600 - samples * 10
+    for i in range(samples):
+        store.append(first + i * 10, *sample(i))
+    store.flush()
+    return store, first
+
+
+def free_port(kind=socket.SOCK_DGRAM):
+    s = socket.socket(socket.AF_INET, kind)
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class Relay:
+    """ TCP-Weiterleitung, zählt Bytes pro Richtung. """
+
+    def __init__(self, port):
+        self.port = port
+        self.up = 0
+        self.down = 0
+
+    async def start(self):
+        server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return server, server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        target_reader, target_writer = await asyncio.open_connection("127.0.0.1", self.port)
+
+        async def pipe(src, dst, up):
+            while True:
+                data = await src.read(65536)
+                if not data:
+                    break
+                if up:
+                    self.up += len(data)
+                else:
+                    self.down += len(data)
+                dst.write(data)
+                await dst.drain()
+            dst.close()
+
+        await asyncio.gather(pipe(reader, target_writer, True), pipe(target_reader, writer, False),
+                             return_exceptions=True)
+
+
+class Wire:
+    """ Summen für eine Variante. """
+
+    def __init__(self):
+        self.payload = 0
+        self.packets = 0
+        self.wire = 0
+        self.exchanges = 0
+        self.airtime_us = 0
+
+    def packet(self, payload, header, phy_mbit):
+        self.packets += 1
+        self.payload += payload
+        self.wire += payload + header
+        self.airtime_us += PREAMBLE_US + (payload + header + MAC_HEADER) * 8 / phy_mbit
+
+    def message(self, size, phy_mbit):
+        # Segmente einer HTTP-Nachricht und das leere ACK der Gegenseite
+        while True:
+            n = min(size, MSS)
+            self.packet(n, TCP_HEADER, phy_mbit)
+            size -= n
+            if size <= 0:
+                break
+        self.packet(0, TCP_HEADER, phy_mbit)
+
+    def radio_ms(self, tail_ms):
+        return self.exchanges * tail_ms + self.airtime_us / 1000
+
+
+async def http_wire(relay_port, relay, path_for, exchanges, phy_mbit):
+    """ Misst "exchanges" Anfragen über das Relais; path_for(i) liefert den
+        Pfad, None: überspringen. """
+    wire = Wire()
+    connection = Connection("127.0.0.1", relay_port)
+    for i in range(exchanges):
+        path = path_for(i)
+        if path is None:
+            continue
+        up, down = relay.up, relay.down
+        status, _, _ = await connection.request("GET", path)
+        assert status == 200, status
+        # bis das Relais alles weitergereicht hat
+        await asyncio.sleep(0)
+        wire.exchanges += 1
+        wire.message(relay.up - up, phy_mbit)
+        wire.message(relay.down - down, phy_mbit)
+    await connection.close()
+    return wire
+
+
+async def compare(args, tmp):
+    store, first = fill(os.path.join(tmp, "ring.bin"), args.samples)
+    feed = LiveFeed()
+    server = HTTPServer("127.0.0.1", free_port(socket.SOCK_STREAM))
+    server.add_route("/api/sensordata", feed.send_latest)
+
+    @server.route("/api/export")
+    async def send_export_data(request, response):
+        await send_export(store, response, "ndjson", int(request.query["from"]), int(request.query["to"]))
+
+    await server.start()
+    relay = Relay(server.port)
+    relay_server, relay_port = await relay.start()
+
+    results = []
+    # json: wie der Sammeldienst, ein Abruf pro Messung; gemessen über
+    # --probe Messungen und auf den Tag hochgerechnet
+    probe = min(args.probe, args.samples)
+
+    def publish_then_poll(i):
+        feed.publish(first + i * 10, sample(i))
+        return "/api/sensordata"
+
+    wire = await http_wire(relay_port, relay, publish_then_poll, probe, args.phy_mbit)
+    results.append(("json", 1, wire, args.samples / probe))
+
+    for k in args.batches:
+        def export_path(i, k=k):
+            if (i + 1) % k:
+                return None
+            start = first + (i + 1 - k) * 10
+            return "/api/export?format=ndjson&from={}&to={}".format(start, start + (k - 1) * 10)
+
+        wire = await http_wire(relay_port, relay, export_path, args.samples, args.phy_mbit)
+        results.append(("ndjson", k, wire, 1))
+
+    for k in args.batches:
+        collector = Collector(ColumnStore(os.path.join(tmp, "udp{}".format(k))))
+        udp_port = free_port()
+        await collector.start("127.0.0.1", 0, udp_port)
+        pusher = Pusher(store, "127.0.0.1", udp_port, "growbox", batch=k,
+                        cursor_file=os.path.join(tmp, "push{}.cur".format(k)))
+        task = asyncio.create_task(pusher.run(idle_ms=20))
+        while pusher.backlog:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await collector.stop()
+        assert collector.added == args.samples, (collector.added, args.samples)
+        wire = Wire()
+        for frame_bytes in frame_sizes(store, k):
+            wire.exchanges += 1
+            wire.packet(frame_bytes, UDP_HEADER, args.phy_mbit)
+            wire.packet(ACK_SIZE, UDP_HEADER, args.phy_mbit)
+        assert wire.payload == pusher.sent_bytes + pusher.received_bytes
+        results.append(("udp", k, wire, 1))
+
+    relay_server.close()
+    store.close()
+
+    print("{} Messungen (ein Tag im 10-s-Takt), Funkzeit bei {} ms Nachlauf und {} Mbit/s".format(
+        args.samples, args.tail_ms, args.phy_mbit))
+    print()
+    print("{:<8} {:>4} {:>10} {:>10} {:>8} {:>11} {:>11} {:>12}".format(
+        "Art", "K", "Austausch", "Pakete", "B/Mess.", "Nutzdaten", "Leitung", "Funkzeit"))
+    baseline = None
+    for kind, k, wire, scale in results:
+        radio = wire.radio_ms(args.tail_ms) * scale / 1000
+        baseline = baseline or wire.wire * scale
+        print("{:<8} {:>4} {:>10.0f} {:>10.0f} {:>8.1f} {:>8.0f} KB {:>8.0f} KB {:>10.1f} s".format(
+            kind, k, wire.exchanges * scale, wire.packets * scale, wire.wire * scale / args.samples,
+            wire.payload * scale / 1024, wire.wire * scale / 1024, radio))
+    udp = results[-1][2]
+    print()
+    print("UDP mit K={}: {:.1f}% der Bytes von json".format(
+        args.batches[-1], 100 * udp.wire / baseline))
+
+
+def frame_sizes(store, k):
+    """ Paketgrößen, wie Pusher sie für den ganzen Ringspeicher bildet. """
+    pusher = Pusher(store, "127.0.0.1", 1, "growbox", batch=k, cursor_file=os.devnull)
+    pusher.cursor = store.oldest
+    while True:
+        frame = pusher.next_frame(now=0xFFFFFFFF)
+        if frame is None:
+            return
+        yield len(frame[0])
+        pusher.cursor = frame[1]
+
+
+async def outage(args, tmp):
+    """ Sammeldienst nicht erreichbar, dann Nachholen mit Neustart. """
+    samples = args.outage
+    store, _ = fill(os.path.join(tmp, "outage.bin"), samples)
+    cursor_file = os.path.join(tmp, "outage.cur")
+    udp_port = free_port()
+    options = dict(batch=30, cursor_file=cursor_file, timeout_ms=50, attempts=2)
+
+    pusher = Pusher(store, "127.0.0.1", udp_port, "growbox", **options)
+    task = asyncio.create_task(pusher.run(idle_ms=20))
+    await asyncio.sleep(0.5)
+    failed = pusher.sent_bytes
+
+    collector = Collector(ColumnStore(os.path.join(tmp, "outage")))
+    await collector.start("127.0.0.1", 0, udp_port)
+    # Backoff des Pushers abwarten; dann bis zur Hälfte nachholen lassen
+    t0 = time.perf_counter()
+    while pusher.cursor < store.head // 2:
+        await asyncio.sleep(0.005)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    first_half = pusher.frames
+
+    # Neustart: Zeiger aus der Datei, danach wird bis zum Ende nachgeholt
+    restarted = Pusher(store, "127.0.0.1", udp_port, "growbox", **options)
+    resent_from = restarted.cursor
+    task = asyncio.create_task(restarted.run(idle_ms=20))
+    while restarted.backlog:
+        await asyncio.sleep(0.005)
+    elapsed = time.perf_counter() - t0
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await collector.stop()
+    store.close()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        stored = sum(len(collector.store.read(d, day)["timestamp"])
+                     for d in collector.store.devices() for day in collector.store.days(d))
+    print()
+    print("Ausfall: {} Messungen im Ringspeicher, {} Bytes ohne Antwort geschickt".format(samples, failed))
+    print("Nachholen: {} + {} Pakete, {:.2f} s inklusive Backoff".format(
+        first_half, restarted.frames, elapsed))
+    print("Neustart bei {} von {}, Zeiger stand auf {}: {} Messungen doppelt geschickt".format(
+        pusher.cursor, store.head, resent_from, collector.received - collector.added))
+    print("alles angekommen: {}".format("ja" if stored == samples == collector.added else "NEIN"))
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory(prefix="growbox-push-") as tmp:
+        await compare(args, tmp)
+        await outage(args, tmp)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=8640)
+    parser.add_argument("--batches", default="6,30,62", help="Messungen pro Paket/Export, kommagetrennt")
+    parser.add_argument("--probe", type=int, default=500, help="gemessene JSON-Abrufe")
+    parser.add_argument("--outage", type=int, default=2000, help="Messungen während des Ausfalls")
+    parser.add_argument("--tail-ms", type=float, default=30)
+    parser.add_argument("--phy-mbit", type=float, default=24)
+    args = parser.parse_args()
+    args.batches = [int(k) for k in args.batches.split(",")]
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# Aggregate (rollup.py) gegen Rohdaten für /api/history (CPython)
+#
+# Vervielfacht die Werte aus sensor_data.csv auf --days Tage im
+# 10-Sekunden-Raster, einmal in einen Ringspeicher, der alles fasst, und
+# einmal in die Minuten-, Stunden- und Tagesstufe. Für Monat und Jahr
+# (falls vorhanden) wird /api/history mit und ohne Aggregate berechnet:
+# gelesene Zeilen, Dauer und ob Minimum und Maximum jeder Messgröße im
+# ganzen Zeitraum gleich sind.
+#
+# Zusätzlich:
+#  - Genauigkeit: Mittelwert und Standardabweichung eines Tages aus der
+#    Tagesstufe (float32, Welford und Chan) gegen die direkte Rechnung,
+#  - Neustart: nach einem Abbruch mitten in einer Stunde (ohne flush der
+#    Stufen) stellt recover() alles aus dem Ringspeicher wieder her; die
+#    Stunden- und Tageszeilen müssen gleich denen ohne Neustart sein.
+#
+#   python bench/bench_rollup.py [--days 365] [--points 400]
+
+import argparse
+import asyncio
+import contextlib
+import io
+import math
+import os
+import statistics
+import struct
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from history import downsample
+from rollup import SERIES, Rollups
+from sensor_store import RECORD_FORMAT, RingStore
+from tools.csv_to_ring import parse_value
+
+START = 1704067200
+STEP = 10
+
+
+def load_values():
+    """ Werte so gerundet, wie sie im Ringspeicher stehen (float32 wie auf
+        dem ESP32), damit recover() dieselben Zahlen sieht. """
+    rows = []
+    with open(os.path.join(ROOT, "sensor_data.csv")) as f:
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) == 7:
+                temp, pressure, humidity, co2, tvoc, lux = (parse_value(v) for v in parts[1:])
+                record = struct.pack(RECORD_FORMAT, 0, temp, pressure, humidity, int(co2), int(tvoc), lux)
+                rows.append(struct.unpack(RECORD_FORMAT, record)[1:])
+    return rows
+
+
+def samples(values, first, count):
+    for i in range(first, first + count):
+        yield START + i * STEP, values[i % len(values)]
+
+
+def recover(rollups, store):
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(rollups.recover(store))
+
+
+def build(directory, values, days):
+    rows = days * 86400 // STEP
+    store = RingStore(os.path.join(directory, "sensor_data.bin"), capacity=rows, batch=256)
+    rollups = Rollups(os.path.join(directory, "sensor"))
+    recover(rollups, store)
+    for timestamp, record in samples(values, 0, rows):
+        store.append(timestamp, *record)
+        rollups.add(timestamp, record)
+    store.flush()
+    rollups.flush()
+    return store, rollups
+
+
+def extremes(sampler):
+    """ Minimum und Maximum jeder Messgröße über alle Buckets. """
+    result = []
+    for k in range(SERIES):
+        values = [sampler.mins[b * SERIES + k] for b in range(sampler.buckets) if sampler.counts[b]]
+        values += [sampler.maxs[b * SERIES + k] for b in range(sampler.buckets) if sampler.counts[b]]
+        result.append((min(values), max(values)))
+    return result
+
+
+def query(store, rollups, start, stop, points):
+    """ (Zeilen, Dauer, Sampler) mit rollups oder (None) aus den Rohdaten. """
+    t0 = time.perf_counter()
+    sampler = asyncio.run(downsample(store, start, stop, points, rollups))
+    elapsed = time.perf_counter() - t0
+    if rollups is None:
+        rows = sum(1 for _ in store.range(start, stop))
+    else:
+        tier = rollups.pick(sampler.width, start, store.first_valid_time())
+        rows = sum(1 for _ in tier.rows(start, stop)) if tier else sum(1 for _ in store.range(start, stop))
+    return rows, elapsed, sampler
+
+
+def accuracy(rollups, values):
+    """ Größte relative Abweichung von Mittelwert und Standardabweichung des
+        ersten Tages. """
+    day = next(rollups.tier("day").file.rows(START, START))
+    exact = [record for _, record in samples(values, 0, 86400 // STEP)]
+    worst_mean = worst_std = 0.0
+    for k in range(SERIES):
+        column = [record[k] for record in exact]
+        mean = statistics.fmean(column)
+        std = statistics.pstdev(column)
+        worst_mean = max(worst_mean, abs(day[2 + 4 * k] - mean) / (abs(mean) or 1))
+        if std:
+            worst_std = max(worst_std, abs(math.sqrt(day[3 + 4 * k]) - std) / std)
+    return worst_mean, worst_std
+
+
+def restart(values):
+    """ True, wenn die Stufen nach einem Neustart gleich denen ohne sind. """
+    rows = 2 * 86400 // STEP
+    cut = rows // 2 + 187
+    with tempfile.TemporaryDirectory() as a, tempfile.TemporaryDirectory() as b:
+        results = []
+        for directory, interrupted in ((a, False), (b, True)):
+            store = RingStore(os.path.join(directory, "sensor_data.bin"), capacity=rows, batch=6)
+            rollups = Rollups(os.path.join(directory, "sensor"))
+            recover(rollups, store)
+            for timestamp, record in samples(values, 0, rows):
+                if interrupted and timestamp == START + cut * STEP:
+                    # Stromausfall: Ringspeicher bis zum letzten vollen Block,
+                    # von den Stufen nur, was schon in den Dateien steht
+                    store.flush()
+                    store = RingStore(os.path.join(directory, "sensor_data.bin"))
+                    rollups = Rollups(os.path.join(directory, "sensor"))
+                    recover(rollups, store)
+                store.append(timestamp, *record)
+                rollups.add(timestamp, record)
+            results.append([list(rollups.tier(name).rows(0, 0xFFFFFFFF)) for name in ("hour", "day")])
+        return results[0] == results[1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--points", type=int, default=400)
+    args = parser.parse_args()
+
+    values = load_values()
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        store, rollups = build(tmp, values, args.days)
+        print("{} Tage, {} Messungen angelegt in {:.1f} s".format(
+            args.days, len(store), time.perf_counter() - t0))
+        for tier in rollups.tiers:
+            print("  {:<7} {:>6} Zeilen".format(tier.name, len(tier.file)))
+        print()
+        stop = START + args.days * 86400 - 1
+        print("{:<7} {:>10} {:>8} {:>7} {:>10} {:>10} {:>14}".format(
+            "Bereich", "Rohzeilen", "Quelle", "Zeilen", "Rohdaten", "Aggregate", "Min/Max gleich"))
+        for name, days in (("Tag", 1), ("Woche", 7), ("Monat", 30), ("Jahr", 365)):
+            if days > args.days:
+                continue
+            start = stop + 1 - days * 86400
+            raw_rows, raw_s, raw = query(store, None, start, stop, args.points)
+            rows, elapsed, sampler = query(store, rollups, start, stop, args.points)
+            tier = rollups.pick(sampler.width, start, store.first_valid_time())
+            print("{:<7} {:>10} {:>8} {:>7} {:>8.2f} s {:>8.3f} s {:>14}".format(
+                name, raw_rows, tier.name if tier else "roh", rows, raw_s, elapsed,
+                "ja" if extremes(raw) == extremes(sampler) else "NEIN"))
+        print()
+        worst_mean, worst_std = accuracy(rollups, values)
+        print("Tageswerte gegen direkte Rechnung: Mittelwert {:.1e}, Standardabweichung {:.1e} (relativ)".format(
+            worst_mean, worst_std))
+        store.close()
+        rollups.close()
+    print("Neustart mitten in der Stunde wiederhergestellt:", "ja" if restart(values) else "NEIN")
+
+
+if __name__ == "__main__":
+    main()
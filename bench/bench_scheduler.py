@@ -0,0 +1,119 @@
+# Messtakt der Sensorabfrage: alte Schleife gegen SensorScheduler (CPython)
+#
+# Beide Varianten lesen die simulierten Sensoren aus sim/i2c.py (100 kHz,
+# Wandlungszeiten laut Datenblatt) über denselben SensorManager. Die alte
+# Schleife liest nacheinander über den alten Multiplexer (100 ms pro
+# Kanalwahl) und schläft danach die volle Periode, wie sensor_loop vor dem
+# Scheduler. Gemessen werden die Abstände zwischen zwei gespeicherten
+# Messungen (Mittel, Streuung, größte Abweichung), die Drift über die ganze
+# Laufzeit und die längste Verzögerung, die ein 10-ms-Task in der
+# Event-Schleife des Webservers erlebt.
+#
+#   python bench/bench_scheduler.py [--period 1.0] [--cycles 10]
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+from bench_i2c_bus import LegacyBus, make_sensors as make_bus, read_serial
+from i2c_bus import I2CBus
+from scheduler import SensorScheduler
+
+
+def make_sensors(bus_class=I2CBus):
+    sim_bus, bus, sensors = make_bus(bus_class)
+    sim_bus.reset_stats()
+    return sim_bus, bus, sensors
+
+
+async def probe(lag, stop):
+    # Wie lange muss ein Task, der alle 10 ms dran sein will, warten?
+    while not stop.is_set():
+        t0 = time.monotonic()
+        await asyncio.sleep(0.01)
+        late = time.monotonic() - t0 - 0.01
+        if late > lag[0]:
+            lag[0] = late
+
+
+def legacy(bus, sensors, period, cycles, stamps, stop):
+    while len(stamps) < cycles:
+        read_serial(bus, sensors)
+        stamps.append(time.monotonic())
+        time.sleep(period)
+    stop.set()
+
+
+async def run_legacy(period, cycles):
+    sim_bus, bus, sensors = make_sensors(LegacyBus)
+    stamps, lag, stop = [], [0.0], threading.Event()
+    threading.Thread(target=legacy, args=(bus, sensors, period, cycles, stamps, stop),
+                     daemon=True).start()
+    await probe(lag, stop)
+    return stamps, lag[0], sim_bus
+
+
+async def run_scheduler(period, cycles):
+    sim_bus, bus, sensors = make_sensors()
+    stamps, lag, stop = [], [0.0], threading.Event()
+    ms = int(period * 1000)
+
+    def record_sample():
+        for sensor in sensors.sensors:
+            if sensor.values is None:
+                return
+        stamps.append(time.monotonic())
+        if len(stamps) >= cycles:
+            stop.set()
+
+    # Aufteilung wie in main.py, Perioden auf --period skaliert
+    scheduler = SensorScheduler()
+    scheduler.add("ccs811", max(1, ms // 10), lambda: sensors.collect("ccs811"))
+    scheduler.add("messung", ms, lambda: sensors.collect("bme280", "bh1750"),
+                  lambda: sensors.start("bme280", "bh1750"))
+    scheduler.add("aufzeichnung", ms, record_sample, offset_ms=min(500, ms // 2))
+    scheduler.start()
+    await probe(lag, stop)
+    for task in scheduler.tasks:
+        task.cancel()
+    return stamps, lag[0], sim_bus
+
+
+def report(name, stamps, lag, bus, period):
+    intervals = [b - a for a, b in zip(stamps, stamps[1:])]
+    n = len(intervals)
+    mean = sum(intervals) / n
+    jitter = (sum((i - mean) ** 2 for i in intervals) / n) ** 0.5
+    worst = max(abs(i - period) for i in intervals)
+    drift = stamps[-1] - stamps[0] - n * period
+    print("{:<12} {:>10.1f} {:>10.2f} {:>12.2f} {:>10.1f} {:>12.1f} {:>10}".format(
+        name, mean * 1000, jitter * 1000, worst * 1000, drift * 1000, lag * 1000,
+        bus.transactions // len(stamps)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--period", type=float, default=1.0)
+    parser.add_argument("--cycles", type=int, default=10)
+    args = parser.parse_args()
+
+    print("{:<12} {:>10} {:>10} {:>12} {:>10} {:>12} {:>10}".format(
+        "Variante", "Takt ms", "Jitter ms", "max. Abw. ms", "Drift ms",
+        "Blockade ms", "I2C/Zyklus"))
+    for name, run in (("Schleife", run_legacy), ("Scheduler", run_scheduler)):
+        stamps, lag, bus = asyncio.run(run(args.period, args.cycles + 1))
+        report(name, stamps, lag, bus, args.period)
+
+
+if __name__ == "__main__":
+    main()
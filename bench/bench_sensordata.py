@@ -0,0 +1,92 @@
+# Micro-Benchmark für /api/sensordata (CPython)
+#
+# Ruft den Handler direkt mit einem Ersatz-Writer auf (ohne Sockets; Request
+# und Response werden wiederverwendet, gemessen wird nur der Handler) und
+# vergleicht die Variante mit json.dumps pro Anfrage mit der fertig
+# formatierten Antwort aus LiveFeed.send_latest: Anfragen/s und
+# vorübergehend belegter Heap pro Anfrage.
+#
+#   python bench/bench_sensordata.py [--requests 100000]
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from live import LiveFeed
+from webserver import Request, Response
+
+VALUES = (24.21, 968.5096, 57.00098, 412, 3, 812.5)
+
+
+class NullWriter:
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+
+    async def drain(self):
+        pass
+
+
+async def send_sensor_data(request, response):
+    # Stand vor der Umstellung: dict bauen, json.dumps, encode pro Anfrage
+    data = {
+        "bme280_temp": VALUES[0],
+        "bme280_pressure": VALUES[1],
+        "bme280_humidity": VALUES[2],
+        "ccs811_co2": VALUES[3],
+        "ccs811_tvoc": VALUES[4],
+        "bh1750_lux": VALUES[5]
+    }
+    await response.send(json.dumps(data), content_type="application/json")
+
+
+async def run(handler, count, writer):
+    request = Request("GET", "/api/sensordata", {}, "HTTP/1.1", {})
+    response = Response(writer, True, 10, True)
+    for _ in range(count):
+        await handler(request, response)
+
+
+async def heap_per_request(handler, count, writer):
+    request = Request("GET", "/api/sensordata", {}, "HTTP/1.1", {})
+    response = Response(writer, True, 10, True)
+    tracemalloc.start()
+    total = 0
+    for _ in range(count):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await handler(request, response)
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return total / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100000)
+    args = parser.parse_args()
+
+    feed = LiveFeed()
+    feed.publish(1725317552, VALUES)
+
+    print("{:<10} {:>12} {:>14} {:>12}".format("Variante", "Anfragen/s", "Heap B/Anfr.", "Bytes/Anfr."))
+    for name, handler in (("json", send_sensor_data), ("vorab", feed.send_latest)):
+        writer = NullWriter()
+        t0 = time.perf_counter()
+        asyncio.run(run(handler, args.requests, writer))
+        rate = args.requests / (time.perf_counter() - t0)
+        heap = asyncio.run(heap_per_request(handler, 2000, NullWriter()))
+        print("{:<10} {:>12.0f} {:>14.0f} {:>12.0f}".format(name, rate, heap, writer.bytes / args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Viele Sensoren hinter kaskadierten Multiplexern (CPython)
+#
+# Baut auf dem simulierten Bus aus sim/i2c.py Zelte auf: pro Kanal ein
+# CCS811, ein BME280 und ein BH1750, verteilt auf so viele TCA9548A
+# (0x70, 0x71, ...) wie nötig. Für jede Anzahl wird gemessen, wie lange
+# discover() braucht und wie lange ein Lesezyklus aller Sensoren dauert:
+#  - seriell über den alten Multiplexer (100 ms pro Kanalwahl, jede
+#    Wandlung einzeln abgewartet), wie sensor_loop früher,
+#  - gruppiert über SensorManager.start/collect: alle Messungen anstoßen,
+#    einmal die längste Wandlungszeit warten, alles abholen.
+#
+#   python bench/bench_sensors.py [--counts 3,10,20,40] [--no-serial]
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+from bench_i2c_bus import LegacyBus, make_sensors, read_serial
+from i2c_bus import I2CBus
+from sim.i2c import BH1750, BME280, CCS811, SimBus, TCA9548A
+
+KINDS = ("ccs811", "bme280", "bh1750")
+
+
+def tents(count):
+    bus = SimBus()
+    for n in range(count):
+        channel, kind = divmod(n, 3)
+        mux = 0x70 + channel // 8
+        if mux not in bus.devices:
+            bus.attach(TCA9548A(mux))
+        device = (CCS811, BME280, BH1750)[kind]()
+        bus.attach(device, channel % 8, mux)
+    return bus
+
+
+def grouped_cycle(sensors):
+    time.sleep_ms(sensors.start(*KINDS))
+    sensors.collect(*KINDS)
+
+
+def measure(bus_class, count, serial):
+    sim_bus = tents(count)
+    t0 = time.monotonic()
+    sim_bus, bus, sensors = make_sensors(bus_class, sim_bus)
+    discover_ms = (time.monotonic() - t0) * 1000
+    if len(sensors.sensors) != count:
+        raise RuntimeError("{} von {} Sensoren gefunden".format(len(sensors.sensors), count))
+    # einmal vorab, damit der CCS811 Daten hat
+    time.sleep(1.0)
+    sim_bus.reset_stats()
+    switches = bus.switches
+    t0 = time.monotonic()
+    if serial:
+        read_serial(bus, sensors)
+    else:
+        grouped_cycle(sensors)
+    cycle_ms = (time.monotonic() - t0) * 1000
+    missing = sum(1 for s in sensors.sensors if s.values is None)
+    return discover_ms, cycle_ms, sim_bus.transactions, bus.switches - switches, missing
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--counts", default="3,10,20,40")
+    parser.add_argument("--no-serial", action="store_true")
+    args = parser.parse_args()
+
+    variants = [("gruppiert", I2CBus, False)]
+    if not args.no_serial:
+        variants.insert(0, ("seriell", LegacyBus, True))
+    print("{:<10} {:>8} {:>12} {:>10} {:>14} {:>14} {:>8}".format(
+        "Variante", "Sensoren", "Suche ms", "Zyklus ms", "Transaktionen",
+        "Kanalwechsel", "ohne Wert"))
+    for count in (int(c) for c in args.counts.split(",")):
+        for name, bus_class, serial in variants:
+            discover_ms, cycle_ms, transactions, switches, missing = measure(bus_class, count, serial)
+            print("{:<10} {:>8} {:>12.0f} {:>10.1f} {:>14} {:>14} {:>8}".format(
+                name, count, discover_ms, cycle_ms, transactions, switches, missing))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# Server-CPU pro Client: Server-Sent Events gegen Abfragen (CPython)
+#
+# Ein Task in der Server-Schleife veröffentlicht alle --period Sekunden eine
+# Messung (steht für das 10-Sekunden-Intervall der Aufzeichnung). Beim Abfragen öffnet jeder
+# Client pro Messung eine neue Verbindung auf /api/sensordata, wie das
+# Dashboard vor /api/stream. Gemessen wird die CPU-Zeit des Server-Threads
+# abzüglich seiner Grundlast ohne Clients.
+#
+#   python bench/bench_sse.py [--period 1.0] [--duration 10]
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from live import LiveFeed
+from webserver import HTTPServer
+
+VALUES = (24.21, 968.5096, 57.00098, 412, 3, 812.5)
+
+
+def serve(port, feed, period, ready, cpu):
+    server = HTTPServer(host="127.0.0.1", port=port, max_clients=128)
+    server.add_route("/api/stream", feed.stream)
+
+    @server.route("/api/sensordata")
+    async def send_sensor_data(request, response):
+        data = dict(zip(("bme280_temp", "bme280_pressure", "bme280_humidity",
+                         "ccs811_co2", "ccs811_tvoc", "bh1750_lux"), VALUES))
+        await response.send(json.dumps(data), content_type="application/json")
+
+    async def publisher():
+        while True:
+            feed.publish(int(time.time()), VALUES)
+            await asyncio.sleep(period)
+
+    async def main():
+        await server.start()
+        asyncio.create_task(publisher())
+        ready.set()
+        while True:
+            await asyncio.sleep(0.05)
+            cpu[0] = time.thread_time()
+
+    asyncio.run(main())
+
+
+def poll_client(port, period, stop, counter):
+    request = b"GET /api/sensordata HTTP/1.1\r\nHost: growbox\r\nConnection: close\r\n\r\n"
+    while not stop.is_set():
+        s = socket.create_connection(("127.0.0.1", port))
+        s.sendall(request)
+        while s.recv(4096):
+            pass
+        s.close()
+        counter.append(1)
+        time.sleep(period)
+
+
+def sse_client(port, stop, counter):
+    s = socket.create_connection(("127.0.0.1", port))
+    s.sendall(b"GET /api/stream HTTP/1.1\r\nHost: growbox\r\n\r\n")
+    s.settimeout(0.5)
+    while not stop.is_set():
+        try:
+            data = s.recv(4096)
+        except socket.timeout:
+            continue
+        if not data:
+            break
+        counter.append(data.count(b"\ndata: "))
+    s.close()
+
+
+def run(mode, clients, period, duration):
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+
+    feed = LiveFeed(max_subscribers=max(1, clients))
+    ready, stop = threading.Event(), threading.Event()
+    cpu = [0.0]
+    threading.Thread(target=serve, args=(port, feed, period, ready, cpu), daemon=True).start()
+    ready.wait()
+    time.sleep(0.2)
+
+    counter = []
+    threads = []
+    for _ in range(clients):
+        if mode == "poll":
+            t = threading.Thread(target=poll_client, args=(port, period, stop, counter), daemon=True)
+        else:
+            t = threading.Thread(target=sse_client, args=(port, stop, counter), daemon=True)
+        t.start()
+        threads.append(t)
+    time.sleep(0.5)
+    cpu_start = cpu[0]
+    counter.clear()
+    time.sleep(duration)
+    cpu_used = cpu[0] - cpu_start
+    received = sum(counter)
+    stop.set()
+    for t in threads:
+        t.join()
+    return cpu_used, received
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--period", type=float, default=1.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    samples = args.duration / args.period
+    print("{:<6} {:>8} {:>12} {:>22}".format("Modus", "Clients", "Messungen", "CPU ms/Client/Messung"))
+    for mode in ("poll", "sse"):
+        # Grundlast des Servers ohne Clients wird abgezogen
+        idle, _ = run(mode, 0, args.period, args.duration)
+        for clients in (1, 10, 25):
+            cpu_used, received = run(mode, clients, args.period, args.duration)
+            print("{:<6} {:>8} {:>12} {:>22.3f}".format(
+                mode, clients, received, (cpu_used - idle) * 1000 / clients / samples))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Bytes auf der Leitung und Time-to-first-byte für index.html (CPython)
+#
+# Vergleicht das alte send_html_page (Datei ganz lesen, an den Header
+# hängen, Verbindung schließen) mit webserver.StaticFiles: gzip beim
+# ersten Laden und 304 beim erneuten Laden mit If-None-Match.
+#
+#   python bench/bench_static.py [--requests 200]
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from webserver import HTTPServer, StaticFiles
+
+
+def serve(port, ready):
+    server = HTTPServer(host="127.0.0.1", port=port)
+    static = StaticFiles("www/assets.json")
+    static.register(server)
+
+    @server.route("/legacy")
+    async def send_html_page(request, response):
+        # Stand vor der Umstellung: ganze Datei, keine Länge, kein Caching
+        with open('index.html', 'rb') as f:
+            response.keep_alive = False
+            response.writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n" + f.read())
+            await response.drain()
+
+    async def main():
+        await server.start()
+        ready.set()
+        while True:
+            await asyncio.sleep(3600)
+
+    asyncio.run(main())
+
+
+def fetch(port, request):
+    # Liefert (Bytes gesamt, TTFB, Gesamtdauer); liest bis Content-Length oder EOF
+    t0 = time.perf_counter()
+    s = socket.create_connection(("127.0.0.1", port))
+    s.sendall(request)
+    data = s.recv(65536)
+    ttfb = time.perf_counter() - t0
+    head, _, body = data.partition(b"\r\n\r\n")
+    length = None
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    while length is None or len(body) < length:
+        chunk = s.recv(65536)
+        if not chunk:
+            break
+        body += chunk
+        data += chunk
+    s.close()
+    return len(data), ttfb, time.perf_counter() - t0, head
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    os.chdir(ROOT)
+
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    ready = threading.Event()
+    threading.Thread(target=serve, args=(port, ready), daemon=True).start()
+    ready.wait()
+
+    etag = StaticFiles("www/assets.json").assets["/index.html"]["etag"]
+    cases = (
+        ("alt", b"GET /legacy HTTP/1.1\r\nHost: growbox\r\n\r\n"),
+        ("gzip", b"GET /index.html HTTP/1.1\r\nHost: growbox\r\nAccept-Encoding: gzip\r\nConnection: close\r\n\r\n"),
+        ("304", "GET /index.html HTTP/1.1\r\nHost: growbox\r\nAccept-Encoding: gzip\r\n"
+                "If-None-Match: {}\r\nConnection: close\r\n\r\n".format(etag).encode()),
+    )
+    print("{:<6} {:>10} {:>10} {:>10}".format("Fall", "Bytes", "TTFB ms", "Dauer ms"))
+    for name, request in cases:
+        total = ttfb = duration = 0
+        for _ in range(args.requests):
+            n, first, elapsed, _ = fetch(port, request)
+            total += n
+            ttfb += first
+            duration += elapsed
+        print("{:<6} {:>10.0f} {:>10.3f} {:>10.3f}".format(
+            name, total / args.requests, ttfb / args.requests * 1000, duration / args.requests * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Vergleich write_csv gegen sensor_store.RingStore (läuft unter CPython)
+#
+# Spielt die Werte aus sensor_data.csv ab und misst Bytes pro Messung,
+# mittlere und p99-Schreiblatenz sowie den vorübergehend belegten Heap.
+#
+#   python bench/bench_store.py [--samples 20000]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sensor_store import RingStore, RECORD_SIZE
+from tools.csv_to_ring import parse_date, parse_value
+
+
+def write_csv(filename, date, bme280_temp, bme280_pressure, bme280_humidity, ccs811_co2, ccs811_tvoc, bh1750_lux):
+    # Stand vor der Umstellung aus main.py
+    with open(filename, 'a') as csvfile:
+        csvfile.write(f"{date},{bme280_temp},{bme280_pressure},{bme280_humidity},{ccs811_co2},{ccs811_tvoc},{bh1750_lux}\n")
+
+
+def load_samples(count):
+    rows = []
+    with open(os.path.join(ROOT, "sensor_data.csv")) as f:
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) == 7:
+                rows.append((parts[0], parse_date(parts[0]), [parse_value(v) for v in parts[1:]]))
+    return [rows[i % len(rows)] for i in range(count)]
+
+
+def measure(samples, write):
+    latencies = []
+    for sample in samples:
+        t0 = time.perf_counter()
+        write(sample)
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+    return sum(latencies) / len(latencies) * 1e6, latencies[int(len(latencies) * 0.99)] * 1e6
+
+
+def heap_peak(samples, write):
+    # Vorübergehend belegter Heap pro Messung (Spitze über dem Ruhestand)
+    tracemalloc.start()
+    total = 0
+    for sample in samples:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        write(sample)
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return total / len(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=20000)
+    args = parser.parse_args()
+    samples = load_samples(args.samples)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "sensor_data.csv")
+        bin_path = os.path.join(tmp, "sensor_data.bin")
+
+        def csv_write(sample):
+            write_csv(csv_path, sample[0], *sample[2])
+
+        store = RingStore(bin_path, capacity=args.samples, batch=6)
+
+        def ring_write(sample):
+            store.append(sample[1], *sample[2])
+
+        csv_mean, csv_p99 = measure(samples, csv_write)
+        ring_mean, ring_p99 = measure(samples, ring_write)
+        store.flush()
+        csv_bytes = os.path.getsize(csv_path) / len(samples)
+        csv_heap = heap_peak(samples[:2000], csv_write)
+        ring_heap = heap_peak(samples[:2000], ring_write)
+        store.close()
+
+    print("{:<10} {:>12} {:>12} {:>12} {:>14}".format("Format", "Bytes/Wert", "Mittel us", "p99 us", "Heap B/Wert"))
+    print("{:<10} {:>12.1f} {:>12.1f} {:>12.1f} {:>14.1f}".format("csv", csv_bytes, csv_mean, csv_p99, csv_heap))
+    print("{:<10} {:>12.1f} {:>12.1f} {:>12.1f} {:>14.1f}".format("ring", RECORD_SIZE, ring_mean, ring_p99, ring_heap))
+
+
+if __name__ == "__main__":
+    main()
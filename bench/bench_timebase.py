@@ -0,0 +1,155 @@
+# Zeitstempel: Kosten pro Messung und Umrechnung in Ortszeit (CPython)
+#
+#  - pro Messung: bisher is_dst_europe() und format_datetime_custom() auf
+#    localtime() (der alte sync_time_with_dst/CSV-Weg), jetzt nur
+#    unix_time() als Zahl,
+#  - --count Zeitstempel (Standard 1 Million, 10-Sekunden-Raster ab 2024)
+#    in Ortszeit: bisher is_dst_europe() auf gmtime() für jeden, jetzt
+#    timebase.LOCAL.offset() mit der Umstellungstabelle, der Reihe nach
+#    und in zufälliger Reihenfolge; dazu format_time() für alle,
+#  - Abstand zu UTC gegen zoneinfo Europe/Berlin an jeder Umstellung
+#    2000-2037 (je eine Sekunde davor, genau, danach),
+#  - Messungen vor der Zeit-Synchronisation: mit der Laufzeit gespeichert,
+#    danach mit RingStore.fix_times() korrigiert, müssen über den Zeitindex
+#    an der richtigen Stelle gefunden werden.
+#
+#   python bench/bench_timebase.py [--count 1000000]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+import utime
+from sensor_store import RingStore, format_time, unix_time
+from timebase import LOCAL, Zone, transitions
+
+START = 1704067200
+
+
+# bisher in main.py
+def is_dst_europe(dt):
+    year, month, day, hour, minute, second, weekday, yearday = dt
+    if month > 3 and month < 10:
+        return True
+    if month == 3:
+        return (day + (6 - weekday)) > 31
+    if month == 10:
+        return not (day + (6 - weekday)) > 31
+    return False
+
+
+def format_datetime_custom(dt):
+    year, month, day, hour, minute, second, _, _ = dt
+    return "{:04d}/{:02d}/{:02d}-{:02d}:{:02d}:{:02d}".format(year, month, day, hour, minute, second)
+
+
+def bisher_sample():
+    offset = 2 if is_dst_europe(utime.localtime()) else 1
+    return format_datetime_custom(utime.localtime(utime.time() + offset * 3600))
+
+
+def per_sample(n=200000):
+    result = []
+    for func in (bisher_sample, unix_time):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            func()
+        result.append((time.perf_counter() - t0) * 1e6 / n)
+    return result
+
+
+def timed(func, timestamps):
+    t0 = time.perf_counter()
+    for ts in timestamps:
+        func(ts)
+    return time.perf_counter() - t0
+
+
+def bulk(count):
+    ordered = range(START, START + count * 10, 10)
+    shuffled = list(ordered)
+    random.Random(1).shuffle(shuffled)
+    return (
+        ("bisher is_dst_europe(gmtime)", timed(lambda ts: is_dst_europe(utime.gmtime(ts)), ordered)),
+        ("Tabelle, der Reihe nach", timed(Zone().offset, ordered)),
+        ("Tabelle, zufällig", timed(Zone().offset, shuffled)),
+        ("format_time()", timed(format_time, ordered)),
+    )
+
+
+def check_zoneinfo():
+    try:
+        import datetime
+        import zoneinfo
+        zone = zoneinfo.ZoneInfo("Europe/Berlin")
+    except Exception:
+        return None
+    wrong = 0
+    for year in range(2000, 2038):
+        for switch in transitions(year):
+            for ts in (switch - 1, switch, switch + 1):
+                expected = datetime.datetime.fromtimestamp(ts, zone).utcoffset().total_seconds()
+                if LOCAL.offset(ts) != expected:
+                    wrong += 1
+    return wrong
+
+
+def pre_ntp():
+    """ True, wenn korrigierte Messungen per range() gefunden werden. """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sensor_data.bin")
+        store = RingStore(path, capacity=1000, batch=6, index_every=16)
+        # vor dem Neustart: 300 Messungen mit gestellter Uhr
+        for i in range(300):
+            store.append(START + i * 10, 20.0, 1000.0, 50.0, 400, 0, float(i))
+        store.close()
+        store = RingStore(path, index_every=16)
+        boot_seq = store.head
+        # nach dem Neustart: 100 Messungen mit der Laufzeit (3 s bis 993 s)
+        for i in range(100):
+            store.append(3 + i * 10, 20.0, 1000.0, 50.0, 400, 0, float(1000 + i))
+        # Synchronisation: die Laufzeit 1000 s entspricht booted + 1000
+        booted = START + 300 * 10 + 600
+        fixed = store.fix_times(boot_seq, booted)
+        found = [record[6] for _, record in store.range(booted, booted + 1000)]
+        ok = fixed == 100 and found == [float(1000 + i) for i in range(100)]
+        store.close()
+        # nach einem weiteren Neustart aus der Datei
+        store = RingStore(path, index_every=16)
+        found = [record[6] for _, record in store.range(START, booted + 1000)]
+        store.close()
+        return ok and found == [float(i) for i in range(300)] + [float(1000 + i) for i in range(100)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=1000000)
+    args = parser.parse_args()
+
+    old, new = per_sample()
+    print("Zeitstempel pro Messung: bisher {:.2f} µs (String), jetzt {:.2f} µs (unix_time)".format(old, new))
+    print()
+    print("{} Zeitstempel in Ortszeit".format(args.count))
+    for label, seconds in bulk(args.count):
+        print("  {:<30} {:>7.2f} s {:>8.0f} ns/Stück".format(label, seconds, seconds * 1e9 / args.count))
+    print()
+    wrong = check_zoneinfo()
+    if wrong is None:
+        print("zoneinfo nicht verfügbar, Umstellungen nicht geprüft")
+    else:
+        print("Umstellungen 2000-2037 gleich zoneinfo Europe/Berlin:", "ja" if not wrong else "NEIN, {} falsch".format(wrong))
+    print("Messungen vor der Synchronisation korrigiert und gefunden:", "ja" if pre_ntp() else "NEIN")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# Konsistenztest für die Übergabe der Messwerte zwischen Threads (CPython)
+#
+# Ein Sampler-Thread liest sechs Werte aus einem Fake-Sensor, die alle aus
+# derselben Zykluszahl k abgeleitet sind (k, k+1, ..., k+5). Mehrere
+# Leser-Threads prüfen bei jedem Lesen, ob die sechs Werte zusammenpassen.
+#
+# "globals" ist das Verfahren vor der Umstellung (sechs Modulvariablen,
+# einzeln gesetzt), "snapshot" ist LiveFeed.publish / feed.latest.
+#
+#   python bench/stress_snapshot.py [--reads 1000000] [--readers 2]
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from live import LiveFeed
+
+
+class FakeI2C:
+    # Liefert pro Register einen aus dem aktuellen Zyklus abgeleiteten Wert
+    def __init__(self):
+        self.cycle = 0
+
+    def readfrom_mem(self, register):
+        return self.cycle + register
+
+
+class GlobalsState:
+    def __init__(self):
+        self.temp = self.pressure = self.humidity = 0
+        self.co2 = self.tvoc = self.lux = 0
+
+    def sample(self, bus):
+        self.temp = bus.readfrom_mem(0)
+        self.pressure = bus.readfrom_mem(1)
+        self.humidity = bus.readfrom_mem(2)
+        self.co2 = bus.readfrom_mem(3)
+        self.tvoc = bus.readfrom_mem(4)
+        self.lux = bus.readfrom_mem(5)
+
+    def read(self):
+        return (self.temp, self.pressure, self.humidity, self.co2, self.tvoc, self.lux)
+
+
+class SnapshotState:
+    def __init__(self):
+        self.feed = LiveFeed()
+
+    def sample(self, bus):
+        values = tuple(bus.readfrom_mem(register) for register in range(6))
+        self.feed.publish(1725317552 + bus.cycle, values)
+
+    def read(self):
+        return self.feed.latest.values
+
+
+def run(state, reads, readers):
+    bus = FakeI2C()
+    stop = threading.Event()
+    torn = [0] * readers
+    state.sample(bus)
+
+    def sampler():
+        while not stop.is_set():
+            bus.cycle += 1
+            state.sample(bus)
+
+    def reader(index):
+        bad = 0
+        for _ in range(reads):
+            values = state.read()
+            base = values[0]
+            for i in range(1, 6):
+                if values[i] != base + i:
+                    bad += 1
+                    break
+        torn[index] = bad
+
+    t = threading.Thread(target=sampler)
+    t.start()
+    workers = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    t.join()
+    return sum(torn), reads * readers / elapsed, bus.cycle
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reads", type=int, default=1000000)
+    parser.add_argument("--readers", type=int, default=2)
+    args = parser.parse_args()
+    # Häufige Threadwechsel, damit Überschneidungen tatsächlich auftreten
+    sys.setswitchinterval(1e-6)
+
+    print("{:<10} {:>12} {:>12} {:>12} {:>10}".format("Verfahren", "Lesezugriffe", "inkonsistent", "Lesen/s", "Zyklen"))
+    for name, state in (("globals", GlobalsState()), ("snapshot", SnapshotState())):
+        torn, rate, cycles = run(state, args.reads, args.readers)
+        print("{:<10} {:>12} {:>12} {:>12.0f} {:>10}".format(name, args.reads * args.readers, torn, rate, cycles))
+        if name == "snapshot" and torn:
+            sys.exit("Snapshot lieferte inkonsistente Werte")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+# Benchmark-Suite: ein vergleichbarer Bericht pro Commit (CPython)
+#
+# Startet main.py mit den Ersatzmodulen aus sim/ (simulierter I2C-Bus mit
+# Buszeiten wie bei 100 kHz, WLAN, NTP) in einem leeren Arbeitsverzeichnis
+# und misst am laufenden Programm:
+#  - Start: Zeit vom Anfang von main.py bis zur ersten HTTP-Antwort und bis
+#    zur ersten aufgezeichneten Messung (ein Client fragt dazu alle 5 ms
+#    an), WLAN und Uhrzeit, I2C-Transaktionen,
+#  - Sensorzyklus: Anstoßen, Wandlung abwarten, Abholen aller Sensoren,
+#    dabei werden Zeilen aus sensor_data.csv über die Modelle abgespielt,
+#  - Speicher: Spitzenbelegung (tracemalloc) für einen Sensorzyklus und
+#    für record_sample(),
+#  - HTTP: Anfragen/s und p99 mit 10 Clients (Keep-Alive) je Route,
+#  - OTA: Prüfen und Laden eines Updates von main.py vom lokalen OTA-Server
+#    (80 ms Antwortzeit, 60 kB/s wie über das WLAN des ESP32),
+#  - Replay: größte Abweichung zwischen CSV und gelesenem Wert nach dem
+#    Weg über Register, Kompensation und Filter (simulierte Uhr).
+# Die Zahlen sind Wanduhrzeiten auf dem PC; verglichen werden sollten nur
+# Läufe auf derselben Maschine.
+#
+#   python bench/suite.py [--json bericht.json] [--compare alt.json] [--quick]
+
+import argparse
+import ast
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.client import HTTPConnection
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+from sim import machine, network
+from sim.clock import FakeClock
+from sim.i2c import growbox
+from sim.ota_server import OTAServer
+from sim.replay import Replay
+
+KINDS = ("bme280", "bh1750")
+ROUTES = ("/api/sensordata", "/api/sensors", "/api/history?points=200", "/")
+# Schlüssel, Beschriftung, Einheit, besser ist "kleiner" oder "größer"
+METRICS = (
+    ("boot_http_ms", "Start bis erste HTTP-Antwort", "ms", "kleiner"),
+    ("boot_sample_ms", "Start bis erste Messung", "ms", "kleiner"),
+    ("boot_wlan_ms", "  WLAN verbunden", "ms", "kleiner"),
+    ("boot_ntp_ms", "  Uhrzeit gestellt", "ms", "kleiner"),
+    ("boot_i2c", "  I2C-Transaktionen beim Start", "", "kleiner"),
+    ("cycle_ms", "Sensorzyklus", "ms", "kleiner"),
+    ("cycle_i2c", "  I2C-Transaktionen pro Zyklus", "", "kleiner"),
+    ("cycle_peak", "Speicher Sensorzyklus", "B", "kleiner"),
+    ("record_us", "record_sample()", "µs", "kleiner"),
+    ("record_peak", "Speicher record_sample()", "B", "kleiner"),
+) + tuple(("http:" + route, "HTTP " + route, "Anfr./s", "größer") for route in ROUTES) + tuple(
+    ("p99:" + route, "  p99 " + route, "ms", "kleiner") for route in ROUTES) + (
+    ("ota_s", "OTA-Update main.py", "s", "kleiner"),
+    ("ota_requests", "  HTTP-Anfragen", "", "kleiner"),
+    ("ota_bytes", "  übertragene Bytes", "B", "kleiner"),
+    ("replay_temp", "Replay max. Abweichung Temperatur", "°C", "kleiner"),
+    ("replay_pressure", "Replay max. Abweichung Luftdruck", "hPa", "kleiner"),
+    ("replay_humidity", "Replay max. Abweichung Luftfeuchte", "%", "kleiner"),
+    ("replay_lux", "Replay max. Abweichung Licht", "lx", "kleiner"),
+)
+
+
+def commit():
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return "?"
+    return head + (" (geändert)" if dirty else "")
+
+
+def boot_code():
+    """ main.py ohne den abschließenden asyncio.run(main()), der den
+        Webserver für immer laufen ließe. """
+    with open(os.path.join(ROOT, "main.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    last = tree.body[-1]
+    if isinstance(last, ast.Expr) and isinstance(last.value, ast.Call) and \
+            getattr(last.value.func, "attr", None) == "run":
+        tree.body.pop()
+    return compile(tree, "main.py", "exec")
+
+
+def boot(workdir):
+    """ Führt main.py bis vor asyncio.run(main()) im Arbeitsverzeichnis aus;
+        (Namensraum, Bus). """
+    for name in ("www", "index.html"):
+        source = os.path.join(ROOT, name)
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(workdir, name))
+        elif os.path.exists(source):
+            shutil.copy(source, workdir)
+    bus = growbox()
+    machine.use_bus(bus)
+    network.reset()
+    code = boot_code()
+    namespace = {"__name__": "growbox_main"}
+    os.chdir(workdir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        exec(code, namespace)
+    return namespace, bus
+
+
+def run_main(ns, timeout_s=30):
+    """ Lässt main() laufen, bis die erste Messung aufgezeichnet, die erste
+        HTTP-Anfrage beantwortet und die Uhr gestellt ist; gibt
+        startup.milestones zurück. """
+    server = ns["server"]
+    server.host = "127.0.0.1"
+    server.port = free_port()
+    startup = ns["startup"]
+    control = {}
+    ready = threading.Event()
+
+    async def run():
+        control["loop"] = asyncio.get_running_loop()
+        control["stop"] = asyncio.Event()
+        ready.set()
+        task = asyncio.create_task(ns["main"]())
+        await control["stop"].wait()
+        while server.clients:
+            await asyncio.sleep(0.01)
+        tasks = [task] + ns["scheduler"].tasks + startup.tasks
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        ns["scheduler"].tasks = []
+        server.server.close()
+        await server.server.wait_closed()
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        thread = threading.Thread(target=asyncio.run, args=(run(),))
+        thread.start()
+        ready.wait()
+        deadline = time.monotonic() + timeout_s
+        while "erste_antwort" not in startup.milestones and time.monotonic() < deadline:
+            try:
+                conn = HTTPConnection("127.0.0.1", server.port, timeout=1)
+                conn.request("GET", "/api/sensordata")
+                conn.getresponse().read()
+                conn.close()
+            except OSError:
+                time.sleep(0.005)
+        while not all(name in startup.milestones for name in ("erste_messung", "ntp")) and \
+                time.monotonic() < deadline:
+            time.sleep(0.01)
+        control["loop"].call_soon_threadsafe(control["stop"].set)
+        thread.join()
+    return dict(startup.milestones)
+
+
+def sensor_cycles(ns, bus, cycles):
+    sensors = ns["sensors"]
+    replay = Replay(bus, loop=True)
+
+    def cycle():
+        time.sleep_ms(sensors.start(*KINDS))
+        sensors.collect(*KINDS)
+        sensors.collect("ccs811")
+
+    # bis der BH1750 seinen Messbereich für die ersten Zeilen gefunden hat
+    for _ in range(3):
+        replay.step()
+        cycle()
+    times = []
+    bus.reset_stats()
+    for _ in range(cycles):
+        replay.step()
+        t0 = time.perf_counter()
+        cycle()
+        times.append(time.perf_counter() - t0)
+    transactions = bus.transactions / cycles
+    tracemalloc.start()
+    cycle()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times) * 1000, transactions, peak
+
+
+def record(ns, count):
+    record_sample = ns["record_sample"]
+    with contextlib.redirect_stdout(io.StringIO()):
+        record_sample()
+        t0 = time.perf_counter()
+        for _ in range(count):
+            record_sample()
+        elapsed = time.perf_counter() - t0
+        tracemalloc.start()
+        record_sample()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed * 1e6 / count, peak
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = None
+    chunked = False
+    for line in head.split(b"\r\n"):
+        lower = line.lower()
+        if lower.startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+        elif lower.startswith(b"transfer-encoding:") and b"chunked" in lower:
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    elif length is not None:
+        await reader.readexactly(length)
+
+
+async def _client(port, path, count, latencies):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request = "GET {} HTTP/1.1\r\nHost: growbox\r\nAccept-Encoding: gzip\r\n\r\n".format(path).encode()
+    for _ in range(count):
+        t0 = time.perf_counter()
+        writer.write(request)
+        await writer.drain()
+        await _read_response(reader)
+        latencies.append(time.perf_counter() - t0)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def _load(port, path, requests, clients=10):
+    latencies = []
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_client(port, path, requests // clients, latencies)
+                           for _ in range(clients)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+def http(ns, requests):
+    server = ns["server"]
+    server.host = "127.0.0.1"
+    server.port = free_port()
+    server.max_clients = 16
+    ready = threading.Event()
+    control = {}
+
+    async def serve():
+        control["loop"] = asyncio.get_running_loop()
+        control["stop"] = asyncio.Event()
+        with contextlib.redirect_stdout(io.StringIO()):
+            await server.start()
+        ready.set()
+        await control["stop"].wait()
+        # Die Clients haben ihre Verbindungen geschlossen; warten, bis der
+        # Server das bemerkt hat, statt die Tasks abzubrechen
+        while server.clients:
+            await asyncio.sleep(0.01)
+        server.server.close()
+        await server.server.wait_closed()
+
+    thread = threading.Thread(target=asyncio.run, args=(serve(),))
+    thread.start()
+    ready.wait()
+    results = {}
+    try:
+        for route in ROUTES:
+            # sonst zählen die Verbindungen der vorigen Route noch gegen max_clients
+            while server.clients:
+                time.sleep(0.01)
+            results[route] = asyncio.run(_load(server.port, route, requests))
+    finally:
+        control["loop"].call_soon_threadsafe(control["stop"].set)
+        thread.join()
+    return results
+
+
+def ota():
+    """ Ein vollständiges Update mit OTAUpdater wie aus main.py heraus. """
+    from ota.ota import OTAUpdater
+
+    workdir = tempfile.mkdtemp(prefix="growbox-ota-")
+    cwd = os.getcwd()
+    with open(os.path.join(ROOT, "main.py"), encoding="utf-8") as f:
+        source = f.read()
+    try:
+        os.chdir(workdir)
+        with open("main.py", "w") as f:
+            f.write(source)
+        with OTAServer(latency_ms=80, bytes_per_s=60000) as server:
+            server.install()
+            # geänderte main.py, sonst gäbe es nichts zu laden
+            server.publish(1, {"main.py": source + "\n# neu\n"})
+            server.reset_stats()
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                try:
+                    OTAUpdater("ssid", "passwort", "https://raw.githubusercontent.com/Luckz1337/Growbox/",
+                               "main.py").download_and_install_update_if_available()
+                except SystemExit:
+                    # machine.reset() nach dem Update
+                    pass
+            return time.perf_counter() - t0, server.requests, server.bytes
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def replay_fidelity(rows):
+    """ Liest wie main.py alle 10 s und vergleicht mit der CSV. """
+    from sensor_manager import SensorManager
+    from i2c_bus import I2CBus
+
+    clock = FakeClock()
+    with clock:
+        bus = growbox(realtime=False, clock=clock)
+        sensors = SensorManager(I2CBus(bus), config=None, baselines=None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            sensors.discover()
+        replay = Replay(bus)
+        worst = [0.0, 0.0, 0.0, 0.0]
+        for n, (stamp, values) in enumerate(replay):
+            if n >= rows:
+                break
+            clock.advance(10)
+            time.sleep_ms(sensors.start(*KINDS))
+            sensors.collect(*KINDS)
+            read = sensors.primary("bme280").values + sensors.primary("bh1750").values
+            expected = values[:3] + values[5:]
+            for i in range(4):
+                worst[i] = max(worst[i], abs(read[i] - expected[i]))
+    return worst
+
+
+def run(args):
+    results = {}
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="growbox-")
+    try:
+        ns, bus = boot(workdir)
+        milestones = run_main(ns)
+        for key, name in (("boot_http_ms", "erste_antwort"), ("boot_sample_ms", "erste_messung"),
+                          ("boot_wlan_ms", "wlan"), ("boot_ntp_ms", "ntp")):
+            if name in milestones:
+                results[key] = milestones[name]
+        results["boot_i2c"] = bus.transactions
+        cycle_ms, transactions, peak = sensor_cycles(ns, bus, 3 if args.quick else 10)
+        results["cycle_ms"] = cycle_ms
+        results["cycle_i2c"] = transactions
+        results["cycle_peak"] = peak
+        results["record_us"], results["record_peak"] = record(ns, 20 if args.quick else 200)
+        for route, (rate, p99) in http(ns, 200 if args.quick else 2000).items():
+            results["http:" + route] = rate
+            results["p99:" + route] = p99
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    results["ota_s"], results["ota_requests"], results["ota_bytes"] = ota()
+    worst = replay_fidelity(100 if args.quick else 1000)
+    for key, value in zip(("replay_temp", "replay_pressure", "replay_humidity", "replay_lux"), worst):
+        results[key] = value
+    return results
+
+
+def report(info, results, previous=None):
+    print("Growbox-Benchmark  Commit {}  Python {}  {}".format(
+        info["commit"], info["python"], info["date"]))
+    if previous:
+        print("Vergleich mit Commit {} vom {}".format(previous["commit"], previous["date"]))
+    print()
+    header = "{:<40} {:>12} {:<8}".format("Messung", "Wert", "Einheit")
+    if previous:
+        header += " {:>12} {:>9}".format("vorher", "Änderung")
+    print(header)
+    for key, label, unit, better in METRICS:
+        if key not in results:
+            continue
+        value = results[key]
+        line = "{:<40} {:>12} {:<8}".format(label, _format(value), unit)
+        old = previous and previous["results"].get(key)
+        if old:
+            change = (value - old) / old * 100
+            worse = change > 0 if better == "kleiner" else change < 0
+            line += " {:>12} {:>8.1f}%{}".format(_format(old), change,
+                                                   " *" if worse and abs(change) >= 10 else "")
+        print(line)
+    if previous:
+        print()
+        print("* mindestens 10 % schlechter")
+
+
+def _format(value):
+    if isinstance(value, int) or value >= 1000:
+        return "{:.0f}".format(value)
+    if value >= 10:
+        return "{:.1f}".format(value)
+    return "{:.3f}".format(value)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json", help="Ergebnis als JSON speichern")
+    parser.add_argument("--compare", help="JSON eines früheren Laufs zum Vergleich")
+    parser.add_argument("--quick", action="store_true", help="weniger Wiederholungen")
+    args = parser.parse_args()
+
+    info = {"commit": commit(), "python": platform.python_version(),
+            "date": time.strftime("%Y-%m-%d %H:%M")}
+    results = run(args)
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    report(info, results, previous)
+    if args.json:
+        info["results"] = results
+        with open(args.json, "w") as f:
+            json.dump(info, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,11 @@
 #webrepl.start()
 # boot.py
 #
-from ota import OTAUpdater
-from wifi_config import SSID, PASSWORD
+# Die OTA-Prüfung läuft aus main.py im Hintergrund (network_tasks), damit
+# der Start nicht auf WLAN und GitHub wartet; von Hand: import ota.update
 
-def check_for_updates():
-    firmware_url = "https://raw.githubusercontent.com/Luckz1337/Growbox/"
-    ota_updater = OTAUpdater(SSID, PASSWORD, firmware_url, "main.py")
-    ota_updater.download_and_install_update_if_available()
+# Ein OTA-Update, das beim Austauschen der Dateien unterbrochen wurde, wird
+# zurückgerollt, bevor main.py startet
+from ota.ota import recover_interrupted_update
 
-check_for_updates()
+recover_interrupted_update()
@@ -0,0 +1,7 @@
+# Sammeldienst für mehrere Growboxen (CPython, läuft nicht auf dem Gerät)
+#
+#   python -m collector --root data --device box1=192.168.1.20 ...
+#
+# store.py: Spaltenspeicher pro Gerät und Tag, http.py: HTTP-Verbindungen
+# mit Keep-Alive, service.py: Abfragen der Geräte und Annahme von
+# Messungen, die die Geräte selbst schicken.
@@ -0,0 +1,69 @@
+# Sammeldienst starten
+#
+#   python -m collector --root data [--listen 0.0.0.0:8080]
+#                       [--device box1=192.168.1.20 ...] [--devices geraete.txt]
+#                       [--interval 5] [--no-backfill] [--udp 8081]
+#
+# --device und jede Zeile von --devices: Name=Host[:Port]. Ohne Geräte
+# werden nur Messungen angenommen (POST /ingest?device=Name, mit --udp
+# auch Pakete von push.Pusher).
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collector.service import Collector
+from collector.store import ColumnStore
+
+
+def parse_device(text):
+    name, _, address = text.strip().partition("=")
+    host, _, port = address.partition(":")
+    if not name or not host:
+        raise argparse.ArgumentTypeError("Name=Host[:Port] erwartet: " + text)
+    return name, host, int(port or 80)
+
+
+async def serve(args, devices):
+    collector = Collector(ColumnStore(args.root), args.interval, backfill=not args.no_backfill)
+    for name, host, port in devices:
+        collector.add_device(name, host, port)
+    host, _, port = args.listen.rpartition(":")
+    await collector.start(host or "0.0.0.0", int(port), args.udp)
+    print("Sammeldienst auf {}{}, {} Geräte".format(
+        args.listen, ", UDP {}".format(args.udp) if args.udp else "", len(devices)))
+    try:
+        while True:
+            await asyncio.sleep(60)
+            print(collector.status())
+    finally:
+        await collector.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m collector")
+    parser.add_argument("--root", default="data", help="Verzeichnis des Spaltenspeichers")
+    parser.add_argument("--listen", default="0.0.0.0:8080", help="Adresse für POST /ingest")
+    parser.add_argument("--device", action="append", type=parse_device, default=[],
+                        help="Name=Host[:Port], mehrfach möglich")
+    parser.add_argument("--devices", help="Datei mit einer Angabe Name=Host[:Port] pro Zeile")
+    parser.add_argument("--interval", type=float, default=5.0, help="Abfrageabstand in s")
+    parser.add_argument("--udp", type=int, help="UDP-Port für Pakete von push.Pusher")
+    parser.add_argument("--no-backfill", action="store_true", help="nichts über /api/export nachholen")
+    args = parser.parse_args()
+
+    devices = list(args.device)
+    if args.devices:
+        with open(args.devices) as f:
+            devices += [parse_device(line) for line in f if line.strip() and not line.startswith("#")]
+    try:
+        asyncio.run(serve(args, devices))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# HTTP/1.1 über asyncio-Streams für den Sammeldienst
+#
+# Connection hält eine Verbindung zu einem Gerät offen (Keep-Alive) und
+# baut sie nur neu auf, wenn das Gerät sie geschlossen hat. Das Gerät
+# schließt Verbindungen, auf denen 10 s keine Anfrage kommt
+# (HTTPServer.timeout); schlägt eine Anfrage auf einer wiederverwendeten
+# Verbindung fehl, wird sie deshalb einmal auf einer neuen wiederholt.
+#
+# read_head() und read_body() lesen Anfragen und Antworten gleichermaßen,
+# mit Content-Length oder chunked.
+
+import asyncio
+
+MAX_HEADER_LINES = 64
+MAX_BODY = 16 * 1024 * 1024
+
+
+class HTTPError(Exception):
+    pass
+
+
+async def read_head(reader):
+    """ (Start-Zeile, Header mit kleinen Namen); (None, None) wenn die
+        Verbindung vorher endet. """
+    line = await reader.readline()
+    if not line:
+        return None, None
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        header = await reader.readline()
+        if not header:
+            raise HTTPError("Verbindung im Header beendet")
+        if header == b"\r\n":
+            return line.decode("latin-1").rstrip("\r\n"), headers
+        name, _, value = header.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    raise HTTPError("Zu viele Header")
+
+
+async def read_body(reader, headers):
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if not size:
+                # Trailer bis zur Leerzeile
+                while (await reader.readline()) not in (b"\r\n", b""):
+                    pass
+                return bytes(body)
+            if len(body) + size > MAX_BODY:
+                raise HTTPError("Body zu groß")
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY:
+        raise HTTPError("Body zu groß")
+    return await reader.readexactly(length) if length else b""
+
+
+class Connection:
+    def __init__(self, host, port=80, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.connects = 0
+        self.requests = 0
+
+    async def _open(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout)
+        self.connects += 1
+
+    async def close(self):
+        writer = self.writer
+        self.reader = self.writer = None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def request(self, method, path, headers=None, body=b"", timeout=None):
+        """ (Status, Header, Body); timeout gilt für die ganze Antwort. """
+        timeout = timeout or self.timeout
+        reused = self.writer is not None
+        try:
+            return await self._request(method, path, headers, body, timeout)
+        except (OSError, asyncio.IncompleteReadError, HTTPError, asyncio.TimeoutError):
+            await self.close()
+            if not reused:
+                raise
+        return await self._request(method, path, headers, body, timeout)
+
+    async def _request(self, method, path, headers, body, timeout):
+        if self.writer is None:
+            await self._open()
+        head = "{} {} HTTP/1.1\r\nHost: {}\r\n".format(method, path, self.host)
+        for name, value in (headers or {}).items():
+            head += "{}: {}\r\n".format(name, value)
+        if body or method == "POST":
+            head += "Content-Length: {}\r\n".format(len(body))
+        self.writer.write(head.encode("latin-1") + b"\r\n")
+        if body:
+            self.writer.write(body)
+        await asyncio.wait_for(self.writer.drain(), self.timeout)
+        line, response_headers = await asyncio.wait_for(read_head(self.reader), timeout)
+        if line is None:
+            raise HTTPError("Verbindung ohne Antwort beendet")
+        parts = line.split(None, 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise HTTPError("Ungültige Statuszeile: " + line)
+        status = int(parts[1])
+        if status in (204, 304) or "content-length" in response_headers or \
+                response_headers.get("transfer-encoding", "").lower() == "chunked":
+            data = await asyncio.wait_for(read_body(self.reader, response_headers), timeout)
+        else:
+            # ohne Länge endet der Body mit der Verbindung
+            data = await asyncio.wait_for(self.reader.read(), timeout)
+            response_headers["connection"] = "close"
+        self.requests += 1
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, response_headers, data
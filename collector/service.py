@@ -0,0 +1,273 @@
+# Sammeldienst: fragt Geräte ab und nimmt Messungen an
+#
+# Abfragen: pro Gerät ein Task mit einer offenen Verbindung
+# (http.Connection). Beim ersten Kontakt und nach jedem Fehler holt er über
+# /api/export?format=ndjson&from=... nach, was seit der letzten
+# gespeicherten Messung dazugekommen ist; danach alle "interval" Sekunden
+# /api/sensordata mit If-None-Match - ohne neue Messung ist die Antwort ein
+# 304 ohne Inhalt. Der Abstand muss unter dem Keep-Alive-Timeout des
+# Geräts (10 s) liegen, sonst wird jedes Mal neu verbunden.
+#
+# Annahme: POST /ingest?device=<Name> mit Zeilen im Format von
+# /api/export?format=ndjson ("timestamp" in Unix-Zeit), Antwort
+# {"rows": empfangen, "new": davon neu}; die Verbindung bleibt offen.
+# GET /status liefert die Zähler.
+#
+# UDP (start(udp_port=...)): Pakete von push.Pusher, binär mit bis zu 62
+# Messungen; jedes übernommene Paket wird mit einem ACK an den Absender
+# bestätigt, kaputte werden nur gezählt.
+#
+# Alle Tasks laufen in einer Event-Schleife; geschrieben wird alle
+# "flush_s" Sekunden in einem eigenen Thread (ColumnStore.take/write).
+
+import asyncio
+import json
+import random
+
+from collector.http import Connection, HTTPError, read_body, read_head
+from collector.store import check_device, typed_row
+from push import decode_frame, encode_ack
+from sensor_store import FIELDS, time_valid
+
+RESPONSE = "HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n"
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+NETWORK_ERRORS = (OSError, HTTPError, asyncio.TimeoutError, asyncio.IncompleteReadError)
+
+
+def parse_ndjson(data):
+    """ [(Zeit, Werte)] aus Zeilen von /api/export?format=ndjson, mit den
+        Typen der Spalten; ValueError, KeyError oder TypeError, wenn eine
+        Zeile nicht passt - dann wird keine übernommen. """
+    rows = []
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        rows.append(typed_row(item["timestamp"], (item[name] for name in FIELDS)))
+    return rows
+
+
+class Device:
+    def __init__(self, name, host, port=80):
+        self.name = check_device(name)
+        self.connection = Connection(host, port)
+        self.etag = None
+        self.polls = 0
+        self.rows = 0
+        self.errors = 0
+        self.last_error = None
+
+
+class TelemetryProtocol(asyncio.DatagramProtocol):
+    def __init__(self, collector):
+        self.collector = collector
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        collector = self.collector
+        try:
+            device, seq, rows = decode_frame(data)
+            check_device(device)
+        except ValueError:
+            collector.bad_frames += 1
+            return
+        collector.frames += 1
+        collector.ingest(device, rows)
+        self.transport.sendto(encode_ack(seq + len(rows)), addr)
+
+
+class Collector:
+    def __init__(self, store, interval=5.0, flush_s=1.0, backfill=True, timeout=10):
+        self.store = store
+        self.interval = interval
+        self.flush_s = flush_s
+        self.backfill = backfill
+        self.timeout = timeout
+        self.devices = {}
+        self.tasks = []
+        self.server = None
+        self.udp = None
+        self.clients = 0
+        # Task -> Writer der offenen Verbindungen, für stop()
+        self._handlers = {}
+        # laufender Schreibvorgang im Thread
+        self._writing = None
+        self.received = 0
+        self.added = 0
+        self.requests = 0
+        self.frames = 0
+        self.bad_frames = 0
+
+    def add_device(self, name, host, port=80):
+        device = self.devices[name] = Device(name, host, port)
+        return device
+
+    def ingest(self, device, rows):
+        """ Übernimmt (Zeit, Werte) eines Geräts; Zeiten vor der
+            Zeit-Synchronisation des Geräts werden verworfen. """
+        self.received += len(rows)
+        added = self.store.extend(device, [row for row in rows if time_valid(row[0])])
+        self.added += added
+        return added
+
+    async def _backfill(self, device):
+        last = self.store.last_time(device.name)
+        path = "/api/export?format=ndjson"
+        if last is not None:
+            path += "&from={}".format(last + 1)
+        # der ganze Ringspeicher braucht auf dem ESP32 eine Weile
+        status, _, body = await device.connection.request("GET", path, timeout=300)
+        if status == 200:
+            device.rows += self.ingest(device.name, parse_ndjson(body))
+        elif status != 404:
+            raise HTTPError("export: Status {}".format(status))
+
+    async def _poll_once(self, device):
+        headers = {"If-None-Match": device.etag} if device.etag else None
+        status, headers, body = await device.connection.request("GET", "/api/sensordata", headers)
+        device.polls += 1
+        if status == 304:
+            return
+        if status != 200:
+            raise HTTPError("sensordata: Status {}".format(status))
+        device.etag = headers.get("etag")
+        item = json.loads(body)
+        values = tuple(item.get(name) for name in FIELDS)
+        if item.get("seq") and None not in values:
+            device.rows += self.ingest(device.name, [(int(item["timestamp"]), values)])
+
+    async def poll(self, device):
+        # Start verteilen, damit nicht alle Geräte gleichzeitig gefragt werden
+        await asyncio.sleep(random.random() * self.interval)
+        backoff = 1
+        backfill = self.backfill
+        while True:
+            try:
+                if backfill:
+                    await self._backfill(device)
+                    backfill = False
+                await self._poll_once(device)
+                backoff = 1
+            except (NETWORK_ERRORS + (ValueError, KeyError, TypeError)) as e:
+                device.errors += 1
+                device.last_error = repr(e)
+                await device.connection.close()
+                backfill = self.backfill
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+                continue
+            await asyncio.sleep(self.interval)
+
+    def _dispatch(self, method, target, headers, body):
+        path, _, query = target.partition("?")
+        params = dict(pair.partition("=")[::2] for pair in query.split("&") if pair)
+        if path == "/status":
+            return 200, self.status()
+        if path != "/ingest":
+            return 404, {"error": "not found"}
+        if method != "POST":
+            return 405, {"error": "POST"}
+        try:
+            device = check_device(params.get("device", ""))
+            rows = parse_ndjson(body)
+        except (ValueError, KeyError, TypeError, OverflowError) as e:
+            return 400, {"error": str(e)}
+        return 200, {"rows": len(rows), "new": self.ingest(device, rows)}
+
+    async def handle(self, reader, writer):
+        self.clients += 1
+        task = asyncio.current_task()
+        self._handlers[task] = writer
+        try:
+            while True:
+                line, headers = await asyncio.wait_for(read_head(reader), self.timeout)
+                if line is None:
+                    break
+                parts = line.split()
+                if len(parts) != 3:
+                    break
+                method, target, version = parts
+                body = await asyncio.wait_for(read_body(reader, headers), self.timeout)
+                self.requests += 1
+                status, result = self._dispatch(method, target, headers, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                payload = json.dumps(result).encode()
+                writer.write(RESPONSE.format(status, REASONS[status], len(payload),
+                                             "keep-alive" if keep_alive else "close").encode() + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (NETWORK_ERRORS + (ValueError, TypeError)):
+            pass
+        finally:
+            self.clients -= 1
+            self._handlers.pop(task, None)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def flush(self):
+        # Immer nur ein Schreibvorgang; wird der Aufrufer abgebrochen (stop()
+        # beendet _flush_loop), schreibt der Thread trotzdem zu Ende und der
+        # nächste flush() wartet darauf
+        while self._writing is not None and not self._writing.done():
+            await asyncio.shield(self._writing)
+        pending = self.store.take()
+        if pending:
+            self._writing = asyncio.ensure_future(asyncio.to_thread(self.store.write, pending))
+            await asyncio.shield(self._writing)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_s)
+            await self.flush()
+
+    async def start(self, host="0.0.0.0", port=8080, udp_port=None):
+        """ Startet Annahme, Abfragen und Schreiben; gibt den Server zurück. """
+        self.server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        if udp_port is not None:
+            self.udp, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: TelemetryProtocol(self), local_addr=(host, udp_port))
+        for device in self.devices.values():
+            self.tasks.append(asyncio.create_task(self.poll(device)))
+        self.tasks.append(asyncio.create_task(self._flush_loop()))
+        return self.server
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        for device in self.devices.values():
+            await device.connection.close()
+        if self.udp is not None:
+            self.udp.close()
+            self.udp = None
+        if self.server is not None:
+            self.server.close()
+            # offene Verbindungen schließen und ihre Tasks enden lassen,
+            # statt sie beim Ende der Event-Schleife abzubrechen
+            handlers = list(self._handlers)
+            for writer in self._handlers.values():
+                writer.close()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            await self.server.wait_closed()
+        await self.flush()
+
+    def status(self):
+        return {
+            "devices": len(self.devices),
+            "clients": self.clients,
+            "received": self.received,
+            "new": self.added,
+            "frames": self.frames,
+            "bad_frames": self.bad_frames,
+            "written": self.store.rows,
+            "pending": self.store.pending_rows,
+            "errors": {name: device.last_error for name, device in self.devices.items() if device.errors},
+        }
@@ -0,0 +1,205 @@
+# Spaltenspeicher für die Messungen aller Geräte
+#
+#   <root>/<Gerät>/<JJJJ-MM-TT>/<Spalte>.bin
+#
+# Pro Gerät und Tag (UTC) ein Verzeichnis, darin pro Spalte eine Datei mit
+# den Werten direkt hintereinander, little-endian, mit den Typen des
+# Ringspeichers auf dem Gerät (sensor_store.RECORD_FORMAT): timestamp als
+# uint32, CO2 und TVOC als uint16, der Rest float32. Lesen lässt sich das
+# ohne diesen Code, z. B. numpy.fromfile(path, "<f4").
+#
+# Neue Messungen werden pro Partition in Arrays gesammelt und mit flush()
+# (oder take() und write() in einem anderen Thread) angehängt. Pro Gerät
+# werden nur Messungen übernommen, die neuer als die letzte sind; doppelt
+# geschickte oder abgefragte Messungen fallen so heraus. Bricht ein
+# Schreibvorgang ab, können die Spalten unterschiedlich lang sein; read()
+# liest dann nur so weit wie die kürzeste, und vor dem nächsten Anhängen
+# werden die anderen auf ihre Länge gekürzt.
+
+import math
+import os
+import re
+import sys
+import time
+from array import array
+
+from sensor_store import FIELDS, RECORD_FORMAT
+
+COLUMNS = ("timestamp",) + FIELDS
+TYPES = tuple(RECORD_FORMAT[1:])
+# größter endlicher float32-Wert; darüber würde die Spalte inf speichern
+FLOAT32_MAX = 3.4028234663852886e38
+DEVICE_NAME = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+def day_of(timestamp):
+    return time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+
+
+def check_device(device):
+    if not DEVICE_NAME.match(device) or device in (".", ".."):
+        raise ValueError("Ungültiger Gerätename: {!r}".format(device))
+    return device
+
+
+def typed_row(timestamp, values):
+    """ (Zeit, Werte) mit den Typen der Spalten: Zeit als uint32, CO2 und
+        TVOC auf 0..65535 begrenzt, der Rest float. ValueError oder
+        TypeError bei fehlenden, unpassenden oder nicht endlichen Werten
+        (NaN, Infinity, 1e400 aus json.loads). """
+    if isinstance(timestamp, bool) or not isinstance(timestamp, int) or not 0 <= timestamp <= 0xFFFFFFFF:
+        raise ValueError("Ungültige Zeit: {!r}".format(timestamp))
+    values = tuple(values)
+    if len(values) != len(FIELDS):
+        raise ValueError("{} Werte statt {}".format(len(values), len(FIELDS)))
+    row = []
+    for typecode, value in zip(TYPES[1:], values):
+        if isinstance(value, (str, bytes)) or value is None:
+            raise TypeError("Ungültiger Wert: {!r}".format(value))
+        try:
+            number = float(value)
+        except OverflowError:
+            number = math.inf
+        if not math.isfinite(number) or abs(number) > FLOAT32_MAX:
+            raise ValueError("Ungültiger Wert: {!r}".format(value))
+        if typecode == "H":
+            number = 0 if number < 0 else 65535 if number > 65535 else int(number)
+        row.append(number)
+    return timestamp, tuple(row)
+
+
+class ColumnStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        # (Gerät, Tag) -> eine array pro Spalte
+        self.pending = {}
+        self.pending_rows = 0
+        self.rows = 0
+        self._last = {}
+        # Partitionen, deren Spalten seit dem Start gleich lang sind
+        self._aligned = set()
+
+    def _new_columns(self):
+        return [array(t) for t in TYPES]
+
+    def last_time(self, device):
+        """ Zeit der neuesten Messung des Geräts, None wenn keine. """
+        if device not in self._last:
+            self._last[device] = self._load_last(check_device(device))
+        return self._last[device]
+
+    def _load_last(self, device):
+        directory = os.path.join(self.root, device)
+        try:
+            days = sorted(os.listdir(directory), reverse=True)
+        except OSError:
+            return None
+        for day in days:
+            column = self.read(device, day)["timestamp"]
+            if column:
+                return column[-1]
+        return None
+
+    def append(self, device, timestamp, values):
+        """ Eine Messung; False, wenn sie nicht neuer als die letzte ist.
+            Ungültige Werte (typed_row) ändern nichts. """
+        timestamp, values = typed_row(timestamp, values)
+        last = self.last_time(device)
+        if last is not None and timestamp <= last:
+            return False
+        self._last[device] = timestamp
+        key = (device, day_of(timestamp))
+        columns = self.pending.get(key)
+        if columns is None:
+            columns = self.pending[key] = self._new_columns()
+        columns[0].append(timestamp)
+        for column, value in zip(columns[1:], values):
+            column.append(value)
+        self.pending_rows += 1
+        return True
+
+    def extend(self, device, rows):
+        """ Mehrere (Zeit, Werte); gibt die Anzahl der übernommenen zurück. """
+        added = 0
+        for timestamp, values in rows:
+            if self.append(device, timestamp, values):
+                added += 1
+        return added
+
+    def take(self):
+        """ Gesammelte Messungen zum Schreiben übernehmen (im Thread der
+            Event-Schleife); danach wird neu gesammelt. """
+        pending = self.pending
+        self.pending = {}
+        self.pending_rows = 0
+        return pending
+
+    def write(self, pending):
+        """ Hängt take() an die Spaltendateien an; darf in einem eigenen
+            Thread laufen. Gibt die Anzahl der Zeilen zurück. """
+        rows = 0
+        for (device, day), columns in pending.items():
+            directory = os.path.join(self.root, device, day)
+            os.makedirs(directory, exist_ok=True)
+            if (device, day) not in self._aligned:
+                self._align(directory)
+                self._aligned.add((device, day))
+            for name, column in zip(COLUMNS, columns):
+                if sys.byteorder == "big":
+                    column.byteswap()
+                with open(os.path.join(directory, name + ".bin"), "ab") as f:
+                    column.tofile(f)
+            rows += len(columns[0])
+        self.rows += rows
+        return rows
+
+    def flush(self):
+        return self.write(self.take())
+
+    def _align(self, directory):
+        lengths = []
+        for name, typecode in zip(COLUMNS, TYPES):
+            try:
+                size = os.path.getsize(os.path.join(directory, name + ".bin"))
+            except OSError:
+                size = 0
+            lengths.append(size // array(typecode).itemsize)
+        rows = min(lengths)
+        for name, typecode, length in zip(COLUMNS, TYPES, lengths):
+            if length > rows:
+                with open(os.path.join(directory, name + ".bin"), "r+b") as f:
+                    f.truncate(rows * array(typecode).itemsize)
+
+    def devices(self):
+        try:
+            return sorted(os.listdir(self.root))
+        except OSError:
+            return []
+
+    def days(self, device):
+        try:
+            return sorted(os.listdir(os.path.join(self.root, check_device(device))))
+        except OSError:
+            return []
+
+    def read(self, device, day, names=COLUMNS):
+        """ Spalten einer Partition als arrays, alle gleich lang. """
+        directory = os.path.join(self.root, check_device(device), day)
+        result = {}
+        for name in names:
+            column = array(TYPES[COLUMNS.index(name)])
+            path = os.path.join(directory, name + ".bin")
+            try:
+                size = os.path.getsize(path)
+                with open(path, "rb") as f:
+                    column.fromfile(f, size // column.itemsize)
+            except OSError:
+                pass
+            if sys.byteorder == "big":
+                column.byteswap()
+            result[name] = column
+        length = min(len(column) for column in result.values())
+        for name in names:
+            del result[name][length:]
+        return result
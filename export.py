@@ -0,0 +1,45 @@
+# Export der Messdaten als CSV oder NDJSON
+#
+# Die Datensätze werden blockweise per readinto gelesen (RingStore.records)
+# und über einen festen Puffer als HTTP-Chunks verschickt. Der
+# Speicherbedarf hängt damit nicht von der Größe des Logs ab.
+#
+# "timestamp" ist die gespeicherte Unix-Zeit (UTC), "date" nur die
+# Ortszeit zum Lesen.
+
+from history import ROW_FORMAT
+from sensor_store import FIELDS, format_time
+
+CHUNK_SIZE = 1024
+
+CSV_HEADER = ("timestamp,date," + ",".join(FIELDS) + "\n").encode()
+CSV_FORMAT = "{},{},{:.2f},{:.2f},{:.2f},{:.0f},{:.0f},{:.1f}\n"
+NDJSON_FORMAT = '{{"timestamp":{},' + ROW_FORMAT[2:] + "\n"
+
+FORMATS = {
+    "csv": ("text/csv", CSV_FORMAT),
+    "ndjson": ("application/x-ndjson", NDJSON_FORMAT),
+}
+
+
+async def send_export(store, response, fmt, start, stop):
+    content_type, line_format = FORMATS[fmt]
+    headers = 'Content-Disposition: attachment; filename="sensor_data.{}"\r\n'.format(fmt)
+    await response.start(content_type=content_type, headers=headers, chunked=True)
+
+    buf = bytearray(CHUNK_SIZE)
+    view = memoryview(buf)
+    used = 0
+    if fmt == "csv":
+        buf[:len(CSV_HEADER)] = CSV_HEADER
+        used = len(CSV_HEADER)
+    for _, record in store.range(start, stop):
+        line = line_format.format(record[0], format_time(record[0]), *record[1:]).encode()
+        n = len(line)
+        if used + n > CHUNK_SIZE:
+            await response.write(view[:used])
+            used = 0
+        buf[used:used + n] = line
+        used += n
+    if used:
+        await response.write(view[:used])
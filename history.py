@@ -0,0 +1,129 @@
+# Verlauf für die Graphen im Dashboard
+#
+# Der Zeitraum wird in feste Zeit-Buckets geteilt. Pro Bucket und Messgröße
+# werden nur Minimum und Maximum behalten (in der Reihenfolge, in der sie
+# aufgetreten sind), dadurch bleiben Spitzen sichtbar und die Antwort hat
+# höchstens "points" Zeilen - egal ob ein Tag oder ein Jahr angefragt wird.
+# Für lange Zeiträume kommen Minimum und Maximum aus den Aggregaten von
+# rollup.py statt aus den einzelnen Messungen.
+
+from array import array
+
+from rollup import extremes
+from sensor_store import format_time
+from webserver import asyncio
+
+SERIES = 6
+MAX_POINTS = 1000
+
+ROW_FORMAT = ('{{"date":"{}","bme280_temp":{:.2f},"bme280_pressure":{:.2f},'
+              '"bme280_humidity":{:.2f},"ccs811_co2":{:.0f},"ccs811_tvoc":{:.0f},'
+              '"bh1750_lux":{:.1f}}}')
+
+
+class Downsampler:
+    def __init__(self, start, stop, points):
+        points = MAX_POINTS if points > MAX_POINTS else points
+        self.buckets = points // 2 if points > 1 else 1
+        self.start = start
+        self.stop = stop
+        span = stop - start + 1
+        self.width = (span + self.buckets - 1) // self.buckets
+        if self.width < 1:
+            self.width = 1
+        n = self.buckets * SERIES
+        self.mins = array("f", (0.0 for _ in range(n)))
+        self.maxs = array("f", (0.0 for _ in range(n)))
+        self.counts = array("H", (0 for _ in range(self.buckets)))
+        # Bit k gesetzt: bei Messgröße k kam das Minimum nach dem Maximum
+        self.min_last = array("B", (0 for _ in range(self.buckets)))
+        self._row = [0.0] * SERIES
+
+    def add(self, record):
+        timestamp = record[0]
+        if timestamp < self.start or timestamp > self.stop:
+            return
+        bucket = (timestamp - self.start) // self.width
+        base = bucket * SERIES
+        mins = self.mins
+        maxs = self.maxs
+        if self.counts[bucket] == 0:
+            for k in range(SERIES):
+                mins[base + k] = maxs[base + k] = record[k + 1]
+            self.min_last[bucket] = 0
+        else:
+            flags = self.min_last[bucket]
+            for k in range(SERIES):
+                value = record[k + 1]
+                if value < mins[base + k]:
+                    mins[base + k] = value
+                    flags |= 1 << k
+                elif value > maxs[base + k]:
+                    maxs[base + k] = value
+                    flags &= ~(1 << k)
+            self.min_last[bucket] = flags
+        if self.counts[bucket] < 65535:
+            self.counts[bucket] += 1
+
+    def _format(self, timestamp):
+        return ROW_FORMAT.format(format_time(timestamp), *self._row)
+
+    def rows(self):
+        """ Liefert die fertigen JSON-Zeilen in zeitlicher Reihenfolge. """
+        row = self._row
+        for bucket in range(self.buckets):
+            count = self.counts[bucket]
+            if not count:
+                continue
+            base = bucket * SERIES
+            begin = self.start + bucket * self.width
+            flags = self.min_last[bucket]
+            if count == 1:
+                for k in range(SERIES):
+                    row[k] = self.mins[base + k]
+                yield self._format(begin + self.width // 2)
+                continue
+            for k in range(SERIES):
+                row[k] = self.maxs[base + k] if flags & (1 << k) else self.mins[base + k]
+            yield self._format(begin + self.width // 4)
+            for k in range(SERIES):
+                row[k] = self.mins[base + k] if flags & (1 << k) else self.maxs[base + k]
+            yield self._format(begin + 3 * self.width // 4)
+
+
+async def downsample(store, start, stop, points, rollups=None):
+    sampler = Downsampler(start, stop, points)
+    tier = rollups.pick(sampler.width, start, store.first_valid_time()) if rollups else None
+    n = 0
+    if tier is None:
+        for _, record in store.range(start, stop):
+            sampler.add(record)
+            n += 1
+            if n & 255 == 0:
+                # Den Server zwischendurch andere Verbindungen bedienen lassen
+                await asyncio.sleep(0)
+        return sampler
+    for row in tier.rows(start, stop):
+        low, high = extremes(row)
+        sampler.add(low)
+        sampler.add(high)
+        n += 1
+        if n & 63 == 0:
+            await asyncio.sleep(0)
+    return sampler
+
+
+async def send_history(store, response, start, stop, points, rollups=None):
+    sampler = await downsample(store, start, stop, points, rollups)
+    await response.start(content_type="application/json", chunked=True)
+    chunk = bytearray(b"[")
+    separator = b""
+    for row in sampler.rows():
+        chunk += separator
+        chunk += row.encode()
+        separator = b","
+        if len(chunk) >= 1024:
+            await response.write(chunk)
+            chunk = bytearray()
+    chunk += b"]"
+    await response.write(chunk)
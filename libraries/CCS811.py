@@ -13,13 +13,18 @@ from machine import I2C
 class CCS811(object):
     """CCS811 gas sensor. Measures eCO2 in ppm and TVOC in ppb"""
 
-    def __init__(self, i2c=None, addr=90):
+    def __init__(self, i2c=None, addr=90, int_pin=None):
         self.i2c = i2c
         self.addr = addr      # 0x5A = 90, 0x5B = 91
         self.tVOC = 0
         self.eCO2 = 0
         self.mode = 1       # Constant power mode; measurement every second
         self.error = False
+        # Optional machine.Pin connected to nINT. The measure mode below
+        # enables the data ready interrupt, nINT goes low when a new sample
+        # is available and high again once it has been read.
+        self.int_pin = int_pin
+        self._envregister = bytearray(4)
 
         # Check if sensor is vailable at i2c bus address
         devices = i2c.scan()
@@ -45,21 +50,30 @@ class CCS811(object):
         # doesn't seem to work
 
     def data_ready(self):
-        """returns true if new data was downloaded. Values in .eCO2 and .tVOV"""
-        status = self.i2c.readfrom_mem(self.addr, 0x00, 1)
-        # bit 3 in the status register: data_ready
-        if (status[0] >> 3) & 0x01:
-            # datasheet Figure 14: Algorithm Register Byte Order (0x02)
-            register = self.i2c.readfrom_mem(self.addr, 0x02, 4)
-            co2HB = register[0]
-            co2LB = register[1]
-            tVOCHB = register[2]
-            tVOCLB = register[3]
-            self.eCO2 = ((co2HB << 8) | co2LB)
-            self.tVOC = ((tVOCHB << 8) | tVOCLB)
-            return True
+        """returns true if new data was downloaded. Values in .eCO2 and .tVOV
+
+        With int_pin set, nothing is read from the bus until nINT is low,
+        then the result is read without checking the status register."""
+        if self.int_pin is not None:
+            if self.int_pin.value():
+                return False
         else:
-            return False
+            status = self.i2c.readfrom_mem(self.addr, 0x00, 1)
+            # bit 3 in the status register: data_ready
+            if not (status[0] >> 3) & 0x01:
+                return False
+        # datasheet Figure 14: Algorithm Register Byte Order (0x02), the
+        # fifth byte is a copy of the status register
+        register = self.i2c.readfrom_mem(self.addr, 0x02, 5)
+        # bit 0 in the status register: error, details in ERROR_ID (0xE0)
+        self.error = bool(register[4] & 0x01)
+        co2HB = register[0]
+        co2LB = register[1]
+        tVOCHB = register[2]
+        tVOCLB = register[3]
+        self.eCO2 = ((co2HB << 8) | co2LB)
+        self.tVOC = ((tVOCHB << 8) | tVOCLB)
+        return True
 
     def get_baseline(self):
         register = self.i2c.readfrom_mem(self.addr,0x11,2)
@@ -75,17 +89,18 @@ class CCS811(object):
         self.i2c.writeto_mem(self.addr,0x11,register)
     
     def put_envdata(self,humidity,temp):
-        envregister = bytearray([0x00,0x00,0x00,0x00])
-        envregister[0] = int(humidity) << 1
-        t = int(temp//1)
-        tf = temp % 1
-        t_H = (t+25) << 9
-        t_L = int(tf*512)
-        t_comb = t_H | t_L
-        envregister[2] = t_comb >> 8
-        envregister[3] = t_comb & 0xFF
+        # ENV_DATA (0x05): humidity in %RH and temperature in degC + 25,
+        # both as unsigned 16 bit values in units of 1/512
+        envregister = self._envregister
+        h = int(humidity * 512 + 0.5)
+        h = 0 if h < 0 else (0xFFFF if h > 0xFFFF else h)
+        t = int((temp + 25) * 512 + 0.5)
+        t = 0 if t < 0 else (0xFFFF if t > 0xFFFF else t)
+        envregister[0] = h >> 8
+        envregister[1] = h & 0xFF
+        envregister[2] = t >> 8
+        envregister[3] = t & 0xFF
         self.i2c.writeto_mem(self.addr,0x05,envregister)
-        #return envregister
 
 
 
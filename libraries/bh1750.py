@@ -3,6 +3,7 @@
 Micropython BH1750 ambient light sensor driver.
 """
 
+import utime
 from utime import sleep_ms
 
 
@@ -21,11 +22,33 @@ class BH1750():
     ONCE_HIRES_2 = 0x21
     ONCE_LOWRES = 0x23
 
+    # measurement time register, sensitivity scales with MTreg / 69
+    MTREG_MIN = 31
+    MTREG_DEFAULT = 69
+    MTREG_MAX = 254
+
+    # auto-ranging steps from dark to bright as (mode, MTreg):
+    #   H-res 2, MTreg 254:  0.11 lx resolution, up to   7417 lx, 663 ms
+    #   H-res 2, MTreg 69:   0.42 lx resolution, up to  27306 lx, 180 ms
+    #   H-res 1, MTreg 69:   0.83 lx resolution, up to  54612 lx, 180 ms
+    #   L-res,   MTreg 31:   8.9 lx resolution,  up to 121556 lx,  11 ms
+    RANGES = ((CONT_HIRES_2, 254), (CONT_HIRES_2, 69),
+              (CONT_HIRES_1, 69), (CONT_LOWRES, 31))
+    # switch to the next brighter range above this raw count, to the next
+    # darker one once the reading would use less than RANGE_LOW of it
+    RANGE_HIGH = 58982
+    RANGE_LOW = 0.45
+
     # default addr=0x23 if addr pin floating or pulled to ground
     # addr=0x5c if addr pin pulled high
     def __init__(self, bus, addr=0x23):
         self.bus = bus
         self.addr = addr
+        self.mtreg = self.MTREG_DEFAULT
+        # auto-ranging: index into RANGES, starts in the middle
+        self.range = 2
+        # ticks_ms when the running conversion is done, None if idle
+        self._due = None
         self.off()
         self.reset()
 
@@ -47,16 +70,85 @@ class BH1750():
         self.mode = mode
         self.bus.writeto(self.addr, bytes([self.mode]))
 
-    def luminance(self, mode):
-        """Sample luminance (in lux), using specified sensor mode."""
+    def set_mtreg(self, mtreg):
+        """Set the measurement time register (31..254)."""
+        mtreg = max(self.MTREG_MIN, min(self.MTREG_MAX, mtreg))
+        if mtreg != self.mtreg:
+            self.mtreg = mtreg
+            self.bus.writeto(self.addr, bytes([0x40 | (mtreg >> 5)]))
+            self.bus.writeto(self.addr, bytes([0x60 | (mtreg & 0x1F)]))
+            # the running conversion still uses the old value
+            if self.mode is not None and self.mode & 0x10:
+                self.mode = None
+
+    def measurement_ms(self, mode, mtreg=None):
+        """Worst case conversion time in ms for mode and MTreg."""
+        ms = 24 if mode in (0x13, 0x23) else 180
+        return (ms * (mtreg or self.mtreg) + 68) // 69
+
+    def max_lux(self, mode, mtreg=None):
+        """Luminance at which mode and MTreg saturate."""
+        return self.to_lux(0xFFFF, mode, mtreg)
+
+    def to_lux(self, counts, mode, mtreg=None):
+        factor = 2.0 if mode in (0x11, 0x21) else 1.0
+        return counts * self.MTREG_DEFAULT / (1.2 * factor * (mtreg or self.mtreg))
+
+    def start(self, mode=None):
+        """Start a measurement, returns the time in ms until collect().
+
+        Without mode, mode and MTreg come from auto-ranging. A continuous
+        mode that is already running is not restarted, the wait is then
+        only what is left of its first conversion."""
+        if mode is None:
+            mode, mtreg = self.RANGES[self.range]
+            self.set_mtreg(mtreg)
         # continuous modes
         if mode & 0x10 and mode != self.mode:
             self.set_mode(mode)
+            self._due = utime.ticks_add(utime.ticks_ms(), self.measurement_ms(mode))
         # one shot modes
         if mode & 0x20:
             self.set_mode(mode)
-        # earlier measurements return previous reading
-        sleep_ms(24 if mode in (0x13, 0x23) else 180)
+            self._due = utime.ticks_add(utime.ticks_ms(), self.measurement_ms(mode))
+        if self._due is None:
+            return 0
+        wait = utime.ticks_diff(self._due, utime.ticks_ms())
+        if wait <= 0:
+            self._due = None
+            return 0
+        return wait
+
+    def ready(self):
+        """True once the conversion started by start() is done."""
+        return self._due is None or utime.ticks_diff(self._due, utime.ticks_ms()) <= 0
+
+    def collect(self, mode=None):
+        """Read the luminance (in lux) of a measurement started with start().
+
+        Returns None before the conversion is due. Without mode the
+        reading also adjusts the auto-ranging for the next start(); a
+        saturated reading is dropped (None) and the brightest range is
+        used next."""
+        if not self.ready():
+            return None
+        self._due = None
         data = self.bus.readfrom(self.addr, 2)
-        factor = 2.0 if mode in (0x11, 0x21) else 1.0
-        return (data[0]<<8 | data[1]) / (1.2 * factor)
+        counts = data[0]<<8 | data[1]
+        if mode is not None:
+            return self.to_lux(counts, mode)
+        mode = self.mode
+        lux = self.to_lux(counts, mode)
+        if counts == 0xFFFF and self.range < len(self.RANGES) - 1:
+            self.range = len(self.RANGES) - 1
+            return None
+        if counts > self.RANGE_HIGH and self.range < len(self.RANGES) - 1:
+            self.range += 1
+        elif self.range > 0 and lux < self.RANGE_LOW * self.max_lux(*self.RANGES[self.range - 1]):
+            self.range -= 1
+        return lux
+
+    def luminance(self, mode=None):
+        """Sample luminance (in lux), using specified sensor mode."""
+        sleep_ms(self.start(mode))
+        return self.collect(mode)
@@ -41,14 +41,43 @@ from array import array
 BME280_I2CADDR = 0x76
 
 # Operating Modes
+BME280_OSAMPLE_SKIP = 0
 BME280_OSAMPLE_1 = 1
 BME280_OSAMPLE_2 = 2
 BME280_OSAMPLE_4 = 3
 BME280_OSAMPLE_8 = 4
 BME280_OSAMPLE_16 = 5
 
+# Standby time between measurements in normal mode (config register t_sb)
+BME280_STANDBY_0_5 = 0
+BME280_STANDBY_62_5 = 1
+BME280_STANDBY_125 = 2
+BME280_STANDBY_250 = 3
+BME280_STANDBY_500 = 4
+BME280_STANDBY_1000 = 5
+BME280_STANDBY_10 = 6
+BME280_STANDBY_20 = 7
+
+# IIR filter coefficient (config register filter)
+BME280_FILTER_OFF = 0
+BME280_FILTER_2 = 1
+BME280_FILTER_4 = 2
+BME280_FILTER_8 = 3
+BME280_FILTER_16 = 4
+
 BME280_REGISTER_CONTROL_HUM = 0xF2
+BME280_REGISTER_STATUS = 0xF3
 BME280_REGISTER_CONTROL = 0xF4
+BME280_REGISTER_CONFIG = 0xF5
+
+BME280_SLEEP = 0
+BME280_FORCED = 1
+BME280_NORMAL = 3
+
+BME280_STATUS_MEASURING = 0x08
+
+_OVERSAMPLING = (BME280_OSAMPLE_SKIP, BME280_OSAMPLE_1, BME280_OSAMPLE_2,
+                 BME280_OSAMPLE_4, BME280_OSAMPLE_8, BME280_OSAMPLE_16)
 
 
 class BME280:
@@ -57,7 +86,18 @@ class BME280:
                  mode=BME280_OSAMPLE_1,
                  address=BME280_I2CADDR,
                  i2c=None,
+                 osrs_t=None,
+                 osrs_p=None,
+                 osrs_h=None,
+                 standby=None,
+                 iir=BME280_FILTER_OFF,
                  **kwargs):
+        """ mode sets the oversampling of all three channels; osrs_t,
+            osrs_p and osrs_h override it per channel (BME280_OSAMPLE_SKIP
+            disables a channel). Without standby the sensor is used in
+            forced mode, one conversion per start_measurement(). With a
+            standby time (BME280_STANDBY_*) it runs in normal mode and
+            converts continuously, optionally through the IIR filter. """
         # Check that mode is valid.
         if mode not in [BME280_OSAMPLE_1, BME280_OSAMPLE_2, BME280_OSAMPLE_4,
                         BME280_OSAMPLE_8, BME280_OSAMPLE_16]:
@@ -88,17 +128,106 @@ class BME280:
 
         self.dig_H6 = unpack_from("<b", dig_e1_e7, 6)[0]
 
-        self.i2c.writeto_mem(self.address, BME280_REGISTER_CONTROL,
-                             bytearray([0x3F]))
         self.t_fine = 0
+        self._precompute()
 
         # temporary data holders which stay allocated
         self._l1_barray = bytearray(1)
         self._l8_barray = bytearray(8)
         self._l3_resultarray = array("i", [0, 0, 0])
 
-    def read_raw_data(self, result):
-        """ Reads the raw (uncompensated) data from the sensor.
+        self.configure(mode if osrs_t is None else osrs_t,
+                       mode if osrs_p is None else osrs_p,
+                       mode if osrs_h is None else osrs_h,
+                       standby, iir)
+
+    def configure(self, osrs_t, osrs_p, osrs_h, standby=None,
+                  iir=BME280_FILTER_OFF):
+        """ Writes oversampling, standby time and IIR filter. The config
+            register is only reliably written in sleep mode, so the sensor
+            is put to sleep first. """
+        for osrs in (osrs_t, osrs_p, osrs_h):
+            if osrs not in _OVERSAMPLING:
+                raise ValueError('Unexpected oversampling value {0}'.format(osrs))
+        if standby is not None and not 0 <= standby <= 7:
+            raise ValueError('Unexpected standby value {0}'.format(standby))
+        if not 0 <= iir <= 4:
+            raise ValueError('Unexpected filter value {0}'.format(iir))
+        self.osrs_t = osrs_t
+        self.osrs_p = osrs_p
+        self.osrs_h = osrs_h
+        self.standby = standby
+        self.iir = iir
+        self.normal = standby is not None
+
+        self._write(BME280_REGISTER_CONTROL, BME280_SLEEP)
+        self._write(BME280_REGISTER_CONFIG,
+                    (0 if standby is None else standby) << 5 | iir << 2)
+        # ctrl_hum only takes effect with the next write to ctrl_meas
+        self._write(BME280_REGISTER_CONTROL_HUM, osrs_h)
+        self._ctrl_meas = osrs_t << 5 | osrs_p << 2
+        if self.normal:
+            self._write(BME280_REGISTER_CONTROL,
+                        self._ctrl_meas | BME280_NORMAL)
+
+    def _write(self, register, value):
+        self._l1_barray[0] = value
+        self.i2c.writeto_mem(self.address, register, self._l1_barray)
+
+    def _measurement_time_us(self, per_sample, base, channel_extra):
+        # Datasheet chapter 9.1: samples take 2 ms typical / 2.3 ms max,
+        # plus a fixed part and some extra time per enabled channel
+        t = base
+        for osrs, extra in ((self.osrs_t, 0),
+                            (self.osrs_p, channel_extra),
+                            (self.osrs_h, channel_extra)):
+            if osrs:
+                t += per_sample * (1 << (osrs - 1)) + extra
+        return t
+
+    def measurement_time_us(self):
+        """ Worst-case conversion time for the configured oversampling,
+            in microseconds. """
+        return self._measurement_time_us(2300, 1250, 575)
+
+    def typical_time_us(self):
+        """ Typical conversion time, in microseconds. """
+        return self._measurement_time_us(2000, 1000, 500)
+
+    def start_measurement(self):
+        """ Starts a forced-mode measurement without waiting for it. In
+            normal mode the sensor is converting anyway and nothing is
+            written.
+
+            Returns:
+                time in microseconds after which the measurement is
+                typically done (0 in normal mode); use wait_measurement()
+                to make sure
+        """
+        if self.normal:
+            return 0
+        self._write(BME280_REGISTER_CONTROL, self._ctrl_meas | BME280_FORCED)
+        return self.typical_time_us()
+
+    def measuring(self):
+        """ True while a conversion is running (status register). """
+        self.i2c.readfrom_mem_into(self.address, BME280_REGISTER_STATUS,
+                                   self._l1_barray)
+        return bool(self._l1_barray[0] & BME280_STATUS_MEASURING)
+
+    def wait_measurement(self):
+        """ Polls the status register until a forced-mode conversion has
+            finished, at most for the worst-case conversion time. """
+        if self.normal:
+            return
+        deadline = time.ticks_add(time.ticks_us(), self.measurement_time_us())
+        while self.measuring():
+            if time.ticks_diff(deadline, time.ticks_us()) <= 0:
+                break
+            time.sleep_us(100)
+
+    def read_measurement(self, result):
+        """ Reads the raw data of the last finished measurement.
 
             Args:
                 result: array of length 3 or alike where the result will be
@@ -106,19 +235,6 @@ class BME280:
             Returns:
                 None
         """
-
-        self._l1_barray[0] = self._mode
-        self.i2c.writeto_mem(self.address, BME280_REGISTER_CONTROL_HUM,
-                             self._l1_barray)
-        self._l1_barray[0] = self._mode << 5 | self._mode << 2 | 1
-        self.i2c.writeto_mem(self.address, BME280_REGISTER_CONTROL,
-                             self._l1_barray)
-
-        sleep_time = 1250 + 2300 * (1 << self._mode)
-        sleep_time = sleep_time + 2300 * (1 << self._mode) + 575
-        sleep_time = sleep_time + 2300 * (1 << self._mode) + 575
-        time.sleep_us(sleep_time)  # Wait the required time
-
         # burst readout from 0xF7 to 0xFE, recommended by datasheet
         self.i2c.readfrom_mem_into(self.address, 0xF7, self._l8_barray)
         readout = self._l8_barray
@@ -133,6 +249,19 @@ class BME280:
         result[1] = raw_press
         result[2] = raw_hum
 
+    def read_raw_data(self, result):
+        """ Reads the raw (uncompensated) data from the sensor.
+
+            Args:
+                result: array of length 3 or alike where the result will be
+                stored, in temperature, pressure, humidity order
+            Returns:
+                None
+        """
+        time.sleep_us(self.start_measurement())  # Wait the typical time
+        self.wait_measurement()
+        self.read_measurement(result)
+
     def read_compensated_data(self, result=None):
         """ Reads the data from the sensor and returns the compensated data.
 
@@ -146,50 +275,103 @@ class BME280:
                 the result parameter if not None
         """
         self.read_raw_data(self._l3_resultarray)
-        raw_temp, raw_press, raw_hum = self._l3_resultarray
-        # temperature
-        var1 = ((raw_temp >> 3) - (self.dig_T1 << 1)) * (self.dig_T2 >> 11)
-        var2 = (((((raw_temp >> 4) - self.dig_T1) *
-                  ((raw_temp >> 4) - self.dig_T1)) >> 12) * self.dig_T3) >> 14
-        self.t_fine = var1 + var2
-        temp = (self.t_fine * 5 + 128) >> 8
-
-        # pressure
-        var1 = self.t_fine - 128000
-        var2 = var1 * var1 * self.dig_P6
-        var2 = var2 + ((var1 * self.dig_P5) << 17)
-        var2 = var2 + (self.dig_P4 << 35)
-        var1 = (((var1 * var1 * self.dig_P3) >> 8) +
-                ((var1 * self.dig_P2) << 12))
-        var1 = (((1 << 47) + var1) * self.dig_P1) >> 33
-        if var1 == 0:
-            pressure = 0
-        else:
-            p = 1048576 - raw_press
-            p = (((p << 31) - var2) * 3125) // var1
-            var1 = (self.dig_P9 * (p >> 13) * (p >> 13)) >> 25
-            var2 = (self.dig_P8 * p) >> 19
-            pressure = ((p + var1 + var2) >> 8) + (self.dig_P7 << 4)
-
-        # humidity
-        h = self.t_fine - 76800
-        h = (((((raw_hum << 14) - (self.dig_H4 << 20) -
-                (self.dig_H5 * h)) + 16384)
-              >> 15) * (((((((h * self.dig_H6) >> 10) *
-                            (((h * self.dig_H3) >> 11) + 32768)) >> 10) +
-                          2097152) * self.dig_H2 + 8192) >> 14))
-        h = h - (((((h >> 15) * (h >> 15)) >> 7) * self.dig_H1) >> 4)
-        h = 0 if h < 0 else h
-        h = 419430400 if h > 419430400 else h
-        humidity = h >> 12
-
-        if result:
-            result[0] = temp
-            result[1] = pressure
-            result[2] = humidity
-            return result
-
-        return array("i", (temp, pressure, humidity))
+        return self.compensate(self._l3_resultarray, result)
+
+    def _precompute(self):
+        # Constants derived from the calibration data, so that the per
+        # sample arithmetic has fewer operations and, where the result is
+        # still bit-exact, intermediates that fit into a small int (31 bit
+        # on MicroPython) instead of allocating a big int on every sample.
+        # The temperature formula keeps the (dig_T2 >> 11) grouping of the
+        # original implementation, stored data depends on it.
+        h_offset = 16384 - (self.dig_H4 << 20)
+        self._cal = (
+            self.dig_T1, self.dig_T1 << 1, self.dig_T2 >> 11, self.dig_T3,
+            self.dig_P1 << 47, self.dig_P1, self.dig_P2 << 12, self.dig_P3,
+            self.dig_P4 << 35, self.dig_P5 << 17, self.dig_P6,
+            self.dig_P7 << 4, self.dig_P8, self.dig_P9,
+            self.dig_H1, self.dig_H2, self.dig_H3, self.dig_H5, self.dig_H6,
+            h_offset >> 15, h_offset & 0x7FFF)
+
+    def compensate(self, raw, result=None):
+        """ Compensates raw data as read by read_raw_data/read_measurement.
+
+            Args:
+                raw: raw temperature, pressure, humidity
+                result: optional array of length 3 for the compensated
+                values, see read_compensated_data
+
+            Returns:
+                array with temperature, pressure, humidity
+        """
+        if not result:
+            result = array("i", (0, 0, 0))
+        self.compensate_many(raw, result, 1)
+        return result
+
+    def compensate_many(self, raw, result, count=None):
+        """ Compensates a batch of raw samples without allocating.
+
+            Args:
+                raw: array("i") of raw (temperature, pressure, humidity)
+                triples, e.g. collected with read_measurement
+                result: array("i") of at least the same length, receives
+                the compensated triples in the same order
+                count: number of triples, default all in raw
+
+            Returns:
+                number of compensated triples
+        """
+        (t1, t1x2, t2, t3, p1_47, p1, p2_12, p3, p4_35, p5_17, p6, p7_16, p8, p9,
+         h1, h2, h3, h5, h6, h_off_hi, h_off_lo) = self._cal
+        if count is None:
+            count = len(raw) // 3
+        t_fine = self.t_fine
+        for i in range(0, count * 3, 3):
+            raw_temp = raw[i]
+            raw_press = raw[i + 1]
+            raw_hum = raw[i + 2]
+
+            # temperature; ((d * d) >> 12) * t3 >> 14 split into 6 and 14
+            # bit parts so no product leaves the small int range
+            var1 = ((raw_temp >> 3) - t1x2) * t2
+            d = (raw_temp >> 4) - t1
+            if d < 0:
+                d = -d
+            hi = d >> 6
+            lo = d & 63
+            sq = hi * hi + ((((hi * lo) << 7) + lo * lo) >> 12)
+            var2 = (sq >> 14) * t3 + (((sq & 0x3FFF) * t3) >> 14)
+            t_fine = var1 + var2
+            result[i] = (t_fine * 5 + 128) >> 8
+
+            # pressure; this needs the full 64 bit range, the shifted
+            # constants only save one big int operation per term
+            var1 = t_fine - 128000
+            sq = var1 * var1
+            var2 = sq * p6 + var1 * p5_17 + p4_35
+            var1 = (p1_47 + (((sq * p3) >> 8) + var1 * p2_12) * p1) >> 33
+            if var1 == 0:
+                result[i + 1] = 0
+            else:
+                p = (((1048576 - raw_press) << 31) - var2) * 3125 // var1
+                var1 = (p9 * (p >> 13) * (p >> 13)) >> 25
+                var2 = (p8 * p) >> 19
+                result[i + 1] = ((p + var1 + var2) >> 8) + p7_16
+
+            # humidity; (raw << 14) - (H4 << 20) - H5 * h + 16384 >> 15
+            # evaluated as high and low 15 bit parts
+            h = t_fine - 76800
+            x = ((raw_hum >> 1) + h_off_hi - h5 * (h >> 15) +
+                 ((((raw_hum & 1) << 14) + h_off_lo - h5 * (h & 0x7FFF)) >> 15))
+            h = x * ((((((((h * h6) >> 10) * (((h * h3) >> 11) + 32768)) >> 10) +
+                        2097152) * h2 + 8192) >> 14))
+            h = h - (((((h >> 15) * (h >> 15)) >> 7) * h1) >> 4)
+            h = 0 if h < 0 else h
+            h = 419430400 if h > 419430400 else h
+            result[i + 2] = h >> 12
+        self.t_fine = t_fine
+        return count
 
     @property
     def values(self):
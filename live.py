@@ -0,0 +1,116 @@
+# Aktuelle Messwerte und Live-Daten für das Dashboard
+#
+# Die Aufzeichnung legt jede Messung als unveränderliches Snapshot-Objekt
+# ab, indem sie eine einzige Referenz austauscht. Leser holen sich diese
+# Referenz einmal und sehen damit immer Werte aus demselben Messzyklus,
+# ohne die Sensorabfrage zu blockieren.
+#
+# Für /api/stream (Server-Sent Events) weckt publish() alle Abonnenten,
+# die dann das vorformatierte Event schicken. Wer nicht hinterherkommt,
+# bekommt nur die jeweils neueste Messung; wer länger als der
+# Schreib-Timeout hängt, wird getrennt.
+
+import json
+import os
+
+from history import ROW_FORMAT
+from sensor_store import FIELDS, format_time
+from webserver import asyncio
+
+# Unterscheidet die Sequenznummern verschiedener Starts im ETag
+BOOT_ID = "{:08x}".format(int.from_bytes(os.urandom(4), "little"))
+
+
+RESPONSE_HEAD = ("HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                 "Content-Length: {}\r\nETag: {}\r\nCache-Control: no-cache\r\n\r\n")
+NOT_MODIFIED = "HTTP/1.1 304 Not Modified\r\nETag: {}\r\nCache-Control: no-cache\r\n\r\n"
+
+
+class Snapshot:
+    def __init__(self, seq, timestamp, values, buf=None):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.values = values
+        self.etag = '"{}-{}"'.format(BOOT_ID, seq)
+        if seq:
+            data = ROW_FORMAT.format(format_time(timestamp), *values)
+            self.event = "id: {}\ndata: {}\n\n".format(seq, data).encode()
+        else:
+            self.event = b""
+        self.not_modified = NOT_MODIFIED.format(self.etag).encode()
+        self.response = self._render(buf)
+
+    def json(self):
+        data = {"seq": self.seq, "timestamp": self.timestamp}
+        for name, value in zip(FIELDS, self.values):
+            data[name] = value
+        return json.dumps(data)
+
+    def _render(self, buf):
+        # Komplette Antwort für /api/sensordata, einmal pro Messung erzeugt
+        body = self.json().encode()
+        head = RESPONSE_HEAD.format(len(body), self.etag).encode()
+        n = len(head) + len(body)
+        if buf is None or len(buf) < n:
+            return head + body
+        buf[:len(head)] = head
+        buf[len(head):n] = body
+        return memoryview(buf)[:n]
+
+
+class LiveFeed:
+    def __init__(self, max_subscribers=4, keepalive_s=15):
+        self.max_subscribers = max_subscribers
+        self.keepalive_s = keepalive_s
+        self.subscribers = 0
+        # Zwei Puffer für die fertige Antwort, abwechselnd beschrieben: der
+        # Puffer des aktuellen Snapshots wird erst zwei Messungen später
+        # wieder überschrieben, laufende Sendevorgänge sind dann längst fertig
+        self._buffers = (bytearray(512), bytearray(512))
+        self._flip = 0
+        # wird als Ganzes ersetzt, nie verändert
+        self.latest = Snapshot(0, 0, (None,) * len(FIELDS))
+        self._changed = asyncio.Event()
+
+    def publish(self, timestamp, values):
+        # Veröffentlicht wird durch eine einzige Zuweisung, damit niemand
+        # einen halben Stand sieht. Muss im Thread der Event-Schleife laufen.
+        self._flip ^= 1
+        self.latest = Snapshot(self.latest.seq + 1, timestamp, values,
+                               self._buffers[self._flip])
+        changed = self._changed
+        self._changed = asyncio.Event()
+        changed.set()
+
+    async def send_latest(self, request, response):
+        """ Handler für /api/sensordata: nur noch ein write der fertigen Bytes. """
+        snapshot = self.latest
+        if request.headers.get("if-none-match") == snapshot.etag:
+            await response.send_raw(snapshot.not_modified)
+        else:
+            await response.send_raw(snapshot.response)
+
+    async def stream(self, request, response):
+        if self.subscribers >= self.max_subscribers:
+            await response.send("<h1>503 Service Unavailable</h1>", 503)
+            return
+        self.subscribers += 1
+        try:
+            await response.start(200, "text/event-stream",
+                                 headers="Cache-Control: no-cache\r\n")
+            await response.write(b"retry: 5000\n\n")
+            sent = 0
+            while True:
+                changed = self._changed
+                snapshot = self.latest
+                if snapshot.seq != sent:
+                    sent = snapshot.seq
+                    await response.write(snapshot.event)
+                    continue
+                try:
+                    await asyncio.wait_for(changed.wait(), self.keepalive_s)
+                except asyncio.TimeoutError:
+                    # Kommentarzeile, damit tote Verbindungen auffallen
+                    await response.write(b":\n\n")
+        finally:
+            self.subscribers -= 1
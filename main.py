@@ -1,234 +1,283 @@
 from machine import Pin, I2C, reset
-from libraries import bme280  # Relativer Import
-from libraries import CCS811  # Importiere die CCS811-Bibliothek
-from libraries import bh1750  # BH1750-Bibliothek importieren
+from sensor_manager import SensorManager
+from i2c_bus import I2CBus
 from ota.ota import OTAUpdater
 from wifi_config import SSID, PASSWORD
-import network
-import socket
-import time
-import utime
-import _thread
+from webserver import HTTPServer, StaticFiles, asyncio
+from sensor_store import RingStore, format_time, time_valid, unix_time
+from history import send_history
+from rollup import Rollups, send_stats
+from live import LiveFeed
+from scheduler import SensorScheduler
+from startup import Backoff, Startup, connect_wifi, in_thread
+from timebase import Uptime
+from export import FORMATS as EXPORT_FORMATS, send_export
+from push import Pusher
 import json
 import ntptime
 import ota
 
 #trustmebroo
 
-# Funktion zur Synchronisierung der Zeit und Anpassung an die lokale Zeitzone
-def sync_time_with_dst():
-    try:
-        ntptime.settime()
-        tm = utime.localtime()
-        timezone_offset_hours = 2 if is_dst_europe(tm) else 1
-        local_time = utime.localtime(utime.time() + timezone_offset_hours * 3600)
-        print("Aktuelle lokale Uhrzeit:", format_datetime_custom(local_time))
-    except Exception as e:
-        print("Fehler bei der Zeit-Synchronisation:", e)
-
-def is_dst_europe(dt):
-    year, month, day, hour, minute, second, weekday, yearday = dt
-    if month > 3 and month < 10:
-        return True
-    if month == 3:
-        return (day + (6 - weekday)) > 31
-    if month == 10:
-        return not (day + (6 - weekday)) > 31
-    return False
-
-def format_datetime_custom(dt):
-    year, month, day, hour, minute, second, _, _ = dt
-    return "{:04d}/{:02d}/{:02d}-{:02d}:{:02d}:{:02d}".format(year, month, day, hour, minute, second)
-
-# Zeit synchronisieren
-sync_time_with_dst()
-
-# I2C-Multiplexer Klasse
-class I2CMultiplexer:
-    def __init__(self, i2c, address=0x70):
-        self.i2c = i2c
-        self.address = address
-
-    def select_channel(self, channel):
-        if channel < 0 or channel > 7:
-            raise ValueError('Kanal muss zwischen 0 und 7 liegen')
-        self.i2c.writeto(self.address, bytearray([1 << channel]))
-        time.sleep(0.1)
-
-# SensorManager Klasse
-class SensorManager:
-    def __init__(self, multiplexer):
-        self.multiplexer = multiplexer
-        self.ccs811 = None
-        self.bme280 = None
-        self.bh1750 = None
-
-    def init_ccs811(self, channel):
-        self.multiplexer.select_channel(channel)
-        self.ccs811 = CCS811.CCS811(i2c=self.multiplexer.i2c, addr=0x5A)
-        while not self.ccs811.data_ready():
-            time.sleep(1)
-
-    def init_bme280(self, channel):
-        self.multiplexer.select_channel(channel)
-        self.bme280 = bme280.BME280(i2c=self.multiplexer.i2c)
-
-    def init_bh1750(self, channel):
-        self.multiplexer.select_channel(channel)
-        self.bh1750 = bh1750.BH1750(self.multiplexer.i2c)
-
-    def read_ccs811(self):
-        self.multiplexer.select_channel(0)
-        co2 = self.ccs811.eCO2
-        tvoc = self.ccs811.tVOC
-        print('CO2: {} ppm'.format(co2))
-        print('TVOC: {} ppb'.format(tvoc))
-        return co2, tvoc
-
-    def read_bme280(self):
-        self.multiplexer.select_channel(1)
-        temperature, pressure, humidity = self.bme280.read_compensated_data()
-        temp_celsius = temperature / 100
-        pressure_hpa = pressure / 25600
-        humidity_percent = humidity / 1024
-        print('Temperatur: {:.2f}°C'.format(temp_celsius))
-        print('Luftdruck: {:.2f} hPa'.format(pressure_hpa))
-        print('Luftfeuchtigkeit: {:.2f}%'.format(humidity_percent))
-        return temp_celsius, pressure_hpa, humidity_percent
-
-    def read_bh1750(self):
-        self.multiplexer.select_channel(2)
-        light_intensity = self.bh1750.luminance(bh1750.BH1750.CONT_HIRES_1)
-        print('Lichtintensität: {:.2f} Lux'.format(light_intensity))
-        return light_intensity
+# Zeitpunkte des Starts (ms ab hier), z. B. bis zur ersten Messung
+startup = Startup()
 
-# Initialisierung des I2C-Busses und des Multiplexers
-i2c = I2C(0, scl=Pin(22), sda=Pin(21), freq=100000)
-multiplexer = I2CMultiplexer(i2c)
-sensors = SensorManager(multiplexer)
-
-# Initialisierung der Sensoren
-sensors.init_ccs811(channel=0)
-sensors.init_bme280(channel=1)
-sensors.init_bh1750(channel=2)
-
-# Globale Variablen für die letzten Sensorwerte
-latest_bme280_temp = None
-latest_bme280_pressure = None
-latest_bme280_humidity = None
-latest_ccs811_co2 = None
-latest_ccs811_tvoc = None
-latest_bh1750_lux = None
-
-def write_csv(filename, date, bme280_temp, bme280_pressure, bme280_humidity, ccs811_co2, ccs811_tvoc, bh1750_lux):
-    with open(filename, 'a') as csvfile:
-        csvfile.write(f"{date},{bme280_temp},{bme280_pressure},{bme280_humidity},{ccs811_co2},{ccs811_tvoc},{bh1750_lux}\n")
-
-# WLAN-Verbindung herstellen
+# Die Uhr läuft in UTC, umgerechnet in MEZ/MESZ wird erst bei der Ausgabe
+# (format_time); Fehler gehen an den Aufrufer, der es später noch einmal
+# versucht
+def sync_time():
+    ntptime.settime()
+    print("Aktuelle lokale Uhrzeit:", format_time(unix_time()))
+
+# WLAN-Verbindung anstoßen; der ESP32 verbindet sich, während die Sensoren
+# gesucht werden und der Webserver startet. Zeit und Updates folgen im
+# Hintergrund (network_tasks).
 ssid = "FRITZ!Box 7530 OW"
 password = "monkey-gin!"
-wlan = network.WLAN(network.STA_IF)
-wlan.active(True)
-wlan.connect(ssid, password)
-
-max_wait = 10
-while max_wait > 0:
-    status = wlan.status()
-    if status == network.STAT_GOT_IP:
-        break
-    max_wait -= 1
-    print('Warten auf Verbindung...')
-    time.sleep(1)
-
-if wlan.status() != network.STAT_GOT_IP:
-    raise RuntimeError('Netzwerkverbindung fehlgeschlagen')
-else:
-    print('Verbunden mit IP:', wlan.ifconfig()[0])
-
-def start_server():
-    addr = socket.getaddrinfo('0.0.0.0', 80)[0][-1]
-    s = socket.socket()
-    s.bind(addr)
-    s.listen(1)
-    print('Server gestartet. Warte auf Verbindung...')
-    return s
-
-def handle_requests(s):
-    while True:
-        cl, addr = s.accept()
-        print('Client verbunden von', addr)
-        request = cl.recv(1024)
-        request = str(request)
-        request = request.split("\\r\\n")[0].split(' ')
-        if len(request) > 0 and request[0] == "b'GET":
-            if request[1] == "/":
-                request[1] = "/index.html"
-            elif request[1] == "/api/sensordata":
-                send_sensor_data(cl)
-            elif request[1] == "/reset":
-                reset_device(cl)
-            elif request[1] == "/update":
-                check_for_updates_endpoint(cl)
-            print('Angeforderte Datei:', request[1])
-            if request[1] == "/index.html":
-                send_html_page(cl)
-        cl.close()
-
-def send_html_page(client):
+wlan = connect_wifi(ssid, password)
+
+# Initialisierung des I2C-Busses und des Multiplexers
+i2c = I2C(0, scl=Pin(22), sda=Pin(21), freq=100000)
+bus = I2CBus(i2c)
+sensors = SensorManager(bus)
+
+# Sensoren auf allen Multiplexer-Kanälen suchen; die Reihenfolge der IDs
+# steht in sensors.json, gesicherte CCS811-Baselines in ccs811.json
+sensors.discover()
+
+# nINT des ersten CCS811, falls verdrahtet: dann wird der Sensor nur noch
+# gelesen, wenn er neue Werte hat, statt jede Sekunde das Statusregister
+CCS811_INT_PIN = None
+if CCS811_INT_PIN is not None and sensors.primary("ccs811") is not None:
+    sensors.primary("ccs811").driver.int_pin = Pin(CCS811_INT_PIN, Pin.IN, Pin.PULL_UP)
+
+# Der Ringspeicher bekommt die Werte des jeweils ersten Sensors jedes Typs.
+# Bewusst nicht gespeichert werden weitere Sensoren: sie haben eine feste ID
+# und stehen mit ihren letzten Werten in /api/sensors, aber eine eigene
+# Reihe pro ID in gleicher Auflösung passt nicht in den Flash - der
+# Ringspeicher belegt schon 622 kB für drei Tage, bei bis zu 64 Sensoren
+# wären es ein Vielfaches des Dateisystems. Ihre Verläufe sammelt bei
+# Bedarf ein Client über /api/sensors.
+RECORDED = ("bme280", "ccs811", "bh1750")
+for kind in RECORDED:
+    if sensors.primary(kind) is None:
+        print('Kein Sensor vom Typ', kind, '- es wird nichts aufgezeichnet')
+extra = [sensor.id for sensor in sensors.sensors
+         if sensor.kind in RECORDED and sensor is not sensors.primary(sensor.kind)]
+if extra:
+    print('Nur live in /api/sensors, nicht aufgezeichnet:', ', '.join(extra))
+
+# Binärer Ringspeicher statt stetig wachsender CSV-Datei (24 Bytes pro Messung,
+# geschrieben wird jede Minute)
+store = RingStore('sensor_data.bin', capacity=25920, batch=6)
+
+# Minuten-, Stunden- und Tageswerte (Mittelwert, Streuung, Minimum,
+# Maximum) für lange Zeiträume; sie bleiben, wenn die Rohdaten nach 3 Tagen
+# überschrieben sind
+rollups = Rollups('sensor')
+
+# Messungen vor der ersten Zeit-Synchronisation werden mit den Sekunden
+# seit dem Start gespeichert und danach korrigiert (fix_pre_ntp)
+uptime = Uptime()
+boot_seq = store.head
+pre_ntp = 0
+
+# Messungen zusätzlich in Paketen zu 30 (5 Minuten) per UDP an den
+# Sammeldienst schicken (python -m collector --udp 8081); bei einem
+# WLAN-Ausfall wird aus dem Ringspeicher nachgeholt. None: aus
+PUSH_HOST = None
+PUSH_PORT = 8081
+PUSH_NAME = "growbox"
+pusher = None
+if PUSH_HOST is not None:
+    pusher = Pusher(store, PUSH_HOST, PUSH_PORT, PUSH_NAME, batch=30, first_seq=boot_seq)
+
+server = HTTPServer(port=80)
+ota_running = False
+
+def first_response(request):
+    startup.mark('erste_antwort')
+    server.on_response = None
+
+server.on_response = first_response
+
+# index.html wird vorkomprimiert aus www/ ausgeliefert (tools/build_www.py)
+StaticFiles("www/assets.json").register(server)
+
+# Die letzten Messwerte liegen als ein Snapshot in feed.latest, inklusive
+# der fertig formatierten Antwort für /api/sensordata
+feed = LiveFeed(max_subscribers=4)
+server.add_route("/api/sensordata", feed.send_latest)
+
+# Neue Messungen werden per Server-Sent Events an das Dashboard geschickt
+server.add_route("/api/stream", feed.stream)
+
+@server.route("/api/sensors")
+async def send_sensors(request, response):
+    # Alle gefundenen Sensoren mit ID und letzten Werten
+    await response.send(json.dumps(sensors.info()), content_type="application/json")
+
+@server.route("/api/history")
+async def send_history_data(request, response):
     try:
-        with open('index.html', 'rb') as f:
-            response = b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n" + f.read()
-            client.send(response)
-    except Exception as e:
-        print(f"Error sending index.html: {e}")
-        response = b"HTTP/1.1 500 Internal Server Error\r\nContent-Type: text/html\r\n\r\n<h1>500 Internal Server Error</h1>"
-        client.send(response)
-    client.close()
-
-def send_sensor_data(client):
-    data = {
-        "bme280_temp": latest_bme280_temp,
-        "bme280_pressure": latest_bme280_pressure,
-        "bme280_humidity": latest_bme280_humidity,
-        "ccs811_co2": latest_ccs811_co2,
-        "ccs811_tvoc": latest_ccs811_tvoc,
-        "bh1750_lux": latest_bh1750_lux
-    }
-    response = json.dumps(data)
-    client.send(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n" + response.encode('utf-8'))
-    client.close()
-
-def reset_device(client):
-    response = b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n<h1>Gerät wird neu gestartet...</h1>"
-    client.send(response)
-    client.close()
-    time.sleep(1)
+        stop = int(request.query.get("to") or unix_time())
+        start = int(request.query.get("from") or stop - 86400)
+        points = int(request.query.get("points") or 400)
+    except ValueError:
+        start, stop, points = 1, 0, 0
+    if start > stop or points < 1:
+        await response.send("<h1>400 Bad Request</h1>", 400)
+        return
+    await send_history(store, response, start, stop, points, rollups)
+
+@server.route("/api/stats")
+async def send_stats_data(request, response):
+    tier = rollups.tier(request.query.get("res") or "hour")
+    try:
+        stop = int(request.query.get("to") or unix_time())
+        start = int(request.query.get("from") or stop - 86400)
+    except ValueError:
+        start, stop = 1, 0
+    if tier is None or start > stop:
+        await response.send("<h1>400 Bad Request</h1>", 400)
+        return
+    await send_stats(tier, response, start, stop)
+
+@server.route("/api/export")
+async def send_export_data(request, response):
+    fmt = request.query.get("format") or "csv"
+    try:
+        start = int(request.query.get("from") or 0)
+        stop = int(request.query.get("to") or 0xFFFFFFFF)
+    except ValueError:
+        start, stop = 1, 0
+    if fmt not in EXPORT_FORMATS or start > stop:
+        await response.send("<h1>400 Bad Request</h1>", 400)
+        return
+    await send_export(store, response, fmt, start, stop)
+
+# Ringspeicher (bis zu 5 Messungen) und Aggregat-Dateien schreiben erst
+# blockweise; vor jedem Neustart wird deshalb geleert
+def flush_and_reset():
+    store.flush()
+    rollups.flush()
+    print('Neustart...')
     reset()
 
-def check_for_updates_endpoint(client):
+@server.route("/reset")
+async def reset_device(request, response):
+    response.keep_alive = False
+    await response.send("<h1>Gerät wird neu gestartet...</h1>")
+    await asyncio.sleep(1)
+    flush_and_reset()
+
+def run_ota_update():
+    # True nach einer Installation; neu gestartet wird in update_once()
+    firmware_url = "https://raw.githubusercontent.com/Luckz1337/Growbox/"
+    ota_updater = OTAUpdater(SSID, PASSWORD, firmware_url, "main.py")
+    return ota_updater.download_and_install_update_if_available(reset=False)
+
+async def update_once():
+    # Die OTA-Prüfung blockiert bis zu 30 s und läuft deshalb im eigenen Thread
+    global ota_running
+    if ota_running:
+        return
+    ota_running = True
+    try:
+        installed = await in_thread(run_ota_update)
+    finally:
+        ota_running = False
+    # im Thread der Event-Schleife, damit record_sample nicht dazwischen schreibt
+    if installed:
+        flush_and_reset()
+
+async def manual_update():
     try:
-        firmware_url = "https://raw.githubusercontent.com/Luckz1337/Growbox/"
-        ota_updater = OTAUpdater(SSID, PASSWORD, firmware_url, "main.py")
-        ota_updater.download_and_install_update_if_available()
-        response = b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n<h1>Update überprüft und installiert, wenn verfügbar</h1>"
+        await update_once()
     except Exception as e:
-        response = b"HTTP/1.1 500 Internal Server Error\r\nContent-Type: text/html\r\n\r\n<h1>Fehler beim Überprüfen auf Updates</h1>"
         print(f"Fehler beim Überprüfen auf Updates: {e}")
-    client.send(response)
-    client.close()
 
-def sensor_loop():
-    global latest_bme280_temp, latest_bme280_pressure, latest_bme280_humidity
-    global latest_ccs811_co2, latest_ccs811_tvoc, latest_bh1750_lux
+@server.route("/update")
+async def check_for_updates_endpoint(request, response):
+    if not ota_running:
+        asyncio.create_task(manual_update())
+    await response.send("<h1>Update-Prüfung gestartet</h1>", 202)
+
+# Die Sensoren behalten ihre letzten Werte selbst; alle Tasks laufen im
+# selben Thread
+def record_sample():
+    values = ()
+    for kind in RECORDED:
+        sensor = sensors.primary(kind)
+        if sensor is None or sensor.values is None:
+            return
+        values += sensor.values
+    global pre_ntp
+    now = unix_time()
+    # Vor der ersten Zeit-Synchronisation nach dem Einschalten steht die Uhr
+    # auf 2000; solange zählt die Laufzeit
+    if time_valid(now):
+        if pre_ntp:
+            fix_pre_ntp(now)
+        store.append(now, *values)
+        rollups.add(now, values)
+    else:
+        # auch im Live-Feed die Laufzeit, wie im Ringspeicher
+        now = uptime.seconds()
+        store.append(now, *values)
+        pre_ntp += 1
+    feed.publish(now, values)
+    startup.mark('erste_messung')
+    print('Messung: {:.2f}°C, {:.2f} hPa, {:.2f}%, CO2 {} ppm, TVOC {} ppb, {:.2f} Lux'.format(*values))
+
+def fix_pre_ntp(now):
+    # Laufzeit -> Unix-Zeit, danach kommen die Messungen in die Aggregate
+    global pre_ntp
+    fixed = store.fix_times(boot_seq, now - uptime.seconds())
+    for _, record in store.records(boot_seq):
+        rollups.add(record[0], record[1:])
+    print(fixed, 'Messungen vor der Zeit-Synchronisation korrigiert')
+    pre_ntp = 0
 
+def collect_measurement():
+    sensors.collect("bme280", "bh1750")
+    # Kompensation des CCS811 mit den neuen BME280-Werten
+    sensors.update_environment()
+
+# Der CCS811 liefert in Modus 1 jede Sekunde neue Werte, die anderen
+# Sensoren werden im Takt der Aufzeichnung gemeinsam gelesen: ein Durchgang
+# über alle Kanäle zum Anstoßen, einer zum Abholen. Die Aufzeichnung läuft
+# versetzt, damit die Wandlungen (BH1750: bis 663 ms nach einem Wechsel des
+# Messbereichs) bis dahin fertig sind und der CCS811 nach dem Start schon
+# seinen ersten Wert geliefert hat; sonst fiele die erste Messung aus.
+# Die CCS811-Baseline wird stündlich gesichert: selten genug für den Flash,
+# oft genug, dass nach einem Neustart kaum etwas vom Einlernen fehlt.
+scheduler = SensorScheduler()
+scheduler.add("ccs811", 1000, lambda: sensors.collect("ccs811"))
+scheduler.add("messung", 10000, collect_measurement,
+              lambda: sensors.start("bme280", "bh1750"))
+scheduler.add("aufzeichnung", 10000, record_sample, offset_ms=1200)
+scheduler.add("baseline", 3600000, sensors.save_baselines, offset_ms=3600000)
+
+# Nach dem WLAN die Uhrzeit, danach (wenn der Start durch ist) die
+# OTA-Prüfung; beides wird bei Fehlern mit wachsendem Abstand wiederholt
+OTA_DELAY_MS = 30000
+
+async def network_tasks():
+    await startup.wifi(wlan, ssid, password)
+    await startup.retry('ntp', lambda: in_thread(sync_time), Backoff(5000, 600000))
+    await asyncio.sleep_ms(OTA_DELAY_MS)
+    await startup.retry('ota', update_once, Backoff(60000, 3600000))
+
+async def main():
+    scheduler.start()
+    startup.spawn(rollups.recover(store))
+    startup.spawn(network_tasks())
+    if pusher is not None:
+        startup.spawn(pusher.run(wlan.isconnected))
+    await server.start()
+    startup.mark('webserver')
     while True:
-        latest_bme280_temp, latest_bme280_pressure, latest_bme280_humidity = sensors.read_bme280()
-        latest_ccs811_co2, latest_ccs811_tvoc = sensors.read_ccs811()
-        latest_bh1750_lux = sensors.read_bh1750()
-        date = format_datetime_custom(utime.localtime())
-        write_csv('sensor_data.csv', date, latest_bme280_temp, latest_bme280_pressure, latest_bme280_humidity, latest_ccs811_co2, latest_ccs811_tvoc, latest_bh1750_lux)
-        time.sleep(10)
-
-server = start_server()
-_thread.start_new_thread(sensor_loop, ())
-handle_requests(server)
+        await asyncio.sleep(3600)
+
+asyncio.run(main())
@@ -3,42 +3,160 @@ import urequests
 import os
 import json
 import machine
+import hashlib
+import sys
+from binascii import hexlify
 from time import sleep
 
+# Downloads are streamed to "<name>.new" in blocks of CHUNK_SIZE bytes, so
+# the heap needed does not grow with the file size.
+CHUNK_SIZE = 1024
+NEW_SUFFIX = '.new'
+STATE_FILE = 'version.json'
+# Lists the files being swapped; if it exists at boot, the swap was
+# interrupted and recover_interrupted_update() rolls it back.
+JOURNAL_FILE = 'ota_journal.json'
+
+
+def _exists(path):
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _makedirs(path):
+    """ Create the parent directories of path. """
+    parts = path.split('/')[:-1]
+    current = ''
+    for part in parts:
+        current = current + '/' + part if current else part
+        if not _exists(current):
+            os.mkdir(current)
+
+
+def _backup_name(name):
+    """ main.py -> main_backup.py, www/index.html.gz -> www/index_backup.html.gz """
+    slash = name.rfind('/') + 1
+    dot = name.find('.', slash)
+    if dot < 0:
+        return name + '_backup'
+    return name[:dot] + '_backup' + name[dot:]
+
+
+def _file_sha256(path, buf=None):
+    digest = hashlib.sha256()
+    buf = buf or bytearray(CHUNK_SIZE)
+    view = memoryview(buf)
+    with open(path, 'rb') as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            digest.update(view[:n])
+    return hexlify(digest.digest()).decode()
+
+
+def _mpy_version():
+    """ (version, sub-version) of the .mpy files this firmware can import,
+    None where there is no such check (not MicroPython). """
+    mpy = getattr(sys.implementation, '_mpy', None)
+    if mpy is None:
+        return None
+    return [mpy & 0xff, (mpy >> 8) & 3]
+
+
+def _header(headers, name):
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def recover_interrupted_update():
+    """ Roll back a swap that was cut short by a reset or power loss. Called
+    from boot.py before main.py is imported."""
+    if not _exists(JOURNAL_FILE):
+        return False
+    with open(JOURNAL_FILE) as f:
+        journal = json.load(f)
+    for name in journal['files']:
+        backup = _backup_name(name)
+        if _exists(backup):
+            _remove(name)
+            os.rename(backup, name)
+        elif name in journal['added']:
+            _remove(name)
+        _remove(name + NEW_SUFFIX)
+    os.remove(JOURNAL_FILE)
+    print(f"Interrupted update rolled back: {', '.join(journal['files'])}")
+    return True
+
+
 class OTAUpdater:
-    """ This class handles OTA updates. It connects to the Wi-Fi, checks for updates, downloads, and installs them."""
-    
+    """ This class handles OTA updates. It connects to the Wi-Fi, checks for updates, downloads, and installs them.
+
+    version.json in the repo is a manifest (see tools/release.py) with a
+    SHA-256 for every file on the device. Only files whose hash differs from
+    the installed one are downloaded, and they are swapped in together with
+    removing the files listed under "delete" (a module's .py when it is
+    shipped as .mpy and vice versa). The manifest is requested with
+    If-None-Match, so the usual "no update" check is a 304 without a body."""
+
     def __init__(self, ssid, password, repo_url, filename):
         self.filename = filename
         self.ssid = ssid
         self.password = password
         self.repo_url = repo_url
-        
+
         if "www.github.com" in self.repo_url:
             print(f"Updating {repo_url} to raw.githubusercontent")
             self.repo_url = self.repo_url.replace("www.github", "raw.githubusercontent")
         elif "github.com" in self.repo_url:
             print(f"Updating {repo_url} to raw.githubusercontent'")
             self.repo_url = self.repo_url.replace("github", "raw.githubusercontent")
-        
-        self.version_url = self.repo_url + 'main/version.json'
+
+        self.base_url = self.repo_url + 'main/'
+        self.version_url = self.base_url + 'version.json'
         print(f"version url is: {self.version_url}")
-        self.firmware_url = self.repo_url + 'main/' + filename
 
-        # Get the current version (stored in version.json)
-        if 'version.json' in os.listdir():
-            with open('version.json') as f:
-                self.current_version = int(json.load(f)['version'])
+        # Installed version, ETag of the manifest it came from and the
+        # SHA-256 of every installed file (stored in version.json)
+        self.etag = None
+        self.installed = {}
+        if _exists(STATE_FILE):
+            with open(STATE_FILE) as f:
+                state = json.load(f)
+            self.current_version = int(state['version'])
+            self.etag = state.get('etag')
+            self.installed = state.get('files', {})
             print(f"Current device firmware version is '{self.current_version}'")
         else:
             self.current_version = 0
             # Save the current version
-            with open('version.json', 'w') as f:
-                json.dump({'version': self.current_version}, f)
+            self.save_state()
+        self.manifest = None
+        self.manifest_etag = None
+        self.latest_version = self.current_version
+
+    def save_state(self, path=STATE_FILE):
+        with open(path, 'w') as f:
+            json.dump({'version': self.current_version, 'etag': self.etag,
+                       'files': self.installed}, f)
 
     def connect_wifi(self):
-        """ Connect to Wi-Fi."""
+        """ Connect to Wi-Fi, unless main.py already did."""
         sta_if = network.WLAN(network.STA_IF)
+        if sta_if.isconnected():
+            return
         sta_if.active(True)
         sta_if.connect(self.ssid, self.password)
         while not sta_if.isconnected():
@@ -46,56 +164,134 @@ class OTAUpdater:
             sleep(0.25)
         print(f'Connected to WiFi, IP is: {sta_if.ifconfig()[0]}')
 
-    def fetch_latest_code(self) -> bool:
-        """ Fetch the latest code from the repo, returns False if not found."""
-        response = urequests.get(self.firmware_url)
-        if response.status_code == 200:
-            print(f'Fetched latest firmware code, status: {response.status_code}, -  {response.text}')
-            self.latest_code = response.text
-            return True
-        elif response.status_code == 404:
-            print(f'Firmware not found - {self.firmware_url}.')
-            return False
+    def changed_files(self):
+        """ Files in the manifest whose SHA-256 differs from the installed
+        one. Files not recorded yet (first update with a manifest) are
+        hashed on the device instead of downloaded."""
+        changed = []
+        buf = bytearray(CHUNK_SIZE)
+        for name, info in self.manifest['files'].items():
+            installed = self.installed.get(name)
+            if not _exists(name):
+                installed = None
+            elif installed is None:
+                installed = _file_sha256(name, buf)
+                self.installed[name] = installed
+            if installed != info['sha256']:
+                changed.append(name)
+        return changed
 
-    def backup_current_code(self):
-        """ Backup the current main.py file. """
-        if 'main.py' in os.listdir():
-            if 'main_backup.py' in os.listdir():
-                os.remove('main_backup.py')  # Remove old backup if exists
-            os.rename('main.py', 'main_backup.py')
-            print("Backup of current main.py created as main_backup.py")
-
-    def restore_backup(self):
-        """ Restore the backup if the update fails. """
-        if 'main_backup.py' in os.listdir():
-            if 'main.py' in os.listdir():
-                os.remove('main.py')  # Remove the faulty update
-            os.rename('main_backup.py', 'main.py')
-            print("Backup restored as main.py")
-
-    def validate_new_code(self) -> bool:
-        """ Validate the new code to ensure it is correct. """
+    def stale_files(self):
+        """ Files on the device the manifest wants removed. """
+        return [name for name in self.manifest.get('delete', ()) if _exists(name)]
+
+    def fetch_file(self, name, sha256, buf) -> bool:
+        """ Stream one file into "<name>.new" while hashing it, returns False
+        if not found or if the SHA-256 differs from the manifest."""
+        url = self.base_url + self.manifest['files'][name].get('path', name)
+        response = urequests.get(url)
+        temp = name + NEW_SUFFIX
         try:
-            compile(self.latest_code, 'latest_code.py', 'exec')
-            print("New code validation successful")
-            return True
-        except Exception as e:
-            print(f"Error validating new code: {e}")
+            if response.status_code != 200:
+                print(f'File not found - {url}, status: {response.status_code}.')
+                return False
+            _makedirs(name)
+            digest = hashlib.sha256()
+            size = 0
+            view = memoryview(buf)
+            with open(temp, 'wb') as f:
+                while True:
+                    n = response.raw.readinto(buf)
+                    if not n:
+                        break
+                    digest.update(view[:n])
+                    f.write(view[:n])
+                    size += n
+        finally:
+            response.close()
+        digest = hexlify(digest.digest()).decode()
+        if digest != sha256:
+            print(f'Hash mismatch for {url}: got {digest}, expected {sha256}')
+            _remove(temp)
             return False
+        print(f'Fetched {name}, {size} bytes')
+        return True
+
+    def fetch_latest_code(self, names) -> bool:
+        """ Download all files in names, returns False (and removes what was
+        downloaded) if one of them fails."""
+        buf = bytearray(CHUNK_SIZE)
+        fetched = []
+        try:
+            for name in names:
+                if not self.fetch_file(name, self.manifest['files'][name]['sha256'], buf):
+                    break
+                fetched.append(name)
+        finally:
+            if len(fetched) < len(names):
+                for name in names:
+                    _remove(name + NEW_SUFFIX)
+        return len(fetched) == len(names)
+
+    def backup_current_code(self, names=None):
+        """ Backup the current files, e.g. main.py as main_backup.py. """
+        for name in names or (self.filename,):
+            if _exists(name):
+                _remove(_backup_name(name))  # Remove old backup if exists
+                os.rename(name, _backup_name(name))
+                print(f"Backup of current {name} created as {_backup_name(name)}")
 
-    def update_no_reset(self):
-        """ Update the code without resetting the device."""
-        with open('latest_code.py', 'w') as f:
-            f.write(self.latest_code)
+    def restore_backup(self, names=None):
+        """ Restore the backups if the update fails. """
+        for name in names or (self.filename,):
+            if _exists(_backup_name(name)):
+                _remove(name)  # Remove the faulty update
+                os.rename(_backup_name(name), name)
+                print(f"Backup restored as {name}")
+
+    def update_no_reset(self, names, stale=()):
+        """ Swap the verified downloads in for the current files without
+        resetting the device; stale files are moved to their backups. A
+        journal lists the files while they are swapped; version.json is
+        swapped last, together with them."""
+        stale = list(stale)
+        for name in names + stale + [STATE_FILE]:
+            _remove(_backup_name(name))
+        added = [name for name in names if not _exists(name)]
+        with open(JOURNAL_FILE, 'w') as f:
+            json.dump({'files': names + stale + [STATE_FILE], 'added': added}, f)
+        for name in names:
+            self.installed[name] = self.manifest['files'][name]['sha256']
+        for name in stale:
+            self.installed.pop(name, None)
         self.current_version = self.latest_version
-        with open('version.json', 'w') as f:
-            json.dump({'version': self.current_version}, f)
-        self.latest_code = None
+        self.save_state(STATE_FILE + NEW_SUFFIX)
+        swapped = []
+        try:
+            for name in stale:
+                print(f"Removing {name}")
+                swapped.append(name)
+                self.backup_current_code((name,))
+            for name in names + [STATE_FILE]:
+                print(f"Updating device... (Renaming {name + NEW_SUFFIX} to {name})")
+                self.backup_current_code((name,))
+                swapped.append(name)
+                os.rename(name + NEW_SUFFIX, name)
+        except OSError as e:
+            print(f"Error installing update: {e}")
+            self.restore_backup(swapped)
+            for name in added:
+                if name in swapped:
+                    _remove(name)
+            for name in names + [STATE_FILE]:
+                _remove(name + NEW_SUFFIX)
+            os.remove(JOURNAL_FILE)
+            raise
+        os.remove(JOURNAL_FILE)
 
-    def update_and_reset(self):
+    def update_and_reset(self, names, stale=()):
         """ Update the code and reset the device."""
-        print(f"Updating device... (Renaming latest_code.py to {self.filename})", end="")
-        os.rename('latest_code.py', self.filename)
+        self.update_no_reset(names, stale)
         print('Restarting device...')
         machine.reset()  # Reset the device to run the new code
 
@@ -103,30 +299,62 @@ class OTAUpdater:
         """ Check if updates are available."""
         self.connect_wifi()
         print(f'Checking for latest version... on {self.version_url}')
-        response = urequests.get(self.version_url)
-        print(f"Response Text: {response.text}")
-        data = json.loads(response.text)
-        print(f"data is: {data}, url is: {self.version_url}")
-        print(f"data version is: {data['version']}")
+        headers = {'If-None-Match': self.etag} if self.etag else {}
+        response = urequests.get(self.version_url, headers=headers)
+        try:
+            if response.status_code == 304:
+                print('Manifest not modified.')
+                return False
+            if response.status_code != 200:
+                raise OSError(f'version.json: status {response.status_code}')
+            data = json.loads(response.text)
+            etag = _header(response.headers, 'etag')
+        finally:
+            response.close()
         self.latest_version = int(data['version'])
         print(f'latest version is: {self.latest_version}')
+        if 'files' not in data:
+            # single file manifest (version and sha256 of filename)
+            data['files'] = {self.filename: {'sha256': data.get('sha256')}}
+        self.manifest = data
+        self.manifest_etag = etag
         newer_version_available = self.current_version < self.latest_version
         print(f'Newer version available: {newer_version_available}')
+        if not newer_version_available:
+            # remember the ETag, the next check is then a 304
+            self.etag = etag
+            self.save_state()
         return newer_version_available
 
-    def download_and_install_update_if_available(self):
-        """ Check for updates, download, validate, and install them."""
-        if self.check_for_updates():
-            self.backup_current_code()  # Backup the current code
-            if self.fetch_latest_code():
-                if self.validate_new_code():
-                    self.update_no_reset()
-                    self.update_and_reset()
-                else:
-                    print("Validation failed, restoring backup...")
-                    self.restore_backup()
-            else:
-                self.restore_backup()
-        else:
+    def download_and_install_update_if_available(self, reset=True):
+        """ Check for updates, download and verify the changed files, then
+        install them. Nothing is touched until all downloads are verified.
+        With reset=False the device is not reset after installing; the
+        caller does it (after saving its own state) when this returns True."""
+        if not self.check_for_updates():
             print('No new updates available.')
-
+            return False
+        if not all(info.get('sha256') for info in self.manifest['files'].values()):
+            print('No sha256 in version.json, not updating.')
+            return False
+        # .mpy files only load on firmware with the same bytecode version
+        mpy = self.manifest.get('mpy')
+        if mpy and _mpy_version() not in (None, mpy):
+            print(f'Update needs mpy {mpy}, firmware has {_mpy_version()}, not updating.')
+            return False
+        changed = self.changed_files()
+        stale = self.stale_files()
+        print(f'Changed files: {changed}, removed: {stale}')
+        if not changed and not stale:
+            self.current_version = self.latest_version
+            self.etag = self.manifest_etag
+            self.save_state()
+        elif self.fetch_latest_code(changed):
+            self.etag = self.manifest_etag
+            if not reset:
+                self.update_no_reset(changed, stale)
+                return True
+            self.update_and_reset(changed, stale)
+        else:
+            print('Download failed, keeping the current code.')
+        return False
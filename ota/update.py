@@ -1,4 +1,6 @@
-from ota import OTAUpdater
+# Update-Prüfung von Hand, z. B. über die REPL: import ota.update
+# Im Betrieb prüft main.py im Hintergrund (network_tasks).
+from ota.ota import OTAUpdater
 from wifi_config import SSID, PASSWORD
 
 def check_for_updates():
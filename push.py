@@ -0,0 +1,259 @@
+# Messungen per UDP an den Sammeldienst schicken (collector/, --udp)
+#
+# Als Puffer für WLAN-Ausfälle dient der Ringspeicher selbst: der Pusher
+# merkt sich in "cursor_file" die Sequenznummer der ersten noch nicht
+# bestätigten Messung und liest von dort aus store.records(). Was drei Tage
+# lang nicht ankommt, ist überschrieben; danach geht es beim ältesten
+# vorhandenen Datensatz weiter.
+#
+# Ein Paket (Frame) enthält bis zu "batch" aufeinanderfolgende Messungen:
+#
+#   Kopf   FRAME_FORMAT: "GP", Version, Anzahl, Sequenznummer der ersten
+#          Messung, deren Zeit, Länge des Gerätenamens; danach der Name
+#   je     ROW_FORMAT: Sekunden seit der vorherigen Messung (uint16), dann
+#   Messung die Werte wie im Ringspeicher
+#
+# Der Sammeldienst antwortet mit ACK_FORMAT ("GA", Version, Sequenznummer
+# nach der letzten übernommenen Messung); erst dann rückt der Zeiger vor.
+# Kommt keine Antwort, wird dasselbe Paket wiederholt - doppelte Messungen
+# verwirft der Sammeldienst anhand der Zeit.
+#
+# Messungen aus der Zeit vor der Zeit-Synchronisation (sensor_store.
+# time_valid) wartet der Pusher ab, bis fix_pre_ntp() sie korrigiert hat;
+# solche aus früheren Starts (vor "first_seq") werden nie mehr korrigiert
+# und übersprungen.
+
+import socket
+import struct
+import time
+
+from sensor_store import RECORD_FORMAT, time_valid, unix_time
+from webserver import asyncio
+
+MAGIC = b"GP"
+ACK_MAGIC = b"GA"
+VERSION = 1
+
+# magic, version, Anzahl, Sequenznummer, Zeit, Länge des Namens
+FRAME_FORMAT = "<2sBBIIB"
+FRAME_SIZE = struct.calcsize(FRAME_FORMAT)
+ROW_FORMAT = "<H" + RECORD_FORMAT[2:]
+ROW_SIZE = struct.calcsize(ROW_FORMAT)
+ACK_FORMAT = "<2sBI"
+ACK_SIZE = struct.calcsize(ACK_FORMAT)
+
+# passt ohne Fragmentierung in ein Ethernet-Paket
+MAX_PAYLOAD = 1400
+
+
+def max_rows(name):
+    return min(255, (MAX_PAYLOAD - FRAME_SIZE - len(name)) // ROW_SIZE)
+
+
+def encode_frame(name, seq, records):
+    """ Paket für aufeinanderfolgende Datensätze (Zeit, Werte...); die Zeit
+        muss steigen und darf höchstens 65535 s springen. """
+    name = name.encode()
+    buf = bytearray(FRAME_SIZE + len(name) + len(records) * ROW_SIZE)
+    struct.pack_into(FRAME_FORMAT, buf, 0, MAGIC, VERSION, len(records), seq, records[0][0], len(name))
+    buf[FRAME_SIZE:FRAME_SIZE + len(name)] = name
+    offset = FRAME_SIZE + len(name)
+    previous = records[0][0]
+    for record in records:
+        struct.pack_into(ROW_FORMAT, buf, offset, record[0] - previous, *record[1:])
+        previous = record[0]
+        offset += ROW_SIZE
+    return buf
+
+
+def decode_frame(data):
+    """ (Gerätename, Sequenznummer, [(Zeit, Werte)]); ValueError bei einem
+        kaputten Paket. """
+    if len(data) < FRAME_SIZE:
+        raise ValueError("Paket zu kurz")
+    magic, version, count, seq, timestamp, name_len = struct.unpack_from(FRAME_FORMAT, data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unbekanntes Paketformat")
+    offset = FRAME_SIZE + name_len
+    if len(data) != offset + count * ROW_SIZE:
+        raise ValueError("Falsche Paketlänge")
+    name = bytes(data[FRAME_SIZE:offset]).decode()
+    rows = []
+    for _ in range(count):
+        row = struct.unpack_from(ROW_FORMAT, data, offset)
+        timestamp += row[0]
+        rows.append((timestamp, row[1:]))
+        offset += ROW_SIZE
+    return name, seq, rows
+
+
+def encode_ack(seq):
+    return struct.pack(ACK_FORMAT, ACK_MAGIC, VERSION, seq)
+
+
+def decode_ack(data):
+    if len(data) != ACK_SIZE:
+        return None
+    magic, version, seq = struct.unpack(ACK_FORMAT, data)
+    return seq if magic == ACK_MAGIC and version == VERSION else None
+
+
+class Pusher:
+    def __init__(self, store, host, port, name, batch=30, max_delay_s=300,
+                 cursor_file="push.cur", first_seq=0, timeout_ms=1000, attempts=3):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.address = None
+        self.name = name
+        self.batch = min(batch, max_rows(name.encode()))
+        self.max_delay_s = max_delay_s
+        self.cursor_file = cursor_file
+        self.first_seq = first_seq
+        self.timeout_ms = timeout_ms
+        self.attempts = attempts
+        self.cursor = self._load_cursor()
+        self._saved = self.cursor
+        self.frames = 0
+        self.retries = 0
+        # sendto() abgelehnt, z. B. ohne WLAN (EHOSTUNREACH, ENOMEM)
+        self.send_errors = 0
+        self.sent_bytes = 0
+        self.received_bytes = 0
+        # Zeit vom ersten Senden bis zur Bestätigung, summiert
+        self.wait_ms = 0
+
+    def _load_cursor(self):
+        try:
+            with open(self.cursor_file, "rb") as f:
+                return struct.unpack("<I", f.read(4))[0]
+        except (OSError, ValueError, struct.error):
+            return 0
+
+    def save_cursor(self):
+        if self.cursor == self._saved:
+            return
+        with open(self.cursor_file, "wb") as f:
+            f.write(struct.pack("<I", self.cursor))
+        self._saved = self.cursor
+
+    @property
+    def backlog(self):
+        return self.store.head - self.cursor
+
+    def _check_cursor(self):
+        # neu angelegter Ringspeicher oder inzwischen überschriebene Daten
+        store = self.store
+        if self.cursor > store.head or self.cursor < store.oldest:
+            self.cursor = store.oldest
+
+    def next_frame(self, now=None):
+        """ (Paket, Sequenznummer danach) für die nächsten Messungen oder
+            None, wenn noch nicht genug da sind. """
+        self._check_cursor()
+        while True:
+            start = first = self.cursor
+            records = []
+            for seq, record in self.store.records(first, first + self.batch):
+                if not time_valid(record[0]):
+                    if seq < self.first_seq and not records:
+                        first = self.cursor = seq + 1
+                        continue
+                    break
+                if records:
+                    delta = record[0] - records[-1][0]
+                    if delta < 0 or delta > 0xFFFF:
+                        break
+                records.append(record)
+            if records or self.cursor == start:
+                break
+            # nur Übersprungenes gelesen, weiter dahinter
+        if not records:
+            return None
+        if len(records) < self.batch:
+            # Rest erst nach max_delay_s oder wenn dahinter etwas anderes kommt
+            now = unix_time() if now is None else now
+            if first + len(records) == self.store.head and now - records[0][0] < self.max_delay_s:
+                return None
+        return encode_frame(self.name, first, records), first + len(records)
+
+    async def send(self, sock, frame, end):
+        """ Schickt ein Paket bis zu "attempts" Mal; True nach Bestätigung.
+            Lehnt der Stack das Senden ab, gleich False - neu versucht wird
+            nach dem Backoff in run(). """
+        started = time.ticks_ms()
+        for attempt in range(self.attempts):
+            if attempt:
+                self.retries += 1
+            try:
+                sock.sendto(frame, self.address)
+            except OSError:
+                self.send_errors += 1
+                return False
+            self.sent_bytes += len(frame)
+            sent = time.ticks_ms()
+            while time.ticks_diff(time.ticks_ms(), sent) < self.timeout_ms:
+                try:
+                    data = sock.recv(16)
+                except OSError:
+                    await asyncio.sleep_ms(10)
+                    continue
+                self.received_bytes += len(data)
+                # Antworten auf frühere Wiederholungen überspringen
+                if decode_ack(data) == end:
+                    self.wait_ms += time.ticks_diff(time.ticks_ms(), started)
+                    return True
+        return False
+
+    async def run(self, connected=None, idle_ms=10000, save_every=8):
+        """ Schickt, solange connected() (z. B. wlan.isconnected) True
+            liefert; ohne Bestätigung wird mit wachsendem Abstand neu
+            versucht. Fehler des Netzwerks beenden den Task nicht; die
+            Messungen bleiben im Ringspeicher, bis sie bestätigt sind. """
+        sock = None
+        backoff = 1000
+        unsaved = 0
+        try:
+            while True:
+                if connected is not None and not connected():
+                    await asyncio.sleep_ms(idle_ms)
+                    continue
+                frame = self.next_frame()
+                if frame is not None and self.address is None:
+                    try:
+                        self.address = socket.getaddrinfo(self.host, self.port)[0][-1]
+                    except OSError:
+                        frame = None
+                if frame is not None and sock is None:
+                    try:
+                        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                        sock.setblocking(False)
+                    except OSError:
+                        sock = None
+                        frame = None
+                if frame is None:
+                    self.save_cursor()
+                    unsaved = 0
+                    await asyncio.sleep_ms(idle_ms)
+                    continue
+                errors = self.send_errors
+                if not await self.send(sock, *frame):
+                    # nach einem abgelehnten Senden neuer Socket, falls der
+                    # alte nach dem Verbindungsabbruch nicht mehr taugt
+                    if self.send_errors != errors:
+                        sock.close()
+                        sock = None
+                    await asyncio.sleep_ms(backoff)
+                    backoff = min(backoff * 2, 300000)
+                    continue
+                backoff = 1000
+                self.cursor = frame[1]
+                self.frames += 1
+                # beim Nachholen nicht nach jedem Paket auf den Flash schreiben
+                unsaved += 1
+                if unsaved >= save_every:
+                    self.save_cursor()
+                    unsaved = 0
+        finally:
+            if sock is not None:
+                sock.close()
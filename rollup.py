@@ -0,0 +1,424 @@
+# Laufende Aggregate für lange Zeiträume (Minute, Stunde, Tag)
+#
+# Jede Stufe hält für ihren aktuellen Zeit-Bucket pro Messgröße nur Anzahl,
+# Mittelwert, Summe der Abweichungsquadrate (Welford), Minimum und Maximum -
+# konstanter Speicher, egal wie viele Messungen hineinlaufen. Ist ein
+# Bucket vorbei, wird er als eine Zeile in die Datei der Stufe geschrieben
+# und in den Bucket der nächsten Stufe übernommen (Minute -> Stunde -> Tag,
+# zusammengeführt nach Chan et al.).
+#
+# Die Dateien sind Ringspeicher wie sensor_data.bin, nur viel kürzer als
+# der Zeitraum, den sie abdecken: die Rohdaten sind nach 3 Tagen
+# überschrieben, die Tageswerte bleiben 5 Jahre. /api/history liest für
+# einen Monat so 720 Stundenzeilen statt 260000 Messungen.
+#
+# Nach einem Neustart stellt recover() die angefangenen Buckets aus den
+# Zeilen der feineren Stufe und dem Ringspeicher wieder her.
+
+import math
+import struct
+from array import array
+
+from sensor_store import FIELDS, VALID_FROM, format_time
+from webserver import asyncio
+
+SERIES = len(FIELDS)
+
+MAGIC = b"GBR1"
+VERSION = 1
+
+# magic, version, record_size, capacity, head, Breite des Buckets in s
+HEADER_FORMAT = "<4sHHIII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Beginn des Buckets (Unix-Sekunden, UTC), Anzahl der Messungen, dann pro
+# Messgröße Mittelwert, Varianz, Minimum, Maximum
+ROW_FORMAT = "<IH" + "ffff" * SERIES
+ROW_SIZE = struct.calcsize(ROW_FORMAT)
+READ_ROWS = 8
+
+# Name, Breite in s, Zeilen, Zeilen pro Schreibvorgang; zusammen etwa 700 KB
+# (Minute: 2 Tage, Stunde: 92 Tage, Tag: 5 Jahre)
+TIERS = (("minute", 60, 2880, 10), ("hour", 3600, 2208, 1), ("day", 86400, 1830, 1))
+
+STATS_FORMAT = '"{}":{{"mean":{:.2f},"std":{:.2f},"min":{:.2f},"max":{:.2f}}}'
+
+
+class Bucket:
+    def __init__(self):
+        self.start = 0
+        self.count = 0
+        self.mean = array("f", (0.0 for _ in range(SERIES)))
+        self.m2 = array("f", (0.0 for _ in range(SERIES)))
+        self.min = array("f", (0.0 for _ in range(SERIES)))
+        self.max = array("f", (0.0 for _ in range(SERIES)))
+        # Varianz auf float32 gerundet wie in der Datei, damit die nächste
+        # Stufe nach einem Neustart genau dasselbe zusammenführt
+        self._var = array("f", (0.0,))
+
+    def add(self, values):
+        """ Eine Messung (Welford). """
+        self.count += 1
+        n = self.count
+        mean, m2, mins, maxs = self.mean, self.m2, self.min, self.max
+        for k in range(SERIES):
+            x = values[k]
+            if n == 1:
+                mean[k] = mins[k] = maxs[k] = x
+                m2[k] = 0.0
+                continue
+            delta = x - mean[k]
+            mean[k] += delta / n
+            m2[k] += delta * (x - mean[k])
+            if x < mins[k]:
+                mins[k] = x
+            elif x > maxs[k]:
+                maxs[k] = x
+
+    def merge(self, row):
+        """ Eine Zeile der feineren Stufe (Chan et al.). """
+        nb = row[1]
+        if not nb:
+            return
+        na = self.count
+        n = na + nb
+        mean, m2, mins, maxs = self.mean, self.m2, self.min, self.max
+        for k in range(SERIES):
+            i = 2 + 4 * k
+            if not na:
+                mean[k] = row[i]
+                m2[k] = row[i + 1] * nb
+                mins[k] = row[i + 2]
+                maxs[k] = row[i + 3]
+                continue
+            delta = row[i] - mean[k]
+            mean[k] += delta * nb / n
+            m2[k] += row[i + 1] * nb + delta * delta * na * nb / n
+            if row[i + 2] < mins[k]:
+                mins[k] = row[i + 2]
+            if row[i + 3] > maxs[k]:
+                maxs[k] = row[i + 3]
+        self.count = n if n < 65535 else 65535
+
+    def row(self):
+        row = [self.start, self.count]
+        for k in range(SERIES):
+            row.append(self.mean[k])
+            self._var[0] = self.m2[k] / self.count
+            row.append(self._var[0])
+            row.append(self.min[k])
+            row.append(self.max[k])
+        return row
+
+
+class TierFile:
+    """ Ringspeicher mit einer Zeile pro abgeschlossenem Bucket. Die Zeiten
+        steigen streng monoton, deshalb wird ohne Index binär gesucht. """
+
+    def __init__(self, filename, width, capacity, batch=1):
+        self.filename = filename
+        self.width = width
+        self.batch = batch
+        self._pending = bytearray(batch * ROW_SIZE)
+        self._pending_count = 0
+        self._header = bytearray(HEADER_SIZE)
+        self._time = bytearray(4)
+
+        try:
+            self._file = open(filename, "r+b")
+        except OSError:
+            self._file = None
+        if self._file is not None and self._load_header():
+            return
+        if self._file is not None:
+            self._file.close()
+        self.capacity = capacity
+        self.head = 0
+        self._create()
+
+    def _load_header(self):
+        self._file.seek(0)
+        if self._file.readinto(self._header) != HEADER_SIZE:
+            return False
+        magic, version, record_size, capacity, head, width = struct.unpack(HEADER_FORMAT, self._header)
+        if magic != MAGIC or version != VERSION or record_size != ROW_SIZE or width != self.width:
+            print("Unbekanntes Format in", self.filename, "- Datei wird neu angelegt")
+            return False
+        self.capacity = capacity
+        self.head = head
+        return True
+
+    def _create(self):
+        self._file = open(self.filename, "w+b")
+        self._write_header()
+        zeros = bytes(512)
+        remaining = self.capacity * ROW_SIZE
+        while remaining > 0:
+            n = remaining if remaining < 512 else 512
+            self._file.write(zeros if n == 512 else zeros[:n])
+            remaining -= n
+        self._file.flush()
+
+    def _write_header(self):
+        struct.pack_into(HEADER_FORMAT, self._header, 0, MAGIC, VERSION,
+                         ROW_SIZE, self.capacity, self.head, self.width)
+        self._file.seek(0)
+        self._file.write(self._header)
+
+    def append(self, row):
+        struct.pack_into(ROW_FORMAT, self._pending, self._pending_count * ROW_SIZE, *row)
+        self._pending_count += 1
+        if self._pending_count >= self.batch:
+            self.flush()
+
+    def flush(self):
+        count = self._pending_count
+        if not count:
+            return
+        pending = memoryview(self._pending)
+        written = 0
+        while written < count:
+            slot = (self.head + written) % self.capacity
+            n = min(count - written, self.capacity - slot)
+            self._file.seek(HEADER_SIZE + slot * ROW_SIZE)
+            self._file.write(pending[written * ROW_SIZE:(written + n) * ROW_SIZE])
+            written += n
+        self.head += count
+        self._pending_count = 0
+        self._write_header()
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    @property
+    def oldest(self):
+        return self.head - self.capacity if self.head > self.capacity else 0
+
+    def __len__(self):
+        return self.head - self.oldest + self._pending_count
+
+    def _time_at(self, f, seq):
+        f.seek(HEADER_SIZE + (seq % self.capacity) * ROW_SIZE)
+        f.readinto(self._time)
+        return struct.unpack("<I", self._time)[0]
+
+    def first_time(self):
+        """ Beginn des ältesten Buckets, None wenn leer. """
+        if self.head:
+            with open(self.filename, "rb") as f:
+                return self._time_at(f, self.oldest)
+        if self._pending_count:
+            return struct.unpack_from("<I", self._pending, 0)[0]
+        return None
+
+    def last(self):
+        """ Die neueste Zeile, None wenn leer. """
+        if self._pending_count:
+            return struct.unpack_from(ROW_FORMAT, self._pending, (self._pending_count - 1) * ROW_SIZE)
+        for row in self.rows(self._last_time()):
+            return row
+        return None
+
+    def _last_time(self):
+        if not self.head:
+            return 0xFFFFFFFF
+        with open(self.filename, "rb") as f:
+            return self._time_at(f, self.head - 1)
+
+    def rows(self, start=0, stop=0xFFFFFFFF):
+        """ Liefert die Zeilen mit start <= Beginn <= stop, auch die noch
+            nicht geschriebenen. """
+        head = self.head
+        pending = self._pending_count
+        buf = bytearray(READ_ROWS * ROW_SIZE)
+        view = memoryview(buf)
+        with open(self.filename, "rb") as f:
+            lo, hi = self.oldest, head
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._time_at(f, mid) < start:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            seq = lo
+            while seq < head:
+                slot = seq % self.capacity
+                n = min(head - seq, self.capacity - slot, READ_ROWS)
+                f.seek(HEADER_SIZE + slot * ROW_SIZE)
+                f.readinto(view[:n * ROW_SIZE])
+                for i in range(n):
+                    row = struct.unpack_from(ROW_FORMAT, buf, i * ROW_SIZE)
+                    if row[0] > stop:
+                        return
+                    yield row
+                seq += n
+        for i in range(pending):
+            row = struct.unpack_from(ROW_FORMAT, self._pending, i * ROW_SIZE)
+            if row[0] > stop:
+                return
+            if row[0] >= start:
+                yield row
+
+
+class Tier:
+    def __init__(self, name, width, file):
+        self.name = name
+        self.width = width
+        self.file = file
+        self.bucket = Bucket()
+        # Buckets, die vor done beginnen, sind schon in der Datei
+        last = file.last()
+        self.done = last[0] + width if last else 0
+
+    def rows(self, start, stop):
+        """ Zeilen der Datei und zuletzt der angefangene Bucket. """
+        for row in self.file.rows(start, stop):
+            yield row
+        bucket = self.bucket
+        if bucket.count and start <= bucket.start <= stop:
+            yield bucket.row()
+
+
+def extremes(row):
+    """ (Zeit, Minima...) und (Zeit, Maxima...) einer Zeile, für den
+        Downsampler von /api/history. """
+    low = [row[0]]
+    high = [row[0]]
+    for k in range(SERIES):
+        low.append(row[4 + 4 * k])
+        high.append(row[5 + 4 * k])
+    return low, high
+
+
+class Rollups:
+    """ Bis recover() durch ist, werden neue Messungen zurückgestellt. """
+
+    def __init__(self, prefix="sensor", tiers=TIERS):
+        self.tiers = []
+        for name, width, capacity, batch in tiers:
+            filename = "{}_{}.bin".format(prefix, name)
+            self.tiers.append(Tier(name, width, TierFile(filename, width, capacity, batch)))
+        self._queue = []
+
+    def tier(self, name):
+        for tier in self.tiers:
+            if tier.name == name:
+                return tier
+        return None
+
+    def add(self, timestamp, values):
+        if self._queue is not None:
+            self._queue.append((timestamp, values))
+            return
+        if self._roll(0, timestamp):
+            self.tiers[0].bucket.add(values)
+
+    def _roll(self, i, timestamp):
+        """ Stellt Stufe i auf den Bucket von timestamp ein und schließt den
+            bisherigen ab. False für Zeiten, die schon abgeschlossen sind oder
+            vor dem aktuellen Bucket liegen (Uhr zurückgestellt). """
+        tier = self.tiers[i]
+        start = timestamp - timestamp % tier.width
+        bucket = tier.bucket
+        if start < tier.done or (bucket.count and start < bucket.start):
+            return False
+        if bucket.count and start != bucket.start:
+            self._close(i)
+        if not bucket.count:
+            bucket.start = start
+        return True
+
+    def _close(self, i):
+        tier = self.tiers[i]
+        row = tier.bucket.row()
+        tier.file.append(row)
+        tier.done = row[0] + tier.width
+        tier.bucket.count = 0
+        if i + 1 < len(self.tiers):
+            self._merge(i + 1, row)
+
+    def _merge(self, i, row):
+        if self._roll(i, row[0]):
+            self.tiers[i].bucket.merge(row)
+
+    async def recover(self, store):
+        """ Angefangene Buckets wiederherstellen: jede Stufe aus den Zeilen
+            der feineren, die noch nicht in ihrer Datei sind (von grob nach
+            fein), die Minuten aus dem Ringspeicher. Ohne Dateien wird so
+            einmal alles nachgerechnet, was im Ringspeicher liegt. """
+        for i in range(len(self.tiers) - 1, 0, -1):
+            for row in self.tiers[i - 1].file.rows(self.tiers[i].done):
+                self._merge(i, row)
+        n = 0
+        # übrig gebliebene Laufzeit-Zeiten (Start ohne NTP) gehören nicht hinein
+        done = self.tiers[0].done
+        for _, record in store.range(done if done > VALID_FROM else VALID_FROM, 0xFFFFFFFF):
+            # was währenddessen gemessen wurde, steht in der Warteschlange
+            if self._queue and record[0] >= self._queue[0][0]:
+                break
+            if self._roll(0, record[0]):
+                self.tiers[0].bucket.add(record[1:])
+            n += 1
+            if n & 63 == 0:
+                await asyncio.sleep(0)
+        queue = self._queue
+        self._queue = None
+        for timestamp, values in queue:
+            self.add(timestamp, values)
+        print("Aggregate wiederhergestellt,", n, "Messungen nachgerechnet")
+
+    def pick(self, width, start, raw_from=None):
+        """ Quelle für Buckets von width Sekunden ab start; None heißt
+            Rohdaten (raw_from: Zeit der ältesten mit gestellter Uhr,
+            RingStore.first_valid_time). Unter den Quellen, die fein genug
+            sind, die am weitesten zurückreichende, bei Gleichstand die
+            gröbste. Reicht keine bis start, eine gröbere, die es tut. """
+        sources = [(1, raw_from, None)]
+        for tier in self.tiers:
+            sources.append((tier.width, tier.file.first_time(), tier))
+        best = None
+        best_reach = None
+        for source_width, first, tier in sources:
+            if source_width > width or first is None:
+                continue
+            reach = first if first > start else start
+            if best_reach is None or reach <= best_reach:
+                best, best_reach = tier, reach
+        if best_reach is None or best_reach > start:
+            for source_width, first, tier in sources:
+                if source_width > width and first is not None and first <= start:
+                    return tier
+        return best
+
+    def flush(self):
+        for tier in self.tiers:
+            tier.file.flush()
+
+    def close(self):
+        for tier in self.tiers:
+            tier.file.close()
+
+
+async def send_stats(tier, response, start, stop):
+    """ Zeilen einer Stufe als JSON: Anzahl und pro Messgröße Mittelwert,
+        Standardabweichung, Minimum und Maximum. """
+    await response.start(content_type="application/json", chunked=True)
+    chunk = bytearray(b"[")
+    separator = b""
+    for row in tier.rows(start, stop):
+        chunk += separator
+        chunk += '{{"date":"{}","count":{}'.format(format_time(row[0]), row[1]).encode()
+        for k in range(SERIES):
+            i = 2 + 4 * k
+            chunk += b","
+            chunk += STATS_FORMAT.format(FIELDS[k], row[i], math.sqrt(max(row[i + 1], 0.0)),
+                                         row[i + 2], row[i + 3]).encode()
+        chunk += b"}"
+        separator = b","
+        if len(chunk) >= 1024:
+            await response.write(chunk)
+            chunk = bytearray()
+    chunk += b"]"
+    await response.write(chunk)
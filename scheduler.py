@@ -0,0 +1,71 @@
+# Zeitgesteuerte Abfrage der Sensoren
+#
+# Jeder Sensor läuft als eigener Task mit eigener Periode. Eine Messung
+# wird angestoßen, der Task schläft, bis die Wandlungszeit laut Datenblatt
+# vorbei ist, und holt dann das Ergebnis ab. In der Zwischenzeit laufen die
+# anderen Sensoren und der Webserver weiter. Die nächste Frist ist immer
+# die vorherige plus Periode, die Lesedauer verschiebt den Takt also nicht.
+
+import time
+
+from webserver import asyncio
+
+
+class Job:
+    def __init__(self, name, period_ms, collect, start=None, offset_ms=0):
+        self.name = name
+        self.period_ms = period_ms
+        self.collect = collect
+        self.start = start
+        self.offset_ms = offset_ms
+        # Statistik: Durchläufe, übersprungene Termine, Verspätung beim
+        # Start und Dauer vom Anstoßen bis zum Abholen
+        self.runs = 0
+        self.missed = 0
+        self.late_ms = 0
+        self.max_late_ms = 0
+        self.last_ms = 0
+
+
+class SensorScheduler:
+    def __init__(self):
+        self.jobs = []
+        self.tasks = []
+
+    def add(self, name, period_ms, collect, start=None, offset_ms=0):
+        """ collect() holt das Ergebnis ab; start() stößt optional vorher eine
+            Messung an und gibt die Wartezeit in ms bis zum Abholen zurück. """
+        job = Job(name, period_ms, collect, start, offset_ms)
+        self.jobs.append(job)
+        return job
+
+    def start(self):
+        t0 = time.ticks_ms()
+        for job in self.jobs:
+            self.tasks.append(asyncio.create_task(self._run(job, t0)))
+
+    async def _run(self, job, t0):
+        deadline = time.ticks_add(t0, job.offset_ms)
+        while True:
+            delay = time.ticks_diff(deadline, time.ticks_ms())
+            if delay > 0:
+                await asyncio.sleep_ms(delay)
+            begun = time.ticks_ms()
+            job.late_ms = time.ticks_diff(begun, deadline)
+            if job.late_ms > job.max_late_ms:
+                job.max_late_ms = job.late_ms
+            try:
+                if job.start is not None:
+                    wait = job.start()
+                    if wait:
+                        await asyncio.sleep_ms(wait)
+                job.collect()
+            except Exception as e:
+                print("Fehler bei {}: {}".format(job.name, e))
+            job.last_ms = time.ticks_diff(time.ticks_ms(), begun)
+            job.runs += 1
+            deadline = time.ticks_add(deadline, job.period_ms)
+            # Verpasste Termine überspringen statt sie nachzuholen
+            while time.ticks_diff(deadline, time.ticks_ms()) <= 0:
+                deadline = time.ticks_add(deadline, job.period_ms)
+                job.missed += 1
@@ -0,0 +1,349 @@
+# Sensoren am I2C-Bus hinter den Multiplexern
+#
+# discover() durchsucht jeden Kanal aller Multiplexer und legt für jedes
+# erkannte Gerät einen passenden Sensor an. Die ID eines Sensors setzt sich
+# aus Typ, Multiplexer, Ausgang und Adresse zusammen ("bme280-70-1-76") und
+# bleibt damit gleich, solange die Verdrahtung gleich bleibt. Gelesen wird
+# pro Typ und Kanal: erst alle Messungen anstoßen, dann nach der längsten
+# Wandlungszeit alle Ergebnisse abholen, jeder Kanal wird dabei nur einmal
+# ausgewählt.
+#
+# Aufgezeichnet wird nur der erste Sensor jedes Typs (primary(), siehe
+# RECORDED in main.py); alle anderen liefern ihre Werte unter ihrer ID nur
+# live über info() bzw. /api/sensors.
+#
+# Die CCS811 bekommen Temperatur und Luftfeuchte des ersten BME280 zur
+# Kompensation. Ihre Baseline wird regelmäßig in ccs811.json gesichert und
+# nach dem Start zurückgeschrieben, damit die Werte nicht erst nach dem
+# Einlernen stimmen.
+
+from libraries import bme280  # Relativer Import
+from libraries import CCS811  # Importiere die CCS811-Bibliothek
+from libraries import bh1750  # BH1750-Bibliothek importieren
+from array import array
+from i2c_bus import mux_address
+import json
+import time
+
+
+def sensor_id(kind, channel, address):
+    return "{}-{:02x}-{}-{:02x}".format(kind, mux_address(channel), channel % 8, address)
+
+
+class Sensor:
+    kind = None
+    fields = ()
+
+    def __init__(self, channel, address):
+        self.channel = channel
+        self.address = address
+        self.id = sensor_id(self.kind, channel, address)
+        # letzte Messwerte in der Reihenfolge von fields, None bis zur ersten Messung
+        self.values = None
+
+    def start(self):
+        """ Stößt eine Messung an, gibt die Wartezeit in ms zurück. """
+        return 0
+
+    def collect(self):
+        pass
+
+    def info(self):
+        data = {"id": self.id, "type": self.kind, "channel": self.channel,
+                "address": self.address}
+        if self.values is not None:
+            for name, value in zip(self.fields, self.values):
+                data[name] = value
+        return data
+
+
+class CCS811Sensor(Sensor):
+    kind = "ccs811"
+    fields = ("co2", "tvoc")
+    addresses = (0x5A, 0x5B)
+    # Temperatur und Luftfeuchte werden erst nach einer Änderung um so viel
+    # neu übertragen (°C, %)
+    env_step = (0.5, 1.0)
+    # ohne gesicherte Baseline ist die eigene erst nach 20 Minuten Betrieb
+    # brauchbar und wird vorher nicht gespeichert
+    run_in_ms = 20 * 60 * 1000
+
+    @staticmethod
+    def probe(i2c, address):
+        # HW_ID-Register 0x20
+        return i2c.readfrom_mem(address, 0x20, 1)[0] == 0x81
+
+    def __init__(self, i2c, channel, address):
+        super().__init__(channel, address)
+        self.driver = CCS811.CCS811(i2c=i2c, addr=address)
+        self.started = time.ticks_ms()
+        self.restored = False
+        # zuletzt übertragene (Temperatur, Luftfeuchte)
+        self.env = None
+
+    def collect(self):
+        # übernimmt neue Werte, falls der Sensor welche bereit hat; im
+        # Modus 1 liefert er die ersten nach etwa einer Sekunde. Ist nINT
+        # verdrahtet (driver.int_pin), wird ohne neue Daten nichts gelesen.
+        if self.driver.data_ready():
+            self.values = (self.driver.eCO2, self.driver.tVOC)
+
+    def set_environment(self, temperature, humidity):
+        """ Überträgt die Werte zur Kompensation, wenn sie sich genug
+            geändert haben; gibt zurück, ob geschrieben wurde. """
+        if (self.env is not None and
+                abs(temperature - self.env[0]) < self.env_step[0] and
+                abs(humidity - self.env[1]) < self.env_step[1]):
+            return False
+        self.driver.put_envdata(humidity, temperature)
+        self.env = (temperature, humidity)
+        return True
+
+    def baseline(self):
+        """ Aktuelle Baseline als Zahl, None während des Einlernens. """
+        if not self.restored and time.ticks_diff(time.ticks_ms(), self.started) < self.run_in_ms:
+            return None
+        high, low = self.driver.get_baseline()
+        return (high << 8) | low
+
+    def restore_baseline(self, baseline):
+        self.driver.put_baseline(baseline >> 8, baseline & 0xFF)
+        self.restored = True
+
+
+class BME280Sensor(Sensor):
+    kind = "bme280"
+    fields = ("temp", "pressure", "humidity")
+    addresses = (0x76, 0x77)
+    # Normal-Modus: der Sensor misst jede Sekunde selbst, Lesen ist nur noch
+    # der 8-Byte-Block; der IIR-Filter glättet Luftzug am Gehäuse
+    settings = {"standby": bme280.BME280_STANDBY_1000,
+                "iir": bme280.BME280_FILTER_4}
+
+    @staticmethod
+    def probe(i2c, address):
+        # Chip-ID-Register 0xD0
+        return i2c.readfrom_mem(address, 0xD0, 1)[0] == 0x60
+
+    def __init__(self, i2c, channel, address):
+        super().__init__(channel, address)
+        self.driver = bme280.BME280(i2c=i2c, address=address, **self.settings)
+        self._raw = array("i", [0, 0, 0])
+        self._compensated = array("i", [0, 0, 0])
+
+    def start(self):
+        return (self.driver.start_measurement() + 999) // 1000
+
+    def collect(self):
+        # im Forced-Modus sicherstellen, dass die Wandlung fertig ist
+        self.driver.wait_measurement()
+        self.driver.read_measurement(self._raw)
+        temperature, pressure, humidity = self.driver.compensate(self._raw, self._compensated)
+        self.values = (temperature / 100, pressure / 25600, humidity / 1024)
+
+
+class BH1750Sensor(Sensor):
+    kind = "bh1750"
+    fields = ("lux",)
+    addresses = (0x23, 0x5C)
+    # None: Modus und MTreg wählt der Treiber selbst, H-Res 2 bei Dunkelheit
+    # bis L-Res unter Pflanzenlampen
+    mode = None
+
+    @staticmethod
+    def probe(i2c, address):
+        # Der BH1750 hat kein ID-Register, die Adresse muss reichen
+        return True
+
+    def __init__(self, i2c, channel, address):
+        super().__init__(channel, address)
+        self.driver = bh1750.BH1750(i2c, addr=address)
+
+    def start(self):
+        return self.driver.start(self.mode)
+
+    def collect(self):
+        # None: Wandlung noch nicht fertig oder übersteuert, dann bleibt
+        # der letzte Wert stehen
+        lux = self.driver.collect(self.mode)
+        if lux is not None:
+            self.values = (lux,)
+
+
+SENSOR_TYPES = (CCS811Sensor, BME280Sensor, BH1750Sensor)
+
+
+# SensorManager Klasse
+class SensorManager:
+    def __init__(self, bus, config="sensors.json", baselines="ccs811.json"):
+        # bus: I2CBus aus i2c_bus.py, wählt den Kanal und reserviert den Bus
+        self.bus = bus
+        self.config = config
+        # Datei für die CCS811-Baselines, None: nichts sichern
+        self.baselines = baselines
+        self._saved = {}
+        # alle bekannten IDs in fester Reihenfolge, auch zur Zeit fehlende
+        self.known = []
+        self.sensors = []
+        # [(Kanal, [Sensoren])], nach Kanal sortiert
+        self._channels = []
+
+    def discover(self):
+        """ Sucht auf allen Kanälen nach bekannten Sensoren. """
+        if self.config:
+            try:
+                with open(self.config) as f:
+                    self.known = json.load(f)
+            except (OSError, ValueError):
+                self.known = []
+        self.bus.find_muxes()
+        # Geräte direkt am Bus tauchen auf jedem Kanal auf und werden übersprungen
+        root = set(self.bus.disable())
+        found = []
+        for channel in self.bus.channels:
+            with self.bus.on(channel) as i2c:
+                for address in i2c.scan():
+                    if address in root:
+                        continue
+                    sensor = self._create(i2c, channel, address)
+                    if sensor is not None:
+                        found.append(sensor)
+        # Bekannte Sensoren behalten ihren Platz, neue kommen hinten dran
+        order = {sensor_id: n for n, sensor_id in enumerate(self.known)}
+        found.sort(key=lambda s: (order.get(s.id, len(order)), s.channel, s.address))
+        for sensor in found:
+            if sensor.id not in order:
+                self.known.append(sensor.id)
+                print('Neuer Sensor:', sensor.id)
+        present = set(s.id for s in found)
+        for sensor_id in self.known:
+            if sensor_id not in present:
+                print('Sensor fehlt:', sensor_id)
+        self.sensors = found
+        self._group()
+        if self.config:
+            with open(self.config, "w") as f:
+                json.dump(self.known, f)
+        self.restore_baselines()
+        return found
+
+    def _create(self, i2c, channel, address):
+        for sensor_type in SENSOR_TYPES:
+            if address not in sensor_type.addresses:
+                continue
+            try:
+                if sensor_type.probe(i2c, address):
+                    return sensor_type(i2c, channel, address)
+            except (OSError, ValueError) as e:
+                print('Fehler bei {:02x} auf Kanal {}: {}'.format(address, channel, e))
+        return None
+
+    def _group(self):
+        channels = []
+        for sensor in sorted(self.sensors, key=lambda s: s.channel):
+            if channels and channels[-1][0] == sensor.channel:
+                channels[-1][1].append(sensor)
+            else:
+                channels.append((sensor.channel, [sensor]))
+        self._channels = channels
+
+    def primary(self, kind):
+        """ Der erste Sensor des Typs in der gespeicherten Reihenfolge;
+            er liefert die Werte für den Ringspeicher. """
+        for sensor in self.sensors:
+            if sensor.kind == kind:
+                return sensor
+        return None
+
+    # start/collect laufen im Scheduler; der Bus ist nur für die
+    # Transaktionen reserviert, nicht während der Wandlung
+    def _groups(self, kinds):
+        for channel, sensors in self._channels:
+            group = [sensor for sensor in sensors if sensor.kind in kinds]
+            if group:
+                yield channel, group
+
+    def start(self, *kinds):
+        """ Stößt bei allen Sensoren der Typen eine Messung an und gibt die
+            längste Wandlungszeit in ms zurück. """
+        wait = 0
+        for channel, sensors in self._groups(kinds):
+            with self.bus.on(channel):
+                for sensor in sensors:
+                    try:
+                        ms = sensor.start()
+                    except OSError as e:
+                        print('Fehler bei {}: {}'.format(sensor.id, e))
+                        continue
+                    if ms > wait:
+                        wait = ms
+        return wait
+
+    def collect(self, *kinds):
+        for channel, sensors in self._groups(kinds):
+            with self.bus.on(channel):
+                for sensor in sensors:
+                    try:
+                        sensor.collect()
+                    except OSError as e:
+                        print('Fehler bei {}: {}'.format(sensor.id, e))
+                        sensor.values = None
+
+    def update_environment(self):
+        """ Gibt Temperatur und Luftfeuchte des ersten BME280 an alle
+            CCS811 weiter. """
+        bme = self.primary("bme280")
+        if bme is None or bme.values is None:
+            return
+        temperature, _, humidity = bme.values
+        for channel, sensors in self._groups(("ccs811",)):
+            with self.bus.on(channel):
+                for sensor in sensors:
+                    try:
+                        sensor.set_environment(temperature, humidity)
+                    except OSError as e:
+                        print('Fehler bei {}: {}'.format(sensor.id, e))
+
+    def restore_baselines(self):
+        if not self.baselines:
+            return
+        try:
+            with open(self.baselines) as f:
+                self._saved = json.load(f)
+        except (OSError, ValueError):
+            self._saved = {}
+        for channel, sensors in self._groups(("ccs811",)):
+            with self.bus.on(channel):
+                for sensor in sensors:
+                    baseline = self._saved.get(sensor.id)
+                    if baseline is None:
+                        continue
+                    try:
+                        sensor.restore_baseline(baseline)
+                        print('Baseline für {} wiederhergestellt: {:04x}'.format(sensor.id, baseline))
+                    except OSError as e:
+                        print('Fehler bei {}: {}'.format(sensor.id, e))
+
+    def save_baselines(self):
+        """ Sichert die Baselines aller eingelernten CCS811; geschrieben
+            wird nur, wenn sich eine geändert hat. """
+        if not self.baselines:
+            return
+        changed = False
+        for channel, sensors in self._groups(("ccs811",)):
+            with self.bus.on(channel):
+                for sensor in sensors:
+                    try:
+                        baseline = sensor.baseline()
+                    except OSError as e:
+                        print('Fehler bei {}: {}'.format(sensor.id, e))
+                        continue
+                    if baseline is not None and self._saved.get(sensor.id) != baseline:
+                        self._saved[sensor.id] = baseline
+                        changed = True
+        if changed:
+            with open(self.baselines, "w") as f:
+                json.dump(self._saved, f)
+
+    def info(self):
+        return [sensor.info() for sensor in self.sensors]
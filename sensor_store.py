@@ -0,0 +1,371 @@
+# Binärer Ringspeicher für Sensordaten
+#
+# Die Datei wird einmal in voller Größe angelegt und danach nur noch
+# überschrieben. Jeder Datensatz hat eine feste Größe, die Schreibposition
+# ergibt sich aus dem Zähler "head" im Dateikopf (Anzahl aller jemals
+# geschriebenen Datensätze). Neue Werte werden im RAM gesammelt und alle
+# "batch" Datensätze in einem Rutsch geschrieben.
+#
+# Daneben liegt ein dünn besetzter Zeitindex (TimeIndex), über den
+# Zeitbereiche gelesen werden können, ohne die ganze Datei zu durchsuchen.
+
+import os
+import struct
+import time
+from array import array
+
+from timebase import LOCAL
+
+MAGIC = b"GBX1"
+VERSION = 1
+
+# magic, version, record_size, capacity, head
+HEADER_FORMAT = "<4sHHII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Zeit (Unix-Sekunden, UTC), Temperatur, Luftdruck, Luftfeuchtigkeit,
+# CO2, TVOC, Lichtstärke
+RECORD_FORMAT = "<IfffHHf"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+FIELDS = ("bme280_temp", "bme280_pressure", "bme280_humidity",
+          "ccs811_co2", "ccs811_tvoc", "bh1750_lux")
+
+# MicroPython auf dem ESP32 zählt ab 2000-01-01, gespeichert wird Unix-Zeit
+EPOCH_OFFSET = 946684800 if time.gmtime(0)[0] == 2000 else 0
+
+
+def unix_time():
+    return int(time.time()) + EPOCH_OFFSET
+
+
+# Ohne Zeit-Synchronisation beginnt die Uhr des ESP32 beim Einschalten im
+# Jahr 2000; alles vor 2024 gilt als nicht gestellt
+VALID_FROM = 1704067200
+
+
+def time_valid(timestamp):
+    return timestamp >= VALID_FROM
+
+
+# Sequenznummer, Zeit; das oberste Bit der Sequenznummer markiert den
+# Beginn eines neuen Segments (Zeit ist gegenüber dem Vorgänger zurückgesprungen)
+INDEX_FORMAT = "<II"
+INDEX_SIZE = struct.calcsize(INDEX_FORMAT)
+SEGMENT_START = 0x80000000
+SEQ_MASK = 0x7FFFFFFF
+
+
+def format_time(timestamp):
+    """ Ortszeit (MEZ/MESZ) für die Anzeige; Zeiten vor der
+        Zeit-Synchronisation sind Sekunden seit dem Start und werden so
+        ausgegeben. """
+    if not time_valid(timestamp):
+        return "Laufzeit {} s".format(timestamp)
+    year, month, day, hour, minute, second = time.gmtime(LOCAL.local(timestamp) - EPOCH_OFFSET)[:6]
+    return "{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}".format(year, month, day, hour, minute, second)
+
+
+def _clamp_u16(value):
+    value = int(value)
+    return 0 if value < 0 else 65535 if value > 65535 else value
+
+
+class TimeIndex:
+    """ Ein Eintrag pro "every" Datensätze und zusätzlich an jeder Stelle, an
+        der die Zeit zurückspringt (z.B. Neustart vor der NTP-Synchronisation).
+        Innerhalb eines Segments steigt die Zeit monoton, dort wird binär
+        gesucht. """
+
+    def __init__(self, filename, every=256):
+        self.filename = filename
+        self.every = every
+        # abwechselnd Sequenznummer (mit Segment-Bit) und Zeit
+        self.entries = array("I")
+        self.last_time = None
+        self._stale = 0
+
+    def __len__(self):
+        return len(self.entries) // 2
+
+    def load(self, head):
+        self.entries = array("I")
+        buf = bytearray(INDEX_SIZE)
+        try:
+            with open(self.filename, "rb") as f:
+                while f.readinto(buf) == INDEX_SIZE:
+                    seq, timestamp = struct.unpack(INDEX_FORMAT, buf)
+                    # Einträge für Datensätze, die nie geschrieben wurden, verwerfen
+                    if seq & SEQ_MASK < head:
+                        self.entries.append(seq)
+                        self.entries.append(timestamp)
+        except OSError:
+            return False
+        return len(self.entries) > 0
+
+    def rebuild(self, store):
+        self.entries = array("I")
+        self.last_time = None
+        for seq, record in store.records():
+            self.add(seq, record[0], persist=False)
+        self._rewrite()
+
+    def add(self, seq, timestamp, persist=True):
+        jumped = self.last_time is not None and timestamp < self.last_time
+        self.last_time = timestamp
+        if not (jumped or seq % self.every == 0 or not self.entries):
+            return
+        if jumped:
+            seq |= SEGMENT_START
+        self.entries.append(seq)
+        self.entries.append(timestamp)
+        if persist:
+            with open(self.filename, "ab") as f:
+                f.write(struct.pack(INDEX_FORMAT, seq, timestamp))
+
+    def reindex(self, store, first, last_time):
+        """ Einträge ab Sequenznummer first neu aufbauen, nachdem sich dort
+            die Zeiten geändert haben; last_time: Zeit des Datensatzes davor. """
+        entries = self.entries
+        n = len(entries) // 2
+        while n and entries[2 * n - 2] & SEQ_MASK >= first:
+            n -= 1
+        self.entries = entries[:2 * n]
+        self.last_time = last_time
+        for seq, record in store.records(first):
+            self.add(seq, record[0], persist=False)
+        self._rewrite()
+
+    def drop_before(self, oldest):
+        # Einträge für überschriebene Datensätze entfernen; der erste
+        # verbleibende Eintrag deckt "oldest" noch ab
+        entries = self.entries
+        n = len(entries) // 2
+        k = 0
+        while k + 1 < n and entries[2 * k + 2] & SEQ_MASK <= oldest:
+            k += 1
+        if not k:
+            return
+        self.entries = entries[2 * k:]
+        self._stale += k
+        if self._stale > len(self):
+            self._rewrite()
+
+    def _rewrite(self):
+        with open(self.filename, "wb") as f:
+            f.write(self.entries)
+        self._stale = 0
+
+    def ranges(self, start, stop, head):
+        """ Liefert (erste, letzte + 1) Sequenznummer für alle Abschnitte,
+            die Datensätze zwischen start und stop enthalten können. """
+        entries = self.entries
+        n = len(entries) // 2
+        a = 0
+        while a < n:
+            b = a + 1
+            while b < n and not entries[2 * b] & SEGMENT_START:
+                b += 1
+            # letzter Eintrag mit Zeit <= start
+            lo, hi = a, b
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if entries[2 * mid + 1] <= start:
+                    lo = mid
+                else:
+                    hi = mid
+            # erster Eintrag mit Zeit > stop
+            first, last = lo, b
+            while first < last:
+                mid = (first + last) // 2
+                if entries[2 * mid + 1] > stop:
+                    last = mid
+                else:
+                    first = mid + 1
+            if first > a:
+                end = entries[2 * first] & SEQ_MASK if first < n else head
+                yield entries[2 * lo] & SEQ_MASK, end
+            a = b
+
+
+class RingStore:
+    def __init__(self, filename, capacity=25920, batch=6, index_every=256):
+        self.filename = filename
+        self.batch = batch
+        self._pending = bytearray(batch * RECORD_SIZE)
+        self._pending_count = 0
+        self._header = bytearray(HEADER_SIZE)
+        self.index = TimeIndex(filename + ".idx", index_every)
+
+        try:
+            self._file = open(filename, "r+b")
+        except OSError:
+            self._file = None
+        if self._file is not None and self._load_header():
+            self._load_index()
+            return
+        if self._file is not None:
+            self._file.close()
+        self.capacity = capacity
+        self.head = 0
+        self._create()
+
+    def _load_index(self):
+        if self.head == 0:
+            return
+        if self.index.load(self.head):
+            self.index.drop_before(self.oldest)
+        else:
+            print("Zeitindex fehlt, wird neu aufgebaut...")
+            self.index.rebuild(self)
+        for _, record in self.records(self.head - 1):
+            self.index.last_time = record[0]
+
+    def _load_header(self):
+        self._file.seek(0)
+        if self._file.readinto(self._header) != HEADER_SIZE:
+            return False
+        magic, version, record_size, capacity, head = struct.unpack(HEADER_FORMAT, self._header)
+        if magic != MAGIC or version != VERSION or record_size != RECORD_SIZE:
+            print("Unbekanntes Format in", self.filename, "- Datei wird neu angelegt")
+            return False
+        self.capacity = capacity
+        self.head = head
+        return True
+
+    def _create(self):
+        # Datei vorab in voller Größe anlegen, damit der Flash nicht volläuft
+        try:
+            os.remove(self.index.filename)
+        except OSError:
+            pass
+        self._file = open(self.filename, "w+b")
+        self._write_header()
+        zeros = bytes(512)
+        remaining = self.capacity * RECORD_SIZE
+        while remaining > 0:
+            n = remaining if remaining < 512 else 512
+            self._file.write(zeros if n == 512 else zeros[:n])
+            remaining -= n
+        self._file.flush()
+
+    def _write_header(self):
+        struct.pack_into(HEADER_FORMAT, self._header, 0, MAGIC, VERSION,
+                         RECORD_SIZE, self.capacity, self.head)
+        self._file.seek(0)
+        self._file.write(self._header)
+
+    def append(self, timestamp, temp, pressure, humidity, co2, tvoc, lux):
+        self.index.add(self.head + self._pending_count, timestamp)
+        struct.pack_into(RECORD_FORMAT, self._pending,
+                         self._pending_count * RECORD_SIZE, timestamp,
+                         temp, pressure, humidity,
+                         _clamp_u16(co2), _clamp_u16(tvoc), lux)
+        self._pending_count += 1
+        if self._pending_count >= self.batch:
+            self.flush()
+
+    def flush(self):
+        count = self._pending_count
+        if not count:
+            return
+        pending = memoryview(self._pending)
+        written = 0
+        while written < count:
+            slot = (self.head + written) % self.capacity
+            n = min(count - written, self.capacity - slot)
+            self._file.seek(HEADER_SIZE + slot * RECORD_SIZE)
+            self._file.write(pending[written * RECORD_SIZE:(written + n) * RECORD_SIZE])
+            written += n
+        self.head += count
+        self._pending_count = 0
+        self._write_header()
+        self._file.flush()
+        if self.head > self.capacity:
+            self.index.drop_before(self.oldest)
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    @property
+    def oldest(self):
+        # Sequenznummer des ältesten noch vorhandenen Datensatzes
+        return self.head - self.capacity if self.head > self.capacity else 0
+
+    def __len__(self):
+        return self.head - self.oldest
+
+    def fix_times(self, first, offset, valid_from=VALID_FROM):
+        """ Addiert offset zur Zeit der Datensätze ab Sequenznummer first,
+            die vor der Zeit-Synchronisation mit der Laufzeit gespeichert
+            wurden (Zeit vor valid_from); gibt deren Anzahl zurück. """
+        self.flush()
+        first = first if first > self.oldest else self.oldest
+        last_time = None
+        if first > self.oldest:
+            for _, record in self.records(first - 1, first):
+                last_time = record[0]
+        fixed = 0
+        buf = bytearray(4)
+        for seq, record in self.records(first):
+            if record[0] >= valid_from:
+                continue
+            struct.pack_into("<I", buf, 0, record[0] + offset)
+            self._file.seek(HEADER_SIZE + (seq % self.capacity) * RECORD_SIZE)
+            self._file.write(buf)
+            fixed += 1
+        if fixed:
+            self._file.flush()
+            self.index.reindex(self, first, last_time)
+        return fixed
+
+    def first_time(self):
+        """ Zeit des ältesten Datensatzes, None wenn leer. """
+        for _, record in self.records(self.oldest, self.oldest + 1):
+            return record[0]
+        return None
+
+    def first_valid_time(self, valid_from=VALID_FROM):
+        """ Zeit des ältesten Datensatzes ab valid_from, None wenn keiner.
+            Übrig gebliebene Laufzeit-Zeiten aus Starts ohne
+            Zeit-Synchronisation werden übersprungen; gelesen wird nur ab
+            dem Indexeintrag vor dem ersten gültigen. """
+        entries = self.index.entries
+        n = len(entries) // 2
+        k = 0
+        while k < n and entries[2 * k + 1] < valid_from:
+            k += 1
+        first = entries[2 * k - 2] & SEQ_MASK if k else self.oldest
+        for _, record in self.records(first):
+            if record[0] >= valid_from:
+                return record[0]
+        return None
+
+    def records(self, start=None, stop=None, buf_records=16):
+        """ Liefert (Sequenznummer, Datensatz) für [start, stop) aus einer
+            eigenen Dateiinstanz, damit der Schreiber nicht gestört wird. """
+        head = self.head
+        oldest = self.oldest
+        start = oldest if start is None or start < oldest else start
+        stop = head if stop is None or stop > head else stop
+        buf = bytearray(buf_records * RECORD_SIZE)
+        view = memoryview(buf)
+        with open(self.filename, "rb") as f:
+            seq = start
+            while seq < stop:
+                slot = seq % self.capacity
+                n = min(stop - seq, self.capacity - slot, buf_records)
+                f.seek(HEADER_SIZE + slot * RECORD_SIZE)
+                f.readinto(view[:n * RECORD_SIZE])
+                for i in range(n):
+                    yield seq + i, struct.unpack_from(RECORD_FORMAT, buf, i * RECORD_SIZE)
+                seq += n
+
+    def range(self, start, stop):
+        """ Liefert (Sequenznummer, Datensatz) aller Datensätze mit
+            start <= Zeit <= stop, in der Reihenfolge der Datei. """
+        for first, last in self.index.ranges(start, stop, self.head):
+            for seq, record in self.records(first, last):
+                if start <= record[0] <= stop:
+                    yield seq, record
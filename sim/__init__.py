@@ -0,0 +1,69 @@
+# Simulation der Growbox-Hardware unter CPython
+#
+# install() ergänzt CPython um die MicroPython-Funktionen, die die Module
+# auf dem Gerät benutzen (time.ticks_ms, asyncio.sleep_ms, utime, ...) und
+# meldet Ersatzmodule für machine, network, ntptime und urequests an, damit
+# main.py, ota/ota.py und die Treiber unverändert auf dem PC laufen.
+#
+#  - sim/i2c.py: I2C-Bus mit TCA9548A, BME280, CCS811 und BH1750 auf
+#    Registerebene, Buszeiten wie bei 100 kHz
+#  - sim/clock.py: simulierte Uhr für reproduzierbare Läufe
+#  - sim/network.py, sim/ntptime.py: WLAN und Zeitabgleich
+#  - sim/urequests.py, sim/ota_server.py: HTTP und lokaler OTA-Server
+#  - sim/replay.py: spielt sensor_data.csv über die Sensormodelle ab
+
+import asyncio
+import sys
+import time
+
+_installed = False
+
+
+def _ticks_ms():
+    return int(time.monotonic() * 1000)
+
+
+def _ticks_us():
+    return int(time.monotonic() * 1000000)
+
+
+def _ticks_add(ticks, delta):
+    return ticks + delta
+
+
+def _ticks_diff(end, start):
+    return end - start
+
+
+def _sleep_ms(ms):
+    time.sleep(ms / 1000)
+
+
+def _sleep_us(us):
+    time.sleep(us / 1000000)
+
+
+async def _async_sleep_ms(ms):
+    await asyncio.sleep(ms / 1000)
+
+
+def install():
+    """ Einmal vor dem Import der Gerätemodule aufrufen. """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    time.ticks_ms = _ticks_ms
+    time.ticks_us = _ticks_us
+    time.ticks_add = _ticks_add
+    time.ticks_diff = _ticks_diff
+    time.sleep_ms = _sleep_ms
+    time.sleep_us = _sleep_us
+    asyncio.sleep_ms = _async_sleep_ms
+    from sim import machine, network, ntptime, urequests, ustruct, utime
+    sys.modules.setdefault("utime", utime)
+    sys.modules.setdefault("ustruct", ustruct)
+    sys.modules.setdefault("machine", machine)
+    sys.modules.setdefault("network", network)
+    sys.modules.setdefault("ntptime", ntptime)
+    sys.modules.setdefault("urequests", urequests)
@@ -0,0 +1,65 @@
+# Simulierte Uhr
+#
+# FakeClock ersetzt die MicroPython-Zeitfunktionen (ticks_ms, sleep_ms, ...)
+# durch eine Uhr, die nur beim Schlafen oder über advance() weiterläuft.
+# Damit laufen Stunden Sensorbetrieb in Sekunden und jeder Durchlauf
+# liefert dieselben Zahlen. Als clock= an SimBus übergeben, sehen auch die
+# simulierten Sensoren diese Zeit.
+#
+#   clock = FakeClock()
+#   clock.install()
+#   bus = SimBus(realtime=False, clock=clock)
+
+import time
+
+
+class FakeClock:
+    def __init__(self, start=0.0):
+        # Sekunden seit dem Start der Simulation
+        self.now = start
+        self.sleeps = 0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def ticks_ms(self):
+        return int(self.now * 1000)
+
+    def ticks_us(self):
+        return int(self.now * 1000000)
+
+    def sleep(self, seconds):
+        self.sleeps += 1
+        self.now += seconds
+
+    def sleep_ms(self, ms):
+        self.sleep(ms / 1000)
+
+    def sleep_us(self, us):
+        self.sleep(us / 1000000)
+
+    def install(self):
+        """ Leitet ticks_ms/ticks_us/sleep/sleep_ms/sleep_us des time-Moduls
+            (und damit utime) auf diese Uhr um; sim.install() muss vorher
+            gelaufen sein. uninstall() stellt die echte Zeit wieder her. """
+        self._saved = {name: getattr(time, name)
+                       for name in ("ticks_ms", "ticks_us", "sleep", "sleep_ms", "sleep_us")}
+        time.ticks_ms = self.ticks_ms
+        time.ticks_us = self.ticks_us
+        time.sleep = self.sleep
+        time.sleep_ms = self.sleep_ms
+        time.sleep_us = self.sleep_us
+        return self
+
+    def uninstall(self):
+        for name, func in self._saved.items():
+            setattr(time, name, func)
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc):
+        self.uninstall()
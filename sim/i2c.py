@@ -0,0 +1,505 @@
+# Simulierter I2C-Bus mit Multiplexer und Sensoren
+#
+# SimBus hat dieselben Methoden wie machine.I2C. Jede Transaktion kostet die
+# Zeit, die sie bei 100 kHz auf dem Draht bräuchte (9 Takte pro Byte plus
+# Start/Stop und etwas Software-Overhead); mit realtime=True wird diese Zeit
+# tatsächlich gewartet, sonst nur gezählt. Die Sensoren bilden ihre Register
+# und Wandlungszeiten so weit nach, wie die Treiber in libraries/ sie nutzen.
+
+import errno
+import math
+import struct
+import time
+
+BUS_HZ = 100000
+OVERHEAD_US = 50
+
+
+class SimBus:
+    def __init__(self, freq=BUS_HZ, realtime=True, clock=time.monotonic):
+        self.freq = freq
+        self.realtime = realtime
+        self.clock = clock
+        # Geräte direkt am Bus, darunter die Multiplexer
+        self.devices = {}
+        self.transactions = 0
+        self.bytes = 0
+        self.busy_us = 0
+
+    def attach(self, device, channel=None, mux=0x70):
+        """ Hängt ein Gerät direkt an den Bus oder an einen Kanal des
+            Multiplexers mit Adresse mux. """
+        device.bus = self
+        if channel is None:
+            self.devices[device.address] = device
+        else:
+            self.devices[mux].channels[channel][device.address] = device
+        return device
+
+    def reset_stats(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.busy_us = 0
+
+    def _transfer(self, nbytes):
+        # Adressbyte(s) und Daten mit je 9 Takten, dazu Start und Stop
+        us = OVERHEAD_US + (nbytes * 9 + 2) * 1000000 // self.freq
+        self.transactions += 1
+        self.bytes += nbytes
+        self.busy_us += us
+        if self.realtime:
+            time.sleep(us / 1000000)
+
+    def _find(self, addr):
+        device = self.devices.get(addr)
+        if device is not None:
+            return device
+        for mux in self.devices.values():
+            for channel in mux.enabled():
+                device = channel.get(addr)
+                if device is not None:
+                    return device
+        raise OSError(errno.ENODEV)
+
+    def scan(self):
+        found = set(self.devices)
+        for mux in self.devices.values():
+            for channel in mux.enabled():
+                found.update(channel)
+        self._transfer(len(found) or 1)
+        return sorted(found)
+
+    def writeto(self, addr, buf, stop=True):
+        self._transfer(1 + len(buf))
+        self._find(addr).write(bytes(buf))
+        return len(buf)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        self._transfer(1 + nbytes)
+        return self._find(addr).read(nbytes)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self.readfrom(addr, len(buf))
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        self._transfer(2 + len(buf))
+        self._find(addr).write(bytes([memaddr]) + bytes(buf))
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        # Register setzen, wiederholter Start, lesen
+        self._transfer(3 + nbytes)
+        device = self._find(addr)
+        device.write(bytes([memaddr]))
+        return device.read(nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        buf[:] = self.readfrom_mem(addr, memaddr, len(buf))
+
+
+class Device:
+    """ Gerät mit Registerzeiger: das erste geschriebene Byte wählt das
+        Register, weitere Bytes werden ab dort geschrieben, Lesen beginnt
+        ebenfalls beim Zeiger. """
+
+    address = 0
+
+    def __init__(self):
+        self.bus = None
+        self.regs = bytearray(256)
+        self.pointer = 0
+
+    def now(self):
+        return self.bus.clock()
+
+    def enabled(self):
+        # nur Multiplexer haben Ausgänge
+        return ()
+
+    def write(self, data):
+        if not data:
+            return
+        self.pointer = data[0]
+        self.write_regs(self.pointer, data[1:])
+
+    def read(self, nbytes):
+        return self.read_regs(self.pointer, nbytes)
+
+    def write_regs(self, reg, data):
+        self.regs[reg:reg + len(data)] = data
+
+    def read_regs(self, reg, nbytes):
+        return bytes(self.regs[reg:reg + nbytes])
+
+
+class TCA9548A(Device):
+    def __init__(self, address=0x70):
+        super().__init__()
+        self.address = address
+        self.mask = 0
+        self.channels = [{} for _ in range(8)]
+        self.selects = 0
+
+    def enabled(self):
+        for channel in range(8):
+            if self.mask & (1 << channel):
+                yield self.channels[channel]
+
+    def write(self, data):
+        # Steuerregister ohne Registerzeiger
+        if data:
+            self.mask = data[-1]
+            self.selects += 1
+
+    def read(self, nbytes):
+        return bytes([self.mask]) * nbytes
+
+
+def _oversampling(osrs):
+    return 0 if osrs == 0 else 1 << (min(osrs, 5) - 1)
+
+
+class BME280(Device):
+    # Beispielwerte aus dem Bosch-Datenblatt (Kapitel 8.1)
+    CALIB = (27504, 26435, -1000, 36477, -10685, 3024, 2855, 140, -7,
+             15500, -14600, 6000)
+    # H1..H6
+    CALIB_H = (75, 362, 0, 324, 0, 30)
+    # Standby-Zeiten im Normal-Modus in ms (Register 0xF5, Bits 7..5)
+    STANDBY_MS = (0.5, 62.5, 125, 250, 500, 1000, 10, 20)
+
+    def __init__(self, address=0x76, raw=(519888, 415148, 30000)):
+        super().__init__()
+        self.address = address
+        # Rohwerte, die der Sensor bei der nächsten Wandlung liefert
+        self.raw = list(raw)
+        self.conversions = 0
+        self._ready_at = None
+        self._next_cycle = None
+        self._filtered = None
+        self.regs[0xD0] = 0x60
+        struct.pack_into("<HhhHhhhhhhhh", self.regs, 0x88, *self.CALIB)
+        h1, h2, h3, h4, h5, h6 = self.CALIB_H
+        self.regs[0xA1] = h1
+        struct.pack_into("<hB", self.regs, 0xE1, h2, h3)
+        self.regs[0xE4] = (h4 >> 4) & 0xFF
+        self.regs[0xE5] = (h4 & 0x0F) | ((h5 & 0x0F) << 4)
+        self.regs[0xE6] = (h5 >> 4) & 0xFF
+        self.regs[0xE7] = h6 & 0xFF
+
+    def _calibration(self):
+        t1, t2, t3, p1, p2, p3, p4, p5, p6, p7, p8, p9 = struct.unpack_from(
+            "<HhhHhhhhhhhh", self.regs, 0x88)
+        h1 = self.regs[0xA1]
+        h2, h3 = struct.unpack_from("<hB", self.regs, 0xE1)
+        e4, e5, e6 = self.regs[0xE4], self.regs[0xE5], self.regs[0xE6]
+        h4 = ((e4 if e4 < 128 else e4 - 256) << 4) | (e5 & 0x0F)
+        h5 = ((e6 if e6 < 128 else e6 - 256) << 4) | (e5 >> 4)
+        h6 = struct.unpack_from("<b", self.regs, 0xE7)[0]
+        return (t1, t2, t3, p1, p2, p3, p4, p5, p6, p7, p8, p9, h1, h2, h3, h4, h5, h6)
+
+    def compensate(self, raw_t, raw_p, raw_h):
+        """ Integer-Kompensation aus dem Datenblatt (Kapitel 4.2.3, 8.2),
+            wie sie der Treiber rechnet: (°C * 100, Pa * 256, % * 1024). """
+        t1, t2, t3, p1, p2, p3, p4, p5, p6, p7, p8, p9, h1, h2, h3, h4, h5, h6 = self._calibration()
+        var1 = ((raw_t >> 3) - (t1 << 1)) * (t2 >> 11)
+        var2 = (((((raw_t >> 4) - t1) * ((raw_t >> 4) - t1)) >> 12) * t3) >> 14
+        t_fine = var1 + var2
+        temp = (t_fine * 5 + 128) >> 8
+
+        var1 = t_fine - 128000
+        var2 = var1 * var1 * p6 + ((var1 * p5) << 17) + (p4 << 35)
+        var1 = (((var1 * var1 * p3) >> 8) + ((var1 * p2) << 12))
+        var1 = (((1 << 47) + var1) * p1) >> 33
+        if var1 == 0:
+            pressure = 0
+        else:
+            p = (((1048576 - raw_p) << 31) - var2) * 3125 // var1
+            var1 = (p9 * (p >> 13) * (p >> 13)) >> 25
+            var2 = (p8 * p) >> 19
+            pressure = ((p + var1 + var2) >> 8) + (p7 << 4)
+
+        h = t_fine - 76800
+        h = (((((raw_h << 14) - (h4 << 20) - (h5 * h)) + 16384) >> 15) *
+             (((((((h * h6) >> 10) * (((h * h3) >> 11) + 32768)) >> 10) +
+                2097152) * h2 + 8192) >> 14))
+        h = h - (((((h >> 15) * (h >> 15)) >> 7) * h1) >> 4)
+        h = min(max(h, 0), 419430400)
+        return temp, pressure, h >> 12
+
+    def set_values(self, temp, pressure, humidity):
+        """ Sucht die Rohwerte, für die der Treiber temp (°C), pressure
+            (hPa) und humidity (%) liefert; ab der nächsten Wandlung. """
+        def search(index, target, increasing):
+            raw = list(self.raw)
+            lo, hi = 0, (1 << 20) - 1 if index < 2 else 0xFFFF
+            while lo < hi:
+                raw[index] = (lo + hi) // 2
+                value = self.compensate(*raw)[index]
+                if (value < target) == increasing:
+                    lo = raw[index] + 1
+                else:
+                    hi = raw[index]
+            self.raw[index] = lo
+
+        # Temperatur zuerst, Druck und Feuchte hängen von ihr ab
+        search(0, round(temp * 100), True)
+        search(1, round(pressure * 25600), False)
+        search(2, round(humidity * 1024), True)
+
+    def measurement_ms(self):
+        # typische Wandlungszeit laut Datenblatt (Kapitel 9.1)
+        ctrl = self.regs[0xF4]
+        t = _oversampling(ctrl >> 5)
+        p = _oversampling((ctrl >> 2) & 7)
+        h = _oversampling(self.regs[0xF2] & 7)
+        ms = 1.0 + 2.0 * t
+        if p:
+            ms += 2.0 * p + 0.5
+        if h:
+            ms += 2.0 * h + 0.5
+        return ms
+
+    def write_regs(self, reg, data):
+        super().write_regs(reg, data)
+        if reg <= 0xF4 < reg + len(data):
+            mode = self.regs[0xF4] & 3
+            now = self.now()
+            if mode in (1, 2):
+                self._ready_at = now + self.measurement_ms() / 1000
+                self._next_cycle = None
+            elif mode == 3:
+                self._ready_at = None
+                self._next_cycle = now + self.measurement_ms() / 1000
+            else:
+                self._ready_at = None
+                self._next_cycle = None
+
+    def _latch(self):
+        t, p, h = self.raw
+        # IIR-Filter für Temperatur und Luftdruck (Register 0xF5, Bits 4..2)
+        coefficient = (1, 2, 4, 8, 16, 16, 16, 16)[(self.regs[0xF5] >> 2) & 7]
+        if coefficient > 1 and self._filtered is not None:
+            ft, fp = self._filtered
+            t = (ft * (coefficient - 1) + t) // coefficient
+            p = (fp * (coefficient - 1) + p) // coefficient
+        self._filtered = (t, p)
+        self.regs[0xF7:0xFA] = ((p & 0xFFFFF) << 4).to_bytes(3, "big")
+        self.regs[0xFA:0xFD] = ((t & 0xFFFFF) << 4).to_bytes(3, "big")
+        self.regs[0xFD:0xFF] = (h & 0xFFFF).to_bytes(2, "big")
+        self.conversions += 1
+
+    def _update(self):
+        now = self.now()
+        if self._ready_at is not None and now >= self._ready_at:
+            # Forced-Modus: nach der Wandlung zurück in den Sleep-Modus
+            self._ready_at = None
+            self.regs[0xF4] &= 0xFC
+            self._latch()
+        if self._next_cycle is not None and now >= self._next_cycle:
+            self._latch()
+            standby = self.STANDBY_MS[self.regs[0xF5] >> 5]
+            period = (self.measurement_ms() + standby) / 1000
+            while self._next_cycle <= now:
+                self._next_cycle += period
+        measuring = self._ready_at is not None
+        self.regs[0xF3] = (self.regs[0xF3] & ~0x08) | (0x08 if measuring else 0)
+
+    def read_regs(self, reg, nbytes):
+        self._update()
+        return super().read_regs(reg, nbytes)
+
+
+class CCS811(Device):
+    """ Modell des Messalgorithmus, soweit es für Aufwärmen, Baseline und
+        Umgebungskompensation nötig ist:
+         - die ersten WARMUP_S Sekunden nach dem Setzen des Modus liefert der
+           Sensor 400 ppm / 0 ppb,
+         - nach dem Einschalten liegt die Baseline um baseline_offset neben
+           dem eingelernten Wert baseline und nähert sich ihm mit der
+           Zeitkonstante BASELINE_TAU_S; jede Einheit Abweichung verfälscht
+           eCO2 um PPM_PER_COUNT. Ein Schreiben von 0x11 setzt sie sofort,
+         - ohne passende ENV_DATA rechnet der Sensor mit 25 °C und 50 %,
+           jede Abweichung von ambient verfälscht eCO2 um ENV_PPM. """
+
+    HW_ID = 0x81
+    # Messintervall je Drive-Mode in s
+    INTERVALS = {1: 1.0, 2: 10.0, 3: 60.0, 4: 0.25}
+    WARMUP_S = 15
+    BASELINE_TAU_S = 600
+    PPM_PER_COUNT = 0.5
+    # ppm pro °C und pro %
+    ENV_PPM = (3.0, 4.0)
+
+    def __init__(self, address=0x5A, eco2=412, tvoc=3, baseline=0x8A3C,
+                 baseline_offset=0, ambient=(25.0, 50.0)):
+        super().__init__()
+        self.address = address
+        self.eco2 = eco2
+        self.tvoc = tvoc
+        self.regs[0x20] = self.HW_ID
+        self.app_running = False
+        self._started = None
+        self._read_sample = 0
+        self.env = None
+        # eingelernte Baseline und Raumklima, das der Sensor wirklich sieht
+        self.learned = baseline
+        self.ambient = ambient
+        self._baseline = baseline - baseline_offset
+        self._baseline_at = None
+        self.baseline_writes = 0
+
+    def _samples(self):
+        drive = (self.regs[0x01] >> 4) & 7
+        if not self.app_running or self._started is None or drive not in self.INTERVALS:
+            return 0
+        return int((self.now() - self._started) / self.INTERVALS[drive])
+
+    def baseline(self):
+        if self._baseline_at is None:
+            return self._baseline
+        t = self.now() - self._baseline_at
+        return int(self.learned + (self._baseline - self.learned) *
+                   math.exp(-t / self.BASELINE_TAU_S))
+
+    def reading(self):
+        """ (eCO2, TVOC), wie der Algorithmus sie gerade ausgibt. """
+        if self._started is None or self.now() - self._started < self.WARMUP_S:
+            return 400, 0
+        error = abs(self.learned - self.baseline()) * self.PPM_PER_COUNT
+        temp, humidity = 25.0, 50.0
+        if self.env is not None:
+            h, t = struct.unpack(">HH", self.env)
+            temp, humidity = t / 512 - 25, h / 512
+        error += (abs(self.ambient[0] - temp) * self.ENV_PPM[0] +
+                  abs(self.ambient[1] - humidity) * self.ENV_PPM[1])
+        return max(400, int(self.eco2 + error)), int(self.tvoc + error / 10)
+
+    def nint(self):
+        """ Pin-Ersatz für den nINT-Ausgang: 0, solange Daten bereitliegen. """
+        device = self
+
+        class NInt:
+            def value(self, value=None):
+                return 0 if device._samples() > device._read_sample else 1
+
+        return NInt()
+
+    def write(self, data):
+        if data and data[0] == 0xF4 and len(data) == 1:
+            # APP_START
+            self.app_running = True
+            return
+        super().write(data)
+
+    def write_regs(self, reg, data):
+        super().write_regs(reg, data)
+        if reg == 0x01 and data:
+            self._started = self.now()
+            self._read_sample = 0
+            if self._baseline_at is None:
+                self._baseline_at = self._started
+        elif reg == 0x05 and len(data) >= 4:
+            self.env = bytes(data[:4])
+        elif reg == 0x11 and len(data) >= 2:
+            self._baseline = (data[0] << 8) | data[1]
+            self._baseline_at = self.now()
+            self.baseline_writes += 1
+
+    def read_regs(self, reg, nbytes):
+        if reg == 0x00:
+            status = 0x10
+            if self.app_running:
+                status |= 0x80
+            if self._samples() > self._read_sample:
+                status |= 0x08
+            return bytes([status]) * nbytes
+        if reg == 0x02:
+            # Lesen der Ergebnisse setzt DATA_READY zurück
+            self._read_sample = self._samples()
+            eco2, tvoc = self.reading()
+            data = struct.pack(">HHBBH", eco2, tvoc, 0x90, 0, 0)
+            return data[:nbytes]
+        if reg == 0x11:
+            return self.baseline().to_bytes(2, "big")[:nbytes]
+        return super().read_regs(reg, nbytes)
+
+
+class BH1750(Device):
+    """ Zählwert = Lux * 1.2 * MTreg / 69, in H-Res 2 doppelt, im L-Res-Modus
+        in Schritten von 4 lx bei MTreg 69; bei 65535 ist Schluss. """
+
+    def __init__(self, address=0x23, lux=812.5):
+        super().__init__()
+        self.address = address
+        self.lux = lux
+        self.mode = 0
+        self.mtreg = 69
+        self.powered = False
+        self.counts = 0
+        self._started = None
+        self.conversions = 0
+
+    def _conversion_s(self):
+        # längste Wandlungszeit laut Datenblatt, skaliert mit MTreg
+        ms = 24 if self.mode & 0x0F == 0x03 else 180
+        return ms * self.mtreg / 69 / 1000
+
+    def _update(self):
+        if self._started is None:
+            return
+        elapsed = self.now() - self._started
+        # Rundungsfehler der Uhr sollen eine gerade fertige Wandlung nicht
+        # verschieben
+        done = int(elapsed / self._conversion_s() + 1e-6)
+        if not done:
+            return
+        factor = 2.0 if self.mode & 0x0F == 0x01 else 1.0
+        counts = self.lux * 1.2 * factor * self.mtreg / 69
+        if self.mode & 0x0F == 0x03:
+            # 4 lx bei MTreg 69
+            counts = int(counts / 4.8) * 4.8
+        self.counts = min(65535, int(counts))
+        self.conversions += 1
+        if self.mode & 0x20:
+            # Einzelmessung: danach Power Down
+            self._started = None
+            self.powered = False
+        else:
+            self._started += done * self._conversion_s()
+
+    def write(self, data):
+        self._update()
+        for opcode in data:
+            if opcode == 0x00:
+                self.powered = False
+                self._started = None
+            elif opcode == 0x01:
+                self.powered = True
+            elif opcode == 0x07:
+                if self.powered:
+                    self.counts = 0
+            elif opcode & 0xF8 == 0x40:
+                # MTreg Bits 7..5
+                self.mtreg = (self.mtreg & 0x1F) | ((opcode & 0x07) << 5)
+            elif opcode & 0xE0 == 0x60:
+                # MTreg Bits 4..0
+                self.mtreg = (self.mtreg & 0xE0) | (opcode & 0x1F)
+            elif opcode in (0x10, 0x11, 0x13, 0x20, 0x21, 0x23):
+                self.powered = True
+                self.mode = opcode
+                self._started = self.now()
+
+    def read(self, nbytes):
+        self._update()
+        return struct.pack(">H", self.counts)[:nbytes]
+
+
+def growbox(realtime=True, clock=time.monotonic):
+    """ Aufbau wie im Gerät: CCS811 an Kanal 0, BME280 an Kanal 1, BH1750
+        an Kanal 2 des Multiplexers. """
+    bus = SimBus(realtime=realtime, clock=clock)
+    bus.attach(TCA9548A(0x70))
+    bus.attach(CCS811(), 0)
+    bus.attach(BME280(), 1)
+    bus.attach(BH1750(), 2)
+    return bus
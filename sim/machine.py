@@ -0,0 +1,41 @@
+# Platzhalter für das MicroPython-Modul machine
+#
+# Auf dem PC gibt es keinen echten Bus: I2C(...) liefert den simulierten
+# Bus aus sim/i2c.py, standardmäßig growbox(). Wer einen anderen Aufbau
+# braucht, setzt ihn vorher mit use_bus().
+
+_bus = None
+
+
+def use_bus(bus):
+    """ Der nächste Aufruf von I2C(...) liefert bus. """
+    global _bus
+    _bus = bus
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 2
+
+    def __init__(self, pin, mode=-1, pull=None, value=None):
+        self.pin = pin
+        self._value = value or 0
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = value
+
+
+class I2C:
+    def __new__(cls, *args, **kwargs):
+        global _bus
+        if _bus is None:
+            from sim.i2c import growbox
+            _bus = growbox()
+        return _bus
+
+
+def reset():
+    raise SystemExit("machine.reset()")
@@ -0,0 +1,72 @@
+# Platzhalter für das MicroPython-Modul network
+#
+# WLAN verbindet sich nach CONFIG["connect_ms"] (gemessen mit time.ticks_ms,
+# läuft also auch mit FakeClock) und meldet dann CONFIG["ip"]. Mit
+# CONFIG["fail"] bleibt die Verbindung aus, wie bei falschem Passwort.
+
+import time
+
+STA_IF = 0
+AP_IF = 1
+
+# Werte wie im ESP32-Port
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_GOT_IP = 1010
+STAT_NO_AP_FOUND = 201
+STAT_WRONG_PASSWORD = 202
+
+CONFIG = {"connect_ms": 1800, "ip": "127.0.0.1", "fail": False}
+
+_interfaces = {}
+
+
+class WLAN:
+    def __new__(cls, interface=STA_IF):
+        # wie auf dem Gerät: ein Objekt pro Schnittstelle
+        if interface not in _interfaces:
+            wlan = object.__new__(cls)
+            wlan.interface = interface
+            wlan._active = False
+            wlan._started = None
+            wlan.connects = 0
+            _interfaces[interface] = wlan
+        return _interfaces[interface]
+
+    def __init__(self, interface=STA_IF):
+        pass
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        self._active = bool(value)
+        if not value:
+            self._started = None
+
+    def connect(self, ssid=None, password=None):
+        self.connects += 1
+        self._started = time.ticks_ms()
+
+    def disconnect(self):
+        self._started = None
+
+    def status(self):
+        if not self._active or self._started is None:
+            return STAT_IDLE
+        if CONFIG["fail"]:
+            return STAT_WRONG_PASSWORD
+        if time.ticks_diff(time.ticks_ms(), self._started) < CONFIG["connect_ms"]:
+            return STAT_CONNECTING
+        return STAT_GOT_IP
+
+    def isconnected(self):
+        return self.status() == STAT_GOT_IP
+
+    def ifconfig(self):
+        ip = CONFIG["ip"] if self.isconnected() else "0.0.0.0"
+        return (ip, "255.255.255.0", "192.168.178.1", "192.168.178.1")
+
+
+def reset():
+    """ Vergisst alle Verbindungen, z. B. vor einem simulierten Neustart. """
+    _interfaces.clear()
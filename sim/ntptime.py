@@ -0,0 +1,21 @@
+# Platzhalter für das MicroPython-Modul ntptime
+#
+# Die Uhr des PCs stimmt schon; settime() kostet nur die Antwortzeit eines
+# NTP-Servers (CONFIG["latency_ms"]) und schlägt mit CONFIG["fail"] fehl.
+
+import time
+
+host = "pool.ntp.org"
+timeout = 1
+
+CONFIG = {"latency_ms": 60, "fail": False}
+calls = 0
+
+
+def settime():
+    global calls
+    calls += 1
+    if CONFIG["fail"]:
+        time.sleep_ms(timeout * 1000)
+        raise OSError(110)  # ETIMEDOUT
+    time.sleep_ms(CONFIG["latency_ms"])
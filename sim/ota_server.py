@@ -0,0 +1,148 @@
+# Lokaler HTTP-Server für OTA-Tests
+#
+# Liefert ein Verzeichnis aus wie raw.githubusercontent.com ein Repository:
+# <url>/main/version.json, <url>/main/main.py, ... publish() legt dort eine
+# neue Version ab, mit version.json wie von tools/release.py. Wie GitHub
+# schickt der Server einen ETag und antwortet auf If-None-Match mit 304. install() biegt die GitHub-URL des OTA-Codes über
+# sim.urequests.REWRITE auf diesen Server um. Gezählt werden Anfragen und
+# ausgelieferte Bytes; latency_ms und bytes_per_s bremsen die Antworten,
+# damit ein Download ungefähr so lange dauert wie über das WLAN des ESP32.
+#
+#   server = OTAServer().start()
+#   server.publish(2, {"main.py": source})
+#   server.install("https://raw.githubusercontent.com/Luckz1337/Growbox/")
+
+import hashlib
+import http.server
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from sim import urequests
+from tools.release import manifest
+
+GITHUB = "https://raw.githubusercontent.com/Luckz1337/Growbox/"
+
+
+class _Handler(http.server.SimpleHTTPRequestHandler):
+    def __init__(self, request, client_address, server):
+        super().__init__(request, client_address, server, directory=server.owner.root)
+
+    def log_message(self, format, *args):
+        pass
+
+    def copyfile(self, source, outputfile):
+        owner = self.server.owner
+        while True:
+            block = source.read(4096)
+            if not block:
+                break
+            if owner.bytes_per_s:
+                time.sleep(len(block) / owner.bytes_per_s)
+            outputfile.write(block)
+            owner.bytes += len(block)
+
+    def send_head(self):
+        owner = self.server.owner
+        owner.requests += 1
+        owner.paths.append(self.path)
+        if owner.latency_ms:
+            time.sleep(owner.latency_ms / 1000)
+        self._etag = None
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            # in Blöcken, damit der Server die Speichermessung nicht verfälscht
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(4096), b""):
+                    digest.update(block)
+            self._etag = '"{}"'.format(digest.hexdigest()[:16])
+            if self.headers.get("If-None-Match") == self._etag:
+                owner.not_modified += 1
+                self.send_response(304)
+                self.end_headers()
+                return None
+        return super().send_head()
+
+    def end_headers(self):
+        if getattr(self, "_etag", None):
+            self.send_header("ETag", self._etag)
+        super().end_headers()
+
+
+class OTAServer:
+    def __init__(self, root=None, port=0, latency_ms=0, bytes_per_s=0):
+        self._tmp = None
+        if root is None:
+            self._tmp = tempfile.mkdtemp(prefix="ota-")
+            root = self._tmp
+        self.root = root
+        self.latency_ms = latency_ms
+        self.bytes_per_s = bytes_per_s
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes = 0
+        self.paths = []
+        self._httpd = http.server.ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._httpd.owner = self
+        self.port = self._httpd.server_address[1]
+        self.url = "http://127.0.0.1:{}/".format(self.port)
+        self._installed = None
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._installed is not None:
+            urequests.REWRITE.pop(self._installed, None)
+        if self._tmp is not None:
+            shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def install(self, prefix=GITHUB):
+        """ Anfragen an prefix landen ab jetzt bei diesem Server. """
+        urequests.REWRITE[prefix] = self.url
+        self._installed = prefix
+        return self
+
+    def publish(self, version, files, branch="main", base=None, mpy=None):
+        """ Legt files ({Name: Inhalt}) unter branch (und dort unter base,
+            z. B. "dist") ab und schreibt das Manifest über alle Dateien
+            dort, auch früher veröffentlichte. """
+        top = os.path.join(self.root, branch)
+        root = os.path.join(top, base) if base else top
+        for name, content in files.items():
+            if isinstance(content, str):
+                content = content.encode("utf-8")
+            path = os.path.join(root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+        os.makedirs(root, exist_ok=True)
+        published = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, root).replace(os.sep, "/")
+                if relative != "version.json":
+                    with open(path, "rb") as f:
+                        published[relative] = f.read()
+        with open(os.path.join(top, "version.json"), "w") as f:
+            json.dump(manifest(version, published, base, mpy), f)
+
+    def reset_stats(self):
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes = 0
+        self.paths = []
@@ -0,0 +1,85 @@
+# Aufgezeichnete Messwerte über die Sensormodelle abspielen
+#
+# Liest sensor_data.csv (Zeit, Temperatur, Luftdruck, Luftfeuchte, CO2,
+# TVOC, Lux) und stellt die Werte Zeile für Zeile an den simulierten
+# Sensoren ein: beim BME280 als Rohwerte, aus denen der Treiber genau diese
+# Werte berechnet, beim CCS811 und BH1750 direkt. Was SensorManager danach
+# liest, hat also den ganzen Weg über Register, Kompensation und Filter
+# genommen.
+#
+#   replay = Replay(sim_bus)
+#   for stamp, values in replay:
+#       ...  # Sensoren lesen
+
+import os
+
+from sim.i2c import BH1750, BME280, CCS811
+
+DEFAULT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       "sensor_data.csv")
+
+
+def devices(bus, kind):
+    """ Alle Modelle der Klasse kind am Bus, auch hinter Multiplexern. """
+    found = []
+    for device in bus.devices.values():
+        if isinstance(device, kind):
+            found.append(device)
+        for channel in getattr(device, "channels", ()):
+            found.extend(d for d in channel.values() if isinstance(d, kind))
+    return found
+
+
+def read_csv(path=DEFAULT):
+    rows = []
+    with open(path) as f:
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) < 7:
+                continue
+            try:
+                values = tuple(float(v) for v in parts[1:7])
+            except ValueError:
+                # Kopfzeile
+                continue
+            rows.append((parts[0], values))
+    return rows
+
+
+class Replay:
+    def __init__(self, bus, path=DEFAULT, loop=False):
+        self.rows = read_csv(path)
+        self.loop = loop
+        self.bme280 = devices(bus, BME280)
+        self.ccs811 = devices(bus, CCS811)
+        self.bh1750 = devices(bus, BH1750)
+        self.position = 0
+
+    def apply(self, values):
+        temp, pressure, humidity, co2, tvoc, lux = values
+        for device in self.bme280:
+            device.set_values(temp, pressure, humidity)
+        for device in self.ccs811:
+            device.eco2 = int(co2)
+            device.tvoc = int(tvoc)
+        for device in self.bh1750:
+            device.lux = lux
+
+    def step(self):
+        """ Stellt die nächste Zeile ein und gibt (Zeit, Werte) zurück,
+            am Ende None (mit loop=True wieder von vorn). """
+        if self.position >= len(self.rows):
+            if not self.loop or not self.rows:
+                return None
+            self.position = 0
+        row = self.rows[self.position]
+        self.position += 1
+        self.apply(row[1])
+        return row
+
+    def __iter__(self):
+        while True:
+            row = self.step()
+            if row is None:
+                return
+            yield row
@@ -0,0 +1,93 @@
+# Platzhalter für das MicroPython-Modul urequests
+#
+# Anfragen gehen über urllib an echte Server. Damit der OTA-Code nicht ins
+# Internet greift, leitet REWRITE URL-Präfixe um, z. B. GitHub auf den
+# lokalen OTAServer aus sim/ota_server.py. Wie auf dem Gerät wird der
+# Inhalt erst beim Zugriff auf content/text gelesen; wer streamen will,
+# liest aus response.raw.
+
+import json as _json
+import urllib.error
+import urllib.request
+
+REWRITE = {}
+# alle angefragten URLs nach dem Umschreiben
+log = []
+
+
+def _rewrite(url):
+    for prefix, target in REWRITE.items():
+        if url.startswith(prefix):
+            return target + url[len(prefix):]
+    return url
+
+
+class Response:
+    def __init__(self, status_code, raw, headers, reason=""):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.raw = raw
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self.raw.read()
+            self.close()
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return _json.loads(self.content)
+
+    def close(self):
+        if self.raw is not None:
+            self.raw.close()
+            self.raw = None
+
+
+def request(method, url, data=None, json=None, headers=None, timeout=None):
+    url = _rewrite(url)
+    log.append(url)
+    headers = dict(headers or {})
+    if json is not None:
+        data = _json.dumps(json)
+        headers.setdefault("Content-Type", "application/json")
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    req = urllib.request.Request(url, data=data, headers=headers, method=method)
+    try:
+        f = urllib.request.urlopen(req, timeout=timeout or 30)
+        return Response(f.status, f, dict(f.headers), f.reason)
+    except urllib.error.HTTPError as e:
+        return Response(e.code, e, dict(e.headers), e.reason)
+    except urllib.error.URLError as e:
+        raise OSError(str(e.reason))
+
+
+def head(url, **kw):
+    return request("HEAD", url, **kw)
+
+
+def get(url, **kw):
+    return request("GET", url, **kw)
+
+
+def post(url, **kw):
+    return request("POST", url, **kw)
+
+
+def put(url, **kw):
+    return request("PUT", url, **kw)
+
+
+def patch(url, **kw):
+    return request("PATCH", url, **kw)
+
+
+def delete(url, **kw):
+    return request("DELETE", url, **kw)
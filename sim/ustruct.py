@@ -0,0 +1,8 @@
+# MicroPython-Variante von struct: unpack akzeptiert wie auf dem Gerät
+# auch Puffer, die länger als das Format sind
+
+from struct import calcsize, pack, pack_into, unpack_from, error  # noqa: F401
+
+
+def unpack(fmt, buffer):
+    return unpack_from(fmt, buffer, 0)
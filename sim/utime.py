@@ -0,0 +1,24 @@
+# Platzhalter für das MicroPython-Modul utime
+#
+# Alles, was hier nicht steht, kommt beim Zugriff aus time, also auch die
+# von sim.install() und FakeClock eingesetzten ticks_ms/sleep_ms.
+# localtime() und gmtime() liefern wie auf dem Gerät 8-Tupel
+# (Jahr, Monat, Tag, Stunde, Minute, Sekunde, Wochentag, Tag im Jahr).
+
+import time as _time
+
+
+def __getattr__(name):
+    return getattr(_time, name)
+
+
+def localtime(secs=None):
+    return tuple(_time.localtime(secs))[:8]
+
+
+def gmtime(secs=None):
+    return tuple(_time.gmtime(secs))[:8]
+
+
+def mktime(t):
+    return int(_time.mktime(tuple(t[:8]) + (-1,)))
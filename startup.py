@@ -0,0 +1,120 @@
+# Startablauf
+#
+# Nichts beim Start wartet mehr auf das Netz: Das WLAN wird einmal
+# angestoßen und verbindet sich, während die Sensoren gesucht werden, der
+# Webserver startet und die Messungen laufen. Zeit-Synchronisation und
+# OTA-Prüfung folgen im Hintergrund, sobald das WLAN steht, und werden bei
+# Fehlern mit wachsendem Abstand wiederholt.
+#
+# Startup merkt sich, wann welcher Abschnitt erreicht war (ms seit dem
+# Anlegen, also seit dem Anfang von main.py), z. B. die erste Messung und
+# die erste HTTP-Antwort.
+
+import time
+
+import _thread
+import network
+
+from webserver import asyncio
+
+
+class Backoff:
+    """ Wartezeiten für Wiederholungen: first_ms, dann jeweils das Doppelte
+        bis höchstens max_ms. """
+
+    def __init__(self, first_ms, max_ms):
+        self.first_ms = first_ms
+        self.max_ms = max_ms
+        self.delay_ms = first_ms
+
+    def next(self):
+        delay = self.delay_ms
+        self.delay_ms = min(delay * 2, self.max_ms)
+        return delay
+
+
+async def in_thread(func, poll_ms=100):
+    """ Führt eine blockierende Funktion in einem eigenen Thread aus, ohne
+        die anderen Tasks aufzuhalten; Ausnahmen kommen beim Aufrufer an. """
+    result = []
+
+    def run():
+        try:
+            result.append((True, func()))
+        except Exception as e:
+            result.append((False, e))
+
+    _thread.start_new_thread(run, ())
+    while not result:
+        await asyncio.sleep_ms(poll_ms)
+    ok, value = result[0]
+    if not ok:
+        raise value
+    return value
+
+
+class Startup:
+    def __init__(self):
+        self.t0 = time.ticks_ms()
+        # Abschnitt -> ms seit dem Start
+        self.milestones = {}
+        self.tasks = []
+
+    def mark(self, name):
+        """ Merkt sich das erste Erreichen von name. """
+        if name in self.milestones:
+            return
+        ms = time.ticks_diff(time.ticks_ms(), self.t0)
+        self.milestones[name] = ms
+        print('Start: {} nach {} ms'.format(name, ms))
+
+    def spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.tasks.append(task)
+        return task
+
+    async def wifi(self, wlan, ssid, password, timeout_ms=10000, backoff=None):
+        """ Wartet auf das WLAN, das mit connect_wifi() angestoßen wurde;
+            nach timeout_ms ohne Verbindung neuer Versuch. """
+        backoff = backoff or Backoff(2000, 60000)
+        while True:
+            started = time.ticks_ms()
+            while time.ticks_diff(time.ticks_ms(), started) < timeout_ms:
+                status = wlan.status()
+                if status == network.STAT_GOT_IP:
+                    self.mark('wlan')
+                    print('Verbunden mit IP:', wlan.ifconfig()[0])
+                    return
+                if status in (network.STAT_WRONG_PASSWORD, network.STAT_NO_AP_FOUND):
+                    break
+                await asyncio.sleep_ms(100)
+            delay = backoff.next()
+            print('Keine WLAN-Verbindung (Status {}), neuer Versuch in {} s'.format(
+                wlan.status(), delay // 1000))
+            wlan.disconnect()
+            await asyncio.sleep_ms(delay)
+            wlan.connect(ssid, password)
+
+    async def retry(self, name, func, backoff):
+        """ Wartet auf func(), bis es ohne Ausnahme durchläuft; blockierende
+            Aufrufe (Netzwerk) als lambda: in_thread(...) übergeben. """
+        while True:
+            try:
+                await func()
+            except Exception as e:
+                delay = backoff.next()
+                print('Fehler bei {}: {}, neuer Versuch in {} s'.format(name, e, delay // 1000))
+                await asyncio.sleep_ms(delay)
+                continue
+            self.mark(name)
+            return
+
+
+def connect_wifi(ssid, password):
+    """ Stößt die Verbindung an und kehrt sofort zurück; der ESP32 verbindet
+        sich im Hintergrund. """
+    wlan = network.WLAN(network.STA_IF)
+    wlan.active(True)
+    if not wlan.isconnected():
+        wlan.connect(ssid, password)
+    return wlan
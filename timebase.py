@@ -0,0 +1,142 @@
+# Ortszeit für die Anzeige und Laufzeit vor der Zeit-Synchronisation
+#
+# Gespeichert wird immer UTC in Unix-Sekunden; in MEZ/MESZ umgerechnet wird
+# erst bei der Ausgabe (format_time in sensor_store.py). Die Umstellungen
+# (EU: letzter Sonntag im März und im Oktober, jeweils 01:00 UTC) stehen
+# als Zeitpunkte in einer Tabelle, die pro Jahr einmal berechnet wird. Der
+# Abstand gilt bis zur nächsten Umstellung und wird bis dahin
+# wiederverwendet; nur beim Überschreiten wird in der Tabelle binär gesucht.
+#
+# Uptime zählt die Sekunden seit dem Start aus ticks_ms. Messungen vor der
+# ersten NTP-Synchronisation werden damit gespeichert und danach auf
+# Unix-Zeit korrigiert (RingStore.fix_times).
+
+import time
+from array import array
+
+DAY = 86400
+# Uhrzeit (UTC) der Umstellung am jeweiligen Sonntag
+SWITCH_SECONDS = 3600
+# erstes Jahr der Umstellungstabelle (Unix-Zeit ist dort nie negativ)
+FIRST_YEAR = 1970
+
+
+def days_from_civil(year, month, day):
+    """ Tage seit 1970-01-01 (proleptischer gregorianischer Kalender). """
+    if month <= 2:
+        year -= 1
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def year_of(timestamp):
+    days = timestamp // DAY
+    year = 1970 + days * 400 // 146097
+    while days_from_civil(year + 1, 1, 1) <= days:
+        year += 1
+    while days_from_civil(year, 1, 1) > days:
+        year -= 1
+    return year
+
+
+def last_sunday(year, month):
+    """ Tage seit 1970-01-01 des letzten Sonntags im Monat. """
+    if month == 12:
+        last = days_from_civil(year + 1, 1, 1) - 1
+    else:
+        last = days_from_civil(year, month + 1, 1) - 1
+    # 1970-01-01 war ein Donnerstag (Montag = 0)
+    return last - (last + 3 - 6) % 7
+
+
+def transitions(year):
+    """ Beginn und Ende der Sommerzeit als Unix-Zeit. """
+    return (last_sunday(year, 3) * DAY + SWITCH_SECONDS,
+            last_sunday(year, 10) * DAY + SWITCH_SECONDS)
+
+
+class Zone:
+    """ Abstand zu UTC in Sekunden: standard im Winter, summer in der
+        Sommerzeit. """
+
+    def __init__(self, standard=3600, summer=7200):
+        self.standard = standard
+        self.summer = summer
+        # Beginn, Ende, Beginn, Ende, ... aufsteigend ab first_year
+        self.table = array("I")
+        self.first_year = None
+        self._lo = 0
+        self._hi = 0
+        self._offset = standard
+
+    def _cover(self, year):
+        # die Tabelle ist unsigned und beginnt frühestens 1970
+        year = year if year > FIRST_YEAR else FIRST_YEAR
+        if self.first_year is None:
+            self.table.extend(transitions(year))
+            self.first_year = year
+            return
+        last_year = self.first_year + len(self.table) // 2 - 1
+        if year < self.first_year:
+            table = array("I")
+            for y in range(year, self.first_year):
+                table.extend(transitions(y))
+            table.extend(self.table)
+            self.table = table
+            self.first_year = year
+        while last_year < year:
+            last_year += 1
+            self.table.extend(transitions(last_year))
+
+    def offset(self, timestamp):
+        if self._lo <= timestamp < self._hi:
+            return self._offset
+        table = self.table
+        if not table or timestamp < table[0] or timestamp >= table[-1]:
+            year = year_of(timestamp)
+            self._cover(year - 1)
+            self._cover(year + 1)
+            table = self.table
+        if timestamp < table[0]:
+            # vor der ersten Umstellung 1970: Winterzeit
+            self._lo, self._hi, self._offset = 0, table[0], self.standard
+            return self.standard
+        lo, hi = 0, len(table)
+        # Anzahl der Umstellungen <= timestamp
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if table[mid] <= timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        # table[0] <= timestamp < table[-1], lo ist nie am Rand
+        self._lo = table[lo - 1]
+        self._hi = table[lo]
+        self._offset = self.summer if lo % 2 else self.standard
+        return self._offset
+
+    def local(self, timestamp):
+        return timestamp + self.offset(timestamp)
+
+
+# Mitteleuropa
+LOCAL = Zone()
+
+
+class Uptime:
+    """ Sekunden seit dem Start. seconds() muss mindestens alle 6 Tage
+        aufgerufen werden: ticks_ms läuft auf MicroPython nach 2**29 ms
+        (etwa 6,2 Tage) über, ticks_diff stimmt nur innerhalb davon. """
+
+    def __init__(self):
+        self._last = time.ticks_ms()
+        self._ms = 0
+
+    def seconds(self):
+        now = time.ticks_ms()
+        self._ms += time.ticks_diff(now, self._last)
+        self._last = now
+        return self._ms // 1000
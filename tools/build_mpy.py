@@ -0,0 +1,132 @@
+# Übersetzt die Module für das Gerät mit mpy-cross in .mpy-Bytecode
+#
+#   python tools/build_mpy.py [--out dist] [--mpy-cross BEFEHL] [--frozen]
+#
+# Ohne .mpy parst und kompiliert das Gerät bei jedem Start main.py und
+# alle importierten Module aus dem Quelltext; das kostet Zeit und braucht
+# kurzzeitig viel Heap. In out/ liegt danach das Dateisystem des Geräts:
+#  - jedes Modul aus tools/release.py DEVICE_FILES als .mpy,
+#  - main.py als app.mpy und eine main.py, die nur "import app" enthält
+#    (MicroPython startet main.py und boot.py nur aus dem Quelltext),
+#  - boot.py und alle anderen Dateien (index.html, www/) unverändert.
+# Ein Syntaxfehler bricht den Build ab; auf dem Gerät wird nichts mehr
+# geprüft. mpy-cross muss zur Firmware passen (gleiche mpy-Version, siehe
+# build.json); ohne --mpy-cross wird das Python-Paket mpy_cross benutzt,
+# sonst mpy-cross aus PATH.
+#
+# Mit --frozen entsteht zusätzlich out/manifest.py für einen eigenen
+# Firmware-Build (make FROZEN_MANIFEST=.../manifest.py). Eingefrorene
+# Module liegen im Flash und brauchen beim Import fast keinen Heap, lassen
+# sich aber nicht mehr per OTA aktualisieren; Dateien gleichen Namens im
+# Dateisystem haben Vorrang.
+#
+# Danach: python tools/release.py --dist dist
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tools.release import FIRMWARE, device_files
+
+APP = "app"
+# bleiben Quelltext
+SOURCE_ONLY = ("boot.py",)
+
+
+def mpy_cross_command(command=None):
+    if command:
+        return [command]
+    try:
+        import mpy_cross  # noqa: F401
+        return [sys.executable, "-m", "mpy_cross"]
+    except ImportError:
+        return ["mpy-cross"]
+
+
+def mpy_version(command):
+    """ (Version, Unterversion) des erzeugten Bytecodes, z. B. (6, 2). """
+    output = subprocess.run(command + ["--version"], capture_output=True, text=True).stdout
+    match = re.search(r"mpy v(\d+)(?:\.(\d+))?", output)
+    if not match:
+        sys.exit("mpy-cross --version ohne mpy-Version: " + output.strip())
+    return int(match.group(1)), int(match.group(2) or 0), output.strip()
+
+
+def compile_module(command, source, target, name):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    result = subprocess.run(command + ["-o", target, "-s", name, source],
+                            capture_output=True, text=True)
+    if result.returncode:
+        sys.exit("{} lässt sich nicht übersetzen:\n{}".format(name, result.stderr.strip()))
+
+
+def build(out, command, frozen=False):
+    """ Baut out/ neu auf; gibt die Namen der erzeugten Dateien zurück. """
+    major, minor, version = mpy_version(command)
+    if os.path.isdir(out):
+        shutil.rmtree(out)
+    os.makedirs(out)
+    built = []
+    modules = []
+    for name in device_files():
+        source = os.path.join(ROOT, name)
+        if name.endswith(".py") and name not in SOURCE_ONLY:
+            if name == FIRMWARE:
+                target = APP + ".mpy"
+                compile_module(command, source, os.path.join(out, target), name)
+                with open(os.path.join(out, FIRMWARE), "w") as f:
+                    f.write("# main.py liegt als app.mpy vor (tools/build_mpy.py)\nimport {}\n".format(APP))
+                built.append(FIRMWARE)
+            else:
+                target = name[:-3] + ".mpy"
+                compile_module(command, source, os.path.join(out, target), name)
+                modules.append(name)
+            built.append(target)
+        else:
+            target = os.path.join(out, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target)
+            built.append(name)
+    with open(os.path.join(out, "build.json"), "w") as f:
+        json.dump({"mpy": [major, minor], "mpy_cross": version}, f)
+        f.write("\n")
+    if frozen:
+        write_frozen_manifest(out, modules)
+    return sorted(built)
+
+
+def write_frozen_manifest(out, modules):
+    base = os.path.relpath(ROOT, out).replace(os.sep, "/")
+    lines = ['# Eingefrorene Module der Growbox, erzeugt von tools/build_mpy.py',
+             'include("$(PORT_DIR)/boards/manifest.py")']
+    for name in modules:
+        lines.append('module("{}", base_path="{}")'.format(name, base))
+    # main.py als app, die main.py im Dateisystem importiert es nur
+    lines.append('module("{}.py", base_path="frozen")'.format(APP))
+    os.makedirs(os.path.join(out, "frozen"), exist_ok=True)
+    shutil.copyfile(os.path.join(ROOT, FIRMWARE), os.path.join(out, "frozen", APP + ".py"))
+    with open(os.path.join(out, "manifest.py"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default=os.path.join(ROOT, "dist"), help="Ausgabeverzeichnis")
+    parser.add_argument("--mpy-cross", help="Befehl für mpy-cross")
+    parser.add_argument("--frozen", action="store_true", help="zusätzlich manifest.py für die Firmware")
+    args = parser.parse_args()
+
+    built = build(args.out, mpy_cross_command(args.mpy_cross), args.frozen)
+    size = sum(os.path.getsize(os.path.join(args.out, name)) for name in built)
+    print("{}: {} Dateien, {} Bytes".format(args.out, len(built), size))
+
+
+if __name__ == "__main__":
+    main()
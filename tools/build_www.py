@@ -0,0 +1,54 @@
+# Baut die statischen Dateien für das Gerät
+#
+#   python tools/build_www.py
+#
+# Jede Datei aus ASSETS wird gzip-komprimiert nach www/ geschrieben. In
+# www/assets.json stehen pro URL Dateiname, Content-Type, Größe und ein
+# ETag (SHA-256 des komprimierten Inhalts). Nach jeder Änderung an
+# index.html neu ausführen und www/ mit hochladen.
+
+import gzip
+import hashlib
+import json
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT = os.path.join(ROOT, "www")
+
+# URL: (Quelldatei, Content-Type)
+ASSETS = {
+    "/index.html": ("index.html", "text/html; charset=utf-8"),
+}
+ALIASES = {
+    "/": "/index.html",
+}
+
+
+def build():
+    os.makedirs(OUTPUT, exist_ok=True)
+    manifest = {}
+    for url, (source, content_type) in ASSETS.items():
+        with open(os.path.join(ROOT, source), "rb") as f:
+            data = f.read()
+        # mtime=0, damit gleicher Inhalt immer die gleiche Datei (und ETag) ergibt
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        target = source + ".gz"
+        with open(os.path.join(OUTPUT, target), "wb") as f:
+            f.write(compressed)
+        manifest[url] = {
+            "file": "www/" + target,
+            "source": source,
+            "type": content_type,
+            "length": len(compressed),
+            "etag": '"{}"'.format(hashlib.sha256(compressed).hexdigest()[:16]),
+        }
+        print("{}: {} -> {} Bytes".format(source, len(data), len(compressed)))
+    for alias, url in ALIASES.items():
+        manifest[alias] = manifest[url]
+    with open(os.path.join(OUTPUT, "assets.json"), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    build()
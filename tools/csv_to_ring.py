@@ -0,0 +1,65 @@
+# Wandelt sensor_data.csv in das Ringspeicher-Format von sensor_store um
+#
+#   python tools/csv_to_ring.py sensor_data.csv sensor_data.bin [--capacity 25920]
+#
+# Die Zeitstempel der CSV wurden ohne Zeitzonenkorrektur geschrieben und
+# werden deshalb als UTC übernommen.
+
+import argparse
+import calendar
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sensor_store import RingStore
+
+
+def parse_date(text):
+    return calendar.timegm(time.strptime(text, "%Y/%m/%d-%H:%M:%S"))
+
+
+def parse_value(text):
+    return 0.0 if text in ("", "None") else float(text)
+
+
+def convert(csv_path, store):
+    count = 0
+    skipped = 0
+    with open(csv_path) as f:
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) != 7:
+                skipped += 1
+                continue
+            try:
+                timestamp = parse_date(parts[0])
+                values = [parse_value(v) for v in parts[1:]]
+            except ValueError:
+                skipped += 1
+                continue
+            store.append(timestamp, *values)
+            count += 1
+    store.flush()
+    return count, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV in Ringspeicher umwandeln")
+    parser.add_argument("csv")
+    parser.add_argument("output")
+    parser.add_argument("--capacity", type=int, default=25920)
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        os.remove(args.output)
+    store = RingStore(args.output, capacity=args.capacity, batch=64)
+    count, skipped = convert(args.csv, store)
+    store.close()
+    print("{} Datensätze übernommen, {} übersprungen -> {} ({} Bytes)".format(
+        count, skipped, args.output, os.path.getsize(args.output)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# Schreibt version.json für das OTA-Update
+#
+#   python tools/release.py [--version N] [--dist dist]
+#
+# version.json ist das Manifest: Versionsnummer und für jede Datei, die
+# auf das Gerät gehört (DEVICE_FILES), SHA-256 und Größe. Das Gerät lädt
+# bei einer höheren Versionsnummer nur die Dateien, deren Hash sich von
+# seinem unterscheidet, und installiert sie nur, wenn der Hash passt. Auf
+# dem Gerät wird nichts kompiliert, deshalb werden die Python-Dateien hier
+# vorher geprüft. Ohne --version wird die höchste Nummer aus version.json
+# und dem bisher veröffentlichten ota/version.json um eins erhöht; gibt es
+# keins von beiden, muss --version angegeben werden.
+#
+# Mit --dist werden statt der Quellen die Dateien aus dem Verzeichnis von
+# tools/build_mpy.py ausgeliefert (im Manifest mit "path" auf dist/...),
+# dazu die mpy-Version, die die Firmware haben muss. Ein Modul gibt es auf
+# dem Gerät immer nur einmal: "delete" nennt zu jeder .mpy die .py und
+# umgekehrt, denn MicroPython würde eine .py neben der .mpy vorziehen.
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRMWARE = "main.py"
+# bisher veröffentlichte Manifeste, daraus die letzte Versionsnummer
+PUBLISHED = ("version.json", "ota/version.json")
+# Muster relativ zum Repository; wifi_config.py enthält die Zugangsdaten
+# des Geräts und wird nie überschrieben
+DEVICE_FILES = ("*.py", "index.html", "libraries/*.py", "ota/*.py", "www/*")
+EXCLUDE = ("wifi_config.py",)
+
+
+def device_files(root=ROOT):
+    """ Pfade (mit /) aller Dateien für das Gerät, sortiert. """
+    names = set()
+    for pattern in DEVICE_FILES:
+        for path in glob.glob(os.path.join(root, pattern)):
+            if os.path.isfile(path):
+                names.add(os.path.relpath(path, root).replace(os.sep, "/"))
+    return sorted(name for name in names if name not in EXCLUDE)
+
+
+def counterpart(name):
+    """ Die andere Form desselben Moduls: a.py <-> a.mpy. """
+    if name.endswith(".py"):
+        return name[:-3] + ".mpy"
+    if name.endswith(".mpy"):
+        return name[:-4] + ".py"
+    return None
+
+
+def manifest(version, files, base=None, mpy=None):
+    """ Inhalt von version.json für files ({Name: bytes}); base: Verzeichnis
+        der Dateien im Repository. sha256 oben ist der Hash von main.py für
+        Geräte, die nur main.py aktualisieren (nicht bei .mpy, deren main.py
+        ohne app.mpy nicht startet). """
+    info = {"version": version, "files": {}}
+    delete = set()
+    for name in sorted(files):
+        data = files[name]
+        entry = {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+        if base:
+            entry["path"] = base + "/" + name
+        info["files"][name] = entry
+        other = counterpart(name)
+        if other and other not in files:
+            delete.add(other)
+    info["delete"] = sorted(delete)
+    if mpy:
+        info["mpy"] = mpy
+    elif FIRMWARE in info["files"]:
+        info["sha256"] = info["files"][FIRMWARE]["sha256"]
+    return info
+
+
+def dist_files(dist):
+    """ Dateien aus dem Verzeichnis von tools/build_mpy.py ohne dessen
+        eigene (build.json, manifest.py, frozen/). """
+    names = []
+    for directory, dirs, files in os.walk(dist):
+        dirs[:] = [d for d in dirs if not (directory == dist and d == "frozen")]
+        for name in files:
+            relative = os.path.relpath(os.path.join(directory, name), dist).replace(os.sep, "/")
+            if relative not in ("build.json", "manifest.py"):
+                names.append(relative)
+    return sorted(names)
+
+
+def current_version(root=ROOT):
+    """ Höchste Versionsnummer der Manifeste in PUBLISHED, None wenn keins. """
+    versions = []
+    for name in PUBLISHED:
+        try:
+            with open(os.path.join(root, name)) as f:
+                versions.append(int(json.load(f)["version"]))
+        except (OSError, ValueError, KeyError):
+            pass
+    return max(versions) if versions else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--version", type=int, help="Versionsnummer")
+    parser.add_argument("--dist", help="Ausgabe von tools/build_mpy.py statt der Quellen")
+    args = parser.parse_args()
+
+    path = os.path.join(ROOT, "version.json")
+    version = args.version
+    if version is None:
+        current = current_version()
+        if current is None:
+            sys.exit("Kein veröffentlichtes version.json gefunden, bitte --version angeben")
+        version = current + 1
+    source = ROOT
+    names = device_files()
+    base = mpy = None
+    if args.dist:
+        source = os.path.abspath(args.dist)
+        names = dist_files(source)
+        base = os.path.relpath(source, ROOT).replace(os.sep, "/")
+        with open(os.path.join(source, "build.json")) as f:
+            mpy = json.load(f)["mpy"]
+    files = {}
+    for name in names:
+        with open(os.path.join(source, name), "rb") as f:
+            files[name] = f.read()
+        if name.endswith(".py"):
+            try:
+                compile(files[name], name, "exec")
+            except SyntaxError as e:
+                sys.exit("{} lässt sich nicht kompilieren: {}".format(name, e))
+    info = manifest(version, files, base, mpy)
+    with open(path, "w") as f:
+        json.dump(info, f, indent=1, sort_keys=True)
+        f.write("\n")
+    print("Version {}: {} Dateien, {} Bytes".format(
+        version, len(files), sum(len(data) for data in files.values())))
+
+
+if __name__ == "__main__":
+    main()
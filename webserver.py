@@ -0,0 +1,282 @@
+# Asynchroner HTTP-Server für das Dashboard (uasyncio-kompatibel)
+#
+# Jede Verbindung läuft als eigener Task, dadurch blockiert ein langsamer
+# Client die anderen nicht mehr. Verbindungen bleiben per Keep-Alive offen,
+# bis der Client sie schließt oder der Timeout abläuft.
+
+import json
+import os
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+FILE_CHUNK_SIZE = 512
+
+STATUS_TEXT = {
+    200: "OK",
+    202: "Accepted",
+    204: "No Content",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+def parse_query(query):
+    params = {}
+    if not query:
+        return params
+    for pair in query.split("&"):
+        if not pair:
+            continue
+        key, _, value = pair.partition("=")
+        params[key] = value
+    return params
+
+
+class Request:
+    def __init__(self, method, path, query, version, headers):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.version = version
+        self.headers = headers
+
+
+class Response:
+    def __init__(self, writer, keep_alive, timeout, chunked_ok=False):
+        self.writer = writer
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.chunked_ok = chunked_ok
+        self.chunked = False
+        self.headers_sent = False
+
+    def _head(self, status, content_type, length, headers):
+        head = "HTTP/1.1 {} {}\r\n".format(status, STATUS_TEXT.get(status, ""))
+        if content_type:
+            head += "Content-Type: {}\r\n".format(content_type)
+        if length is not None:
+            head += "Content-Length: {}\r\n".format(length)
+        elif self.chunked:
+            head += "Transfer-Encoding: chunked\r\n"
+        else:
+            # Ohne Länge kann das Ende nur durch Schließen signalisiert werden
+            self.keep_alive = False
+        head += "Connection: {}\r\n".format("keep-alive" if self.keep_alive else "close")
+        if headers:
+            head += headers
+        return (head + "\r\n").encode()
+
+    async def drain(self):
+        await asyncio.wait_for(self.writer.drain(), self.timeout)
+
+    async def start(self, status=200, content_type="text/html", length=None, headers="", chunked=False):
+        # Chunked nur für HTTP/1.1-Clients, sonst Ende durch Schließen
+        self.chunked = chunked and length is None and self.chunked_ok
+        self.writer.write(self._head(status, content_type, length, headers))
+        self.headers_sent = True
+        await self.drain()
+
+    async def write(self, data):
+        if self.chunked:
+            if not data:
+                return
+            self.writer.write("{:x}\r\n".format(len(data)).encode())
+            self.writer.write(data)
+            self.writer.write(b"\r\n")
+        else:
+            self.writer.write(data)
+        await self.drain()
+
+    async def finish(self):
+        if self.chunked:
+            self.writer.write(b"0\r\n\r\n")
+            self.chunked = False
+            await self.drain()
+
+    async def send_raw(self, data):
+        # Fertig formatierte Antwort inklusive Statuszeile und Headern
+        self.headers_sent = True
+        self.writer.write(data)
+        await self.drain()
+
+    async def send(self, body, status=200, content_type="text/html", headers=""):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.writer.write(self._head(status, content_type, len(body), headers))
+        self.headers_sent = True
+        if body:
+            self.writer.write(body)
+        await self.drain()
+
+
+async def send_file(response, filename, content_type, headers=""):
+    """ Sendet eine Datei in festen Blöcken, ohne sie ganz in den RAM zu laden. """
+    length = os.stat(filename)[6]
+    await response.start(200, content_type, length, headers)
+    buf = bytearray(FILE_CHUNK_SIZE)
+    view = memoryview(buf)
+    with open(filename, "rb") as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            await response.write(view[:n])
+
+
+class StaticFiles:
+    """ Liefert die von tools/build_www.py erzeugten gzip-Dateien aus.
+
+        Der Browser bekommt einen ETag und muss bei jedem Laden nachfragen
+        (Cache-Control: no-cache); ist die Datei unverändert, reicht ein 304
+        ohne Inhalt. """
+
+    def __init__(self, manifest="www/assets.json"):
+        with open(manifest) as f:
+            self.assets = json.load(f)
+
+    def register(self, server):
+        for url in self.assets:
+            server.add_route(url, self.handle)
+
+    async def handle(self, request, response):
+        asset = self.assets[request.path]
+        etag = asset["etag"]
+        headers = "ETag: {}\r\nCache-Control: no-cache\r\n".format(etag)
+        if request.headers.get("if-none-match") == etag:
+            await response.send(b"", 304, None, headers)
+            return
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            await send_file(response, asset["file"], asset["type"],
+                            headers + "Content-Encoding: gzip\r\nVary: Accept-Encoding\r\n")
+        else:
+            await send_file(response, asset["source"], asset["type"],
+                            "Vary: Accept-Encoding\r\n")
+
+
+class HTTPServer:
+    def __init__(self, host="0.0.0.0", port=80, timeout=10, max_clients=8):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_clients = max_clients
+        self.clients = 0
+        self.routes = {}
+        self.server = None
+        # optional, wird nach jeder beantworteten Anfrage mit request aufgerufen
+        self.on_response = None
+
+    def route(self, path, method="GET"):
+        def decorator(handler):
+            self.routes[(method, path)] = handler
+            return handler
+        return decorator
+
+    def add_route(self, path, handler, method="GET"):
+        self.routes[(method, path)] = handler
+
+    async def _read_request(self, reader):
+        line = await asyncio.wait_for(reader.readline(), self.timeout)
+        if not line:
+            return None
+        parts = line.decode().split()
+        if len(parts) < 2:
+            raise ValueError("Ungültige Anfragezeile")
+        method = parts[0]
+        version = parts[2] if len(parts) > 2 else "HTTP/1.0"
+        path, _, query = parts[1].partition("?")
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.timeout)
+            if not line or line == b"\r\n":
+                break
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length:
+            # Anfragen mit Body werden nicht ausgewertet, aber vollständig gelesen
+            await asyncio.wait_for(reader.readexactly(length), self.timeout)
+        return Request(method, path, parse_query(query), version, headers)
+
+    async def _handle(self, reader, writer):
+        if self.clients >= self.max_clients:
+            response = Response(writer, False, self.timeout)
+            try:
+                await response.send("<h1>503 Service Unavailable</h1>", 503)
+            except Exception:
+                pass
+            await self._close(writer)
+            return
+        self.clients += 1
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except ValueError:
+                    await Response(writer, False, self.timeout).send("<h1>400 Bad Request</h1>", 400)
+                    break
+                if request is None:
+                    break
+                connection = request.headers.get("connection", "").lower()
+                if request.version == "HTTP/1.1":
+                    keep_alive = connection != "close"
+                else:
+                    keep_alive = connection == "keep-alive"
+                response = Response(writer, keep_alive, self.timeout,
+                                    request.version == "HTTP/1.1")
+                await self._dispatch(request, response)
+                if self.on_response is not None:
+                    self.on_response(request)
+                if not response.keep_alive:
+                    break
+        except (OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.clients -= 1
+            await self._close(writer)
+
+    async def _dispatch(self, request, response):
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self.routes):
+                await response.send("<h1>405 Method Not Allowed</h1>", 405)
+            else:
+                await response.send("<h1>404 Not Found</h1>", 404)
+            return
+        try:
+            await handler(request, response)
+            await response.finish()
+        except (OSError, asyncio.TimeoutError):
+            raise
+        except Exception as e:
+            print("Fehler in Handler {}: {}".format(request.path, e))
+            if response.headers_sent:
+                response.keep_alive = False
+            else:
+                await response.send("<h1>500 Internal Server Error</h1>", 500)
+
+    async def _close(self, writer):
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        print('Server gestartet auf Port', self.port)
+        return self.server
+
+    async def serve_forever(self):
+        await self.start()
+        while True:
+            await asyncio.sleep(3600)
+
+    def run(self):
+        asyncio.run(self.serve_forever())